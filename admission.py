@@ -0,0 +1,166 @@
+"""
+Admission control: token-bucket rate limits per patient and per client IP.
+
+Every expensive endpoint takes one token from the bucket of the patient
+(tc_number) and one from the bucket of the client IP. An empty bucket
+rejects the request with 429 and a Retry-After telling the client when the
+next token is due. Limits are "requests/seconds" strings, e.g. "30/60" is
+30 requests a minute with bursts of up to 30.
+
+Buckets live in this process by default, so each worker enforces the limit
+on its own traffic. RATE_LIMIT_BACKEND=redis keeps them in Redis
+(RATE_LIMIT_REDIS_URL) so the limit holds across all workers; it needs
+`pip install redis` and talks to Redis with redis.asyncio, so a slow Redis
+delays only the request being checked, not the event loop.
+"""
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+
+class TooManyRequests(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_limit(spec: str) -> Optional[Tuple[float, float]]:
+    """'30/60' -> (burst 30, 0.5 tokens per second); '0' or '' disables the limit"""
+    if not spec or spec.strip() == "0":
+        return None
+    count, _, seconds = spec.partition("/")
+    count = float(count)
+    return count, count / float(seconds or 1)
+
+
+class LocalBuckets:
+    """Token buckets in this process"""
+
+    is_async = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, burst: float, rate: float) -> float:
+        """Take one token; return 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now, rate, burst)
+                bucket = self._buckets[key] = [burst, now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0.0
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+    def _prune(self, now: float, rate: float, burst: float):
+        # Buckets that have refilled are equivalent to a new one
+        refill = burst / rate
+        for key in [k for k, (_, ts) in self._buckets.items() if now - ts >= refill]:
+            del self._buckets[key]
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker through Redis"""
+
+    is_async = True
+
+    # KEYS[1] bucket; ARGV burst, rate, now (s). Returns the wait in ms.
+    SCRIPT = """
+    local burst = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = math.ceil((1 - tokens) / rate * 1000)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+    return wait
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise ImportError("RATE_LIMIT_BACKEND=redis needs the redis package: pip install redis")
+        self._client = redis.asyncio.Redis.from_url(url, socket_timeout=0.25)
+        self._take = self._client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, burst: float, rate: float) -> float:
+        return await self._take(keys=[f"ratelimit:{key}"], args=[burst, rate, time.time()]) / 1000
+
+
+class RateLimiter:
+    def __init__(self):
+        self.limits = {"patient": parse_limit("30/60"), "ip": parse_limit("120/60")}
+        self.backend = LocalBuckets()
+        self.rejected: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.backend_errors = 0
+
+    def configure(self):
+        self.limits = {
+            "patient": parse_limit(os.getenv("RATE_LIMIT_PATIENT", "30/60")),
+            "ip": parse_limit(os.getenv("RATE_LIMIT_IP", "120/60")),
+        }
+        if os.getenv("RATE_LIMIT_BACKEND", "local").lower() == "redis":
+            self.backend = RedisBuckets(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+        else:
+            self.backend = LocalBuckets()
+
+    async def check(self, endpoint: str, tc_number: Optional[str], client_ip: Optional[str]):
+        """Raise TooManyRequests when the patient or the client IP is over its limit"""
+        for scope, key in (("patient", tc_number), ("ip", client_ip)):
+            limit = self.limits.get(scope)
+            if limit is None or not key:
+                continue
+            burst, rate = limit
+            try:
+                wait = self.backend.take(f"{scope}:{key}", burst, rate)
+                if self.backend.is_async:
+                    wait = await wait
+            except Exception as e:
+                # A broken shared backend must not take the API down with it
+                self.backend_errors += 1
+                print(f"Rate limiter backend error, letting the request through: {e}")
+                continue
+            if wait > 0:
+                self.reject(endpoint, f"rate_limit_{scope}")
+                raise TooManyRequests(f"Too many requests for this {scope}", wait)
+
+    def reject(self, endpoint: str, reason: str):
+        self.rejected[endpoint][reason] += 1
+
+    def stats(self) -> Dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "limits": {scope: (f"{limit[0]:g}/{limit[0] / limit[1]:g}s" if limit else None)
+                       for scope, limit in self.limits.items()},
+            "rejected": {endpoint: dict(reasons) for endpoint, reasons in self.rejected.items()},
+            "backend_errors": self.backend_errors,
+        }
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+# One limiter per worker process
+rate_limiter = RateLimiter()
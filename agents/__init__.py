@@ -1,9 +1,23 @@
 """
 Patient Referral Intelligent System Agents Module
+
+Agents are imported lazily: the diagnosis agent pulls in transformers,
+torch and scikit-learn, which must not be paid for at application import.
 """
 
-from .patient_intake_agent import PatientIntakeAgent
-from .diagnosis_agent import DiagnosisAgent
-from .recommendation_agent import RecommendationAgent
+import importlib
+
+_AGENT_MODULES = {
+    'PatientIntakeAgent': '.patient_intake_agent',
+    'DiagnosisAgent': '.diagnosis_agent',
+    'RecommendationAgent': '.recommendation_agent',
+}
 
 __all__ = ['PatientIntakeAgent', 'DiagnosisAgent', 'RecommendationAgent']
+
+
+def __getattr__(name):
+    if name in _AGENT_MODULES:
+        module = importlib.import_module(_AGENT_MODULES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
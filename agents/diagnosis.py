@@ -1,14 +1,74 @@
-from transformers import pipeline
+import os
+import threading
+from typing import Iterator, Optional
 
 
 class DiagnosisAgent:
     def __init__(self, agent_id: int):
         self.agent_id = agent_id
-        self.llm_model = pipeline(
-            "text-generation", model="mistralai/Mistral-7B")
+        self._llm_model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def llm_model(self):
+        # transformers is imported on first use, not at module import
+        if self._llm_model is None:
+            # Concurrent first requests load the model once, not once per thread
+            with self._load_lock:
+                if self._llm_model is None:
+                    from transformers import pipeline
+                    # CPU-only nodes can point this at a smaller model
+                    self._llm_model = pipeline(
+                        "text-generation",
+                        model=os.getenv("TEXT_GENERATION_MODEL", "mistralai/Mistral-7B"))
+        return self._llm_model
+
+    def _prompt(self, symptoms: str) -> str:
+        return f"Given the symptoms: {symptoms}, what possible conditions could the patient have?"
 
     def analyze_symptoms(self, patient_data: dict):
         symptoms = patient_data.get("symptoms", "")
-        prompt = f"Given the symptoms: {symptoms}, what possible conditions could the patient have?"
+        prompt = self._prompt(symptoms)
         response = self.llm_model(prompt, max_length=100)
         return response[0]['generated_text']
+
+    def stream_symptoms(self, patient_data: dict, cancel_event: Optional[threading.Event] = None,
+                        max_new_tokens: int = 100, token_timeout: float = 60.0) -> Iterator[str]:
+        """Yield generated text chunks as the model produces them.
+
+        Generation runs in a background thread and stops at the next token
+        once ``cancel_event`` is set (e.g. when the client disconnects).
+        """
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        cancel_event = cancel_event or threading.Event()
+
+        class _StopOnCancel(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return cancel_event.is_set()
+
+        tokenizer = self.llm_model.tokenizer
+        model = self.llm_model.model
+        inputs = tokenizer(self._prompt(patient_data.get("symptoms", "")), return_tensors="pt").to(model.device)
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                        timeout=token_timeout)
+
+        generation = threading.Thread(
+            target=model.generate,
+            kwargs=dict(
+                **inputs,
+                streamer=streamer,
+                max_new_tokens=max_new_tokens,
+                stopping_criteria=StoppingCriteriaList([_StopOnCancel()]),
+            ),
+            daemon=True,
+        )
+        generation.start()
+        try:
+            for text in streamer:
+                if cancel_event.is_set():
+                    break
+                if text:
+                    yield text
+        finally:
+            cancel_event.set()
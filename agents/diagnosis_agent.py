@@ -1,9 +1,10 @@
-from transformers import pipeline
+import os
 from typing import Dict, List
-import torch
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from profiling import timed
+from scheduling import determine_priority
+
+CLASSIFIER_MODEL = "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract"
 
 
 class DiagnosisAgent:
@@ -22,20 +23,52 @@ class DiagnosisAgent:
             "endocrinology": ["diabetes", "thyroid", "hormone", "metabolism", "weight", "growth"]
         }
 
-        # LLM modelini yükle
-        self.classifier = pipeline(
-            "text-classification",
-            model="microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract",
-            device=0 if torch.cuda.is_available() else -1
-        )
-
-        # TF-IDF vektörizasyonu için
-        self.vectorizer = TfidfVectorizer()
+        # LLM modeli ve TF-IDF vektörleri ilk analizde yüklenir
+        # (transformers/torch/sklearn importları saniyeler sürer)
+        self._classifier = None
+        self.vectorizer = None
         self.department_vectors = None
-        self._initialize_vectors()
+        # tfidf: sklearn TfidfVectorizer, hashing: sabit bellekli, artımlı (keyword_vectors.py)
+        self.vectorizer_mode = os.getenv("DIAGNOSIS_VECTORIZER", "tfidf").lower()
+
+    @property
+    def classifier(self):
+        """LLM modelini ilk kullanımda, seçilen arka uç ile yükler (DIAGNOSIS_BACKEND)."""
+        # Yalnızca ısınmada (warm_up) ve bench_inference.py'de kullanılır: analyze()
+        # departmanları anahtar kelime vektörleriyle sıralar, model departman etiketi üretmez
+        if self._classifier is None:
+            from .inference import load_text_classifier
+
+            self._classifier = load_text_classifier(CLASSIFIER_MODEL)
+        return self._classifier
+
+    def warm_up(self):
+        """Modeli ve vektörleri önceden yükler (worker başlangıcı için)."""
+        self.classifier
+        if self.vectorizer is None:
+            self._initialize_vectors()
 
     def _initialize_vectors(self):
         """Departman anahtar kelimelerini vektörize eder."""
+        if self.vectorizer_mode == "hashing":
+            from .keyword_vectors import HashingKeywordVectorizer
+
+            vectorizer = HashingKeywordVectorizer(
+                n_features=int(os.getenv("DIAGNOSIS_HASH_FEATURES", str(2 ** 18))))
+            # IDF tablosu bir kez, başlangıçtaki anahtar kelimelerden hesaplanır
+            vectorizer.fit_idf(
+                keyword for keywords in self.department_keywords.values() for keyword in keywords)
+            for dept, keywords in self.department_keywords.items():
+                vectorizer.set_department(dept, keywords)
+            self.vectorizer = vectorizer
+            return
+
+        if self.vectorizer_mode != "tfidf":
+            raise ValueError(f"Unknown vectorizer: {self.vectorizer_mode} (expected tfidf or hashing)")
+
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.vectorizer = TfidfVectorizer()
         all_keywords = []
         for keywords in self.department_keywords.values():
             all_keywords.extend(keywords)
@@ -43,6 +76,7 @@ class DiagnosisAgent:
         # TF-IDF vektörizasyonu
         self.department_vectors = self.vectorizer.fit_transform(all_keywords)
 
+    @timed("diagnosis.analyze")
     async def analyze(self, symptoms: Dict, patient_history: Dict = None) -> Dict:
         """
         Semptomları analiz eder ve olası departmanları belirler.
@@ -55,20 +89,15 @@ class DiagnosisAgent:
             Dict: Analiz sonuçları
         """
         try:
+            if self.vectorizer is None:
+                self._initialize_vectors()
+
             # Semptomları birleştir
             all_symptoms = " ".join(symptoms.get(
                 "primary", [])) + " " + " ".join(symptoms.get("secondary", []))
 
-            # Semptom vektörünü oluştur
-            symptom_vector = self.vectorizer.transform([all_symptoms])
-
             # Her departman için benzerlik skoru hesapla
-            department_scores = {}
-            for dept, keywords in self.department_keywords.items():
-                dept_vector = self.vectorizer.transform([" ".join(keywords)])
-                similarity = cosine_similarity(
-                    symptom_vector, dept_vector)[0][0]
-                department_scores[dept] = similarity
+            department_scores = self._department_scores(all_symptoms)
 
             # En yüksek skorlu departmanları seç
             recommended_departments = sorted(
@@ -108,18 +137,47 @@ class DiagnosisAgent:
         except Exception as e:
             raise Exception(f"Error analyzing symptoms: {str(e)}")
 
+    def _department_scores(self, text: str) -> Dict[str, float]:
+        """Metin ile her departmanın anahtar kelimeleri arasındaki kosinüs benzerliği."""
+        if self.vectorizer_mode == "hashing":
+            return self.vectorizer.scores(text)
+
+        from sklearn.metrics.pairwise import cosine_similarity
+
+        # Semptom vektörünü oluştur
+        symptom_vector = self.vectorizer.transform([text])
+        department_scores = {}
+        for dept, keywords in self.department_keywords.items():
+            dept_vector = self.vectorizer.transform([" ".join(keywords)])
+            department_scores[dept] = cosine_similarity(symptom_vector, dept_vector)[0][0]
+        return department_scores
+
+    def update_department(self, department: str, keywords: List[str]):
+        """Bir departmanı ekler ya da anahtar kelimelerini günceller."""
+        self.department_keywords[department] = list(keywords)
+        if self.vectorizer is None:
+            return
+        if self.vectorizer_mode == "hashing":
+            # Yalnızca bu departmanın vektörü hesaplanır, IDF tablosu değişmez
+            self.vectorizer.set_department(department, keywords)
+        else:
+            # TF-IDF sözlüğü tüm anahtar kelimelerle yeniden kurulur
+            self._initialize_vectors()
+
+    def remove_department(self, department: str):
+        """Bir departmanı öneri adaylarından çıkarır."""
+        self.department_keywords.pop(department, None)
+        if self.vectorizer is None:
+            return
+        if self.vectorizer_mode == "hashing":
+            self.vectorizer.remove_department(department)
+        else:
+            self._initialize_vectors()
+
     def _determine_priority(self, symptoms: Dict) -> str:
         """Semptomlara göre öncelik seviyesini belirler."""
-        urgent_keywords = ["severe", "emergency",
-                           "acute", "critical", "pain", "bleeding"]
-        severity = symptoms.get("severity", "moderate").lower()
-
-        if severity == "severe" or any(keyword in str(symptoms).lower() for keyword in urgent_keywords):
-            return "high"
-        elif severity == "moderate":
-            return "medium"
-        else:
-            return "low"
+        # Aynı kurallar istek zamanlayıcısında da kullanılır (scheduling.py)
+        return determine_priority(symptoms)
 
     def _adjust_recommendations(self, recommendations: List, history: Dict) -> List:
         """Hasta geçmişine göre önerileri günceller."""
@@ -0,0 +1,152 @@
+"""
+Metin sınıflandırma için değiştirilebilir çıkarım (inference) arka uçları.
+
+DIAGNOSIS_BACKEND ortam değişkeni ile seçilir:
+
+    torch       transformers pipeline (varsayılan, GPU varsa GPU)
+    torch-int8  CPU üzerinde dinamik int8 kuantize edilmiş PyTorch modeli
+    onnx        ONNX Runtime, dinamik int8 kuantizasyon ile (CPU)
+
+Tüm arka uçlar transformers "text-classification" pipeline'ı ile aynı
+çıktıyı döndürür: her metin için {"label": str, "score": float}.
+"""
+import os
+from typing import Dict, List, Union
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+def load_text_classifier(model_name: str, backend: str = None):
+    """Seçilen arka uç için sınıflandırıcıyı yükler."""
+    backend = (backend or os.getenv("DIAGNOSIS_BACKEND", "torch")).lower()
+
+    if backend == "torch":
+        import torch
+        from transformers import pipeline
+
+        return pipeline(
+            "text-classification",
+            model=model_name,
+            device=0 if torch.cuda.is_available() else -1
+        )
+
+    if backend == "torch-int8":
+        import torch
+        from transformers import pipeline
+
+        classifier = pipeline("text-classification", model=model_name, device=-1)
+        # Linear katmanlarını int8'e çevir (ağırlıklar int8, aktivasyonlar dinamik)
+        classifier.model = torch.quantization.quantize_dynamic(
+            classifier.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        return classifier
+
+    if backend == "onnx":
+        return OnnxTextClassifier(
+            model_name,
+            quantize=os.getenv("DIAGNOSIS_ONNX_QUANTIZE", "true").lower() in ("1", "true", "yes"),
+        )
+
+    raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+class OnnxTextClassifier:
+    """ONNX Runtime ile çalışan, pipeline uyumlu metin sınıflandırıcı."""
+
+    def __init__(self, model_name: str, quantize: bool = True, cache_dir: str = None,
+                 max_length: int = 128):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime")
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.model_name = model_name
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.id2label = AutoConfig.from_pretrained(model_name).id2label
+
+        cache_dir = cache_dir or os.getenv("INFERENCE_CACHE_DIR", os.path.join(".model_cache", "onnx"))
+        self.model_path = self._export(cache_dir, quantize)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = os.getenv("INFERENCE_THREADS")
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        self.session = onnxruntime.InferenceSession(
+            self.model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _export(self, cache_dir: str, quantize: bool) -> str:
+        """Modeli bir kez ONNX'e aktarır (ve kuantize eder); sonraki açılışlarda önbelleği kullanır."""
+        model_dir = os.path.join(cache_dir, self.model_name.replace("/", "__"))
+        fp32_path = os.path.join(model_dir, "model.onnx")
+        int8_path = os.path.join(model_dir, "model.int8.onnx")
+        target = int8_path if quantize else fp32_path
+        if os.path.exists(target):
+            return target
+
+        os.makedirs(model_dir, exist_ok=True)
+        if not os.path.exists(fp32_path):
+            self._export_fp32(fp32_path)
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        return target
+
+    def _export_fp32(self, path: str):
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        model.eval()
+        sample = self.tokenizer(["chest pain"], return_tensors="pt")
+        input_names = list(sample.keys())
+
+        class _LogitsOnly(torch.nn.Module):
+            def __init__(self, inner):
+                super().__init__()
+                self.inner = inner
+
+            def forward(self, *tensors):
+                return self.inner(**dict(zip(input_names, tensors))).logits
+
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["logits"] = {0: "batch"}
+        with torch.no_grad():
+            torch.onnx.export(
+                _LogitsOnly(model),
+                tuple(sample[name] for name in input_names),
+                path,
+                input_names=input_names,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+
+    def __call__(self, texts: Union[str, List[str]], **kwargs) -> List[Dict]:
+        import numpy as np
+
+        if isinstance(texts, str):
+            texts = [texts]
+
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        logits = self.session.run(["logits"], feeds)[0]
+
+        # Softmax (pipeline ile aynı skorlar)
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        best = probs.argmax(axis=1)
+        return [
+            {"label": self.id2label[int(idx)], "score": float(probs[row, idx])}
+            for row, idx in enumerate(best)
+        ]
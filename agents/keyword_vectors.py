@@ -0,0 +1,103 @@
+"""
+Departman anahtar kelimeleri için özellik hash'leme (feature hashing) tabanlı vektörleyici.
+
+TfidfVectorizer'dan farkları:
+
+- Kelime sözlüğü tutulmaz: her terim (kelime ve kelime ikilisi) crc32 ile
+  sabit sayıda kovadan birine düşer, bellek `n_features` ile sabittir.
+- IDF tablosu bir kez (başlangıçtaki anahtar kelimelerden) hesaplanır ve
+  sabit kalır. Bir departmanı eklemek ya da güncellemek yalnızca o
+  departmanın vektörünü hesaplar; diğerleri ve tablo yeniden kurulmaz.
+  Tablonun güncel anahtar kelimelerle yeniden hesaplanması `refit_idf` ile
+  açıkça istenir.
+- crc32 süreçten bağımsızdır: aynı metin her worker'da aynı kovaya düşer.
+
+Skor, sorgu ile departman vektörünün (tf * idf, L2 normlu) kosinüs benzerliğidir.
+"""
+import math
+import re
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+# TfidfVectorizer'ın varsayılan belirteç deseni
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+class HashingKeywordVectorizer:
+    def __init__(self, n_features: int = 2 ** 18, ngram_range: Tuple[int, int] = (1, 2)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.n_documents = 0
+        # Kova başına IDF (sabit boyut: 4 * n_features bayt)
+        self.idf = array("f", [1.0]) * n_features
+        self.keywords: Dict[str, List[str]] = {}
+        self.departments: Dict[str, Dict[int, float]] = {}
+
+    def terms(self, text: str) -> List[str]:
+        """Küçük harfe çevrilmiş kelimeler ve kelime n-gram'ları."""
+        words = TOKEN_PATTERN.findall(text.lower())
+        low, high = self.ngram_range
+        terms = []
+        for n in range(low, high + 1):
+            terms.extend(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+        return terms
+
+    def bucket(self, term: str) -> int:
+        return zlib.crc32(term.encode("utf-8")) % self.n_features
+
+    def counts(self, *texts: str) -> Dict[int, int]:
+        # Metinler ayrı ayrı belirteçlenir: iki anahtar kelime arasında n-gram oluşmaz
+        counts: Dict[int, int] = {}
+        for text in texts:
+            for term in self.terms(text):
+                index = self.bucket(term)
+                counts[index] = counts.get(index, 0) + 1
+        return counts
+
+    def fit_idf(self, documents: Iterable[str]):
+        """IDF tablosunu belgelerden hesaplar (sklearn: smooth_idf=True)."""
+        frequency = array("I", [0]) * self.n_features
+        n_documents = 0
+        for document in documents:
+            n_documents += 1
+            for index in self.counts(document):
+                frequency[index] += 1
+        self.n_documents = n_documents
+        # Görülmemiş kovalar en yüksek IDF'i alır
+        self.idf = array("f", (math.log((1 + n_documents) / (1 + df)) + 1 for df in frequency))
+
+    def refit_idf(self):
+        """Tabloyu mevcut departman anahtar kelimelerinden yeniden hesaplar ve tüm vektörleri yeniler."""
+        self.fit_idf(keyword for words in self.keywords.values() for keyword in words)
+        for dept, words in list(self.keywords.items()):
+            self.set_department(dept, words)
+
+    def vector(self, *texts: str) -> Dict[int, float]:
+        """tf * idf ağırlıklı, L2 normlu seyrek vektör."""
+        weights = {index: count * self.idf[index] for index, count in self.counts(*texts).items()}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not norm:
+            return {}
+        return {index: w / norm for index, w in weights.items()}
+
+    def set_department(self, department: str, keywords: List[str]):
+        """Bir departmanı ekler ya da anahtar kelimelerini değiştirir (yalnızca onun vektörü hesaplanır)."""
+        self.keywords[department] = list(keywords)
+        self.departments[department] = self.vector(*keywords)
+
+    def remove_department(self, department: str):
+        self.keywords.pop(department, None)
+        self.departments.pop(department, None)
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Her departman için kosinüs benzerliği."""
+        query = self.vector(text)
+        return {
+            dept: sum(weight * vector.get(index, 0.0) for index, weight in query.items())
+            for dept, vector in list(self.departments.items())  # çalışma anında güncellenebilir
+        }
+
+    def memory_bytes(self) -> int:
+        """IDF tablosunun boyutu (sabit)."""
+        return self.idf.itemsize * len(self.idf)
@@ -1,37 +1,12 @@
 from typing import Dict, Any, List
 from models.patient import Patient
-from database.db_setup import get_db
+from database.db_setup import get_read_db
+from doctor_catalog import catalog
 
 
 class RecommendationAgent:
     def __init__(self):
-        self.db = get_db()
-        self.doctors = {
-            "cardiology": [
-                {"name": "Dr. Emma Wilson", "experience": 15, "rating": 4.8},
-                {"name": "Dr. James Smith", "experience": 12, "rating": 4.6}
-            ],
-            "neurology": [
-                {"name": "Dr. Michael Chen", "experience": 18, "rating": 4.9},
-                {"name": "Dr. Sarah Johnson", "experience": 14, "rating": 4.7}
-            ],
-            "orthopedics": [
-                {"name": "Dr. Robert Brown", "experience": 16, "rating": 4.8},
-                {"name": "Dr. Lisa Anderson", "experience": 13, "rating": 4.5}
-            ],
-            "pediatrics": [
-                {"name": "Dr. David Kim", "experience": 17, "rating": 4.9},
-                {"name": "Dr. Maria Garcia", "experience": 15, "rating": 4.7}
-            ],
-            "dermatology": [
-                {"name": "Dr. Thomas Lee", "experience": 14, "rating": 4.6},
-                {"name": "Dr. Jennifer White", "experience": 12, "rating": 4.5}
-            ],
-            "ophthalmology": [
-                {"name": "Dr. William Taylor", "experience": 16, "rating": 4.8},
-                {"name": "Dr. Emily Davis", "experience": 13, "rating": 4.6}
-            ]
-        }
+        self.db = get_read_db()
 
     async def get_recommendation(self, patient_id: str) -> Dict[str, Any]:
         """
@@ -84,8 +59,9 @@ class RecommendationAgent:
         )
 
     def _get_doctors_for_department(self, department: str) -> List[Dict[str, Any]]:
-        """Belirli bir departman için doktorları döndürür."""
-        return self.doctors.get(department, [])
+        """Belirli bir departman için doktorları katalogdan döndürür."""
+        # Skorlama sözlükleri değiştirdiği için anlık görüntünün kopyası döner
+        return [doctor.to_dict() for doctor in catalog.in_department(department)]
 
     def _score_and_sort_doctors(self, doctors: List[Dict[str, Any]], diagnosis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -1,8 +1,11 @@
 from typing import Dict, List
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from models.patient import Doctor, Appointment, Patient
-import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from models.patient import Appointment, Patient
+from availability import availability_cache, iter_schedule, utc_now
+from doctor_catalog import catalog
+from profiling import timed
 
 
 class RecommendationAgent:
@@ -22,10 +25,8 @@ class RecommendationAgent:
             Dict: Öneriler ve doktor bilgileri
         """
         try:
-            # Departmandaki doktorları getir
-            doctors = self.db.query(Doctor).filter(
-                Doctor.department == department
-            ).all()
+            # Departmandaki doktorları katalogdan getir (sorgu yok)
+            doctors = catalog.in_department(department)
 
             if not doctors:
                 raise Exception(
@@ -35,7 +36,7 @@ class RecommendationAgent:
             doctor_availability = []
             for doctor in doctors:
                 availability = await self._check_doctor_availability(
-                    doctor.id,
+                    int(doctor.id),
                     preferred_date
                 )
                 if availability:
@@ -44,7 +45,7 @@ class RecommendationAgent:
                             "id": doctor.id,
                             "name": doctor.name,
                             "specialization": doctor.specialization,
-                            "experience": self._calculate_experience(doctor.created_at)
+                            "experience": doctor.experience
                         },
                         "available_slots": availability
                     })
@@ -67,12 +68,24 @@ class RecommendationAgent:
         except Exception as e:
             raise Exception(f"Error generating recommendations: {str(e)}")
 
+    @timed("recommendation.check_doctor_availability")
     async def _check_doctor_availability(self, doctor_id: int, preferred_date: datetime = None) -> List[datetime]:
         """Doktorun müsait randevu saatlerini kontrol eder."""
         # Varsayılan olarak bugünden itibaren 7 günlük randevuları kontrol et
         if not preferred_date:
-            preferred_date = datetime.now()
-
+            preferred_date = utc_now()
+
+        # Sonuç, doktorun randevuları değişene kadar saat bazında önbellekte tutulur;
+        # hesaplama da aynı saatle yapılır ki önbellekteki değer anahtarına uysun
+        hour = preferred_date.replace(minute=0, second=0, microsecond=0)
+        return availability_cache.get(
+            doctor_id,
+            hour,
+            lambda: self._compute_doctor_availability(doctor_id, hour),
+        )
+
+    def _compute_doctor_availability(self, doctor_id: int, preferred_date: datetime) -> List[datetime]:
+        """Doktorun 7 günlük müsait saatlerini veritabanından hesaplar."""
         end_date = preferred_date + timedelta(days=7)
 
         # Mevcut randevuları al
@@ -83,31 +96,15 @@ class RecommendationAgent:
             Appointment.status == "scheduled"
         ).all()
 
-        # Müsait saatleri hesapla
-        available_slots = []
-        current_date = preferred_date
-
-        while current_date <= end_date:
-            # Her gün için 09:00-17:00 arası randevu saatleri
-            for hour in range(9, 17):
-                slot = current_date.replace(
-                    hour=hour, minute=0, second=0, microsecond=0)
-
-                # Eğer slot müsaitse ekle
-                if not any(
-                    app.appointment_date == slot
-                    for app in existing_appointments
-                ):
-                    available_slots.append(slot)
-
-            current_date += timedelta(days=1)
+        # Müsait saatleri hesapla (klinik çalışma saatleri, UTC olarak)
+        taken = {app.appointment_date for app in existing_appointments}
+        available_slots = [
+            slot for slot in iter_schedule(preferred_date, end_date)
+            if slot not in taken
+        ]
 
         return available_slots
 
-    def _calculate_experience(self, created_at: datetime) -> int:
-        """Doktorun deneyim süresini hesaplar (yıl olarak)."""
-        return (datetime.now() - created_at).days // 365
-
     def _generate_recommendations(self, patient_id: int, department: str) -> Dict:
         """Hasta için özel öneriler oluşturur."""
         # Hasta geçmişini al
@@ -160,3 +157,30 @@ class RecommendationAgent:
             ])
 
         return recommendations
+
+
+# Ajan randevuları SQLAlchemy deposundan okur: önbellek bu depodaki değişikliklerle,
+# işlem commit edildiğinde temizlenir (diğer süreçlerin yazdıkları en geç ttl_seconds sonra görülür)
+@event.listens_for(Appointment, "after_insert")
+@event.listens_for(Appointment, "after_update")
+@event.listens_for(Appointment, "after_delete")
+def _note_changed_doctor(mapper, connection, target):
+    session = object_session(target)
+    if session is None:
+        return
+    changed = session.info.setdefault("changed_doctors", set())
+    changed.add(target.doctor_id)
+    # Randevu başka doktora taşındıysa eski doktor da değişmiştir
+    changed.update(inspect(target).attrs.doctor_id.history.deleted or ())
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_doctors(session):
+    for doctor_id in session.info.pop("changed_doctors", ()):
+        if doctor_id is not None:
+            availability_cache.invalidate(doctor_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_doctors(session):
+    session.info.pop("changed_doctors", None)
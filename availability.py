@@ -0,0 +1,206 @@
+"""
+Appointment availability: an index of taken slots and a department-wide
+"earliest free slot" search.
+
+Every doctor's free slots form a lazily generated, time-ordered stream.
+next_available() k-way merges the streams of a department with a heap
+(heapq.merge) and stops after k slots, so finding the earliest slot in a
+department with many doctors touches only the first few slots of each
+calendar instead of building every doctor's full slot list.
+
+AvailabilityCache keeps computed availability per doctor (e.g. the
+RecommendationAgent slot lists) until that doctor's appointments change,
+instead of recomputing for every doctor. The owner of the data invalidates
+it: slot events (slot_events.py) for PostgreSQL, commits of the SQLAlchemy
+session for the RecommendationAgent store.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from doctor_catalog import catalog
+
+# Slots are stored and indexed as naive UTC datetimes (see normalize_slot).
+# The working day is clinic wall-clock time: hourly slots, 09:00-16:00 start
+# times in CLINIC_TIMEZONE (host local time when unset).
+WORK_HOURS = range(9, 17)
+# How far ahead the search looks before giving up on a doctor
+SEARCH_HORIZON = timedelta(days=30)
+
+
+def normalize_slot(value) -> datetime:
+    """Parse an appointment date and drop timezone/seconds so it matches a slot key"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(second=0, microsecond=0)
+
+
+def utc_now() -> datetime:
+    """The current time in the slot convention (naive UTC)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _clinic_zone() -> Optional[ZoneInfo]:
+    # None makes astimezone() use the host's local time
+    name = os.getenv("CLINIC_TIMEZONE")
+    return ZoneInfo(name) if name else None
+
+
+def iter_schedule(after: datetime, until: datetime) -> Iterator[datetime]:
+    """Every working slot in [after, until), in order, as naive UTC"""
+    zone = _clinic_zone()
+    day = after.replace(tzinfo=timezone.utc).astimezone(zone).date()
+    while True:
+        for hour in WORK_HOURS:
+            local = datetime(day.year, day.month, day.day, hour, tzinfo=zone)
+            slot = local.astimezone(timezone.utc).replace(tzinfo=None)
+            if slot >= until:
+                return
+            if slot >= after:
+                yield slot
+        day += timedelta(days=1)
+
+
+class SlotIndex:
+    """Taken slots per doctor (doctor id -> set of slot datetimes)"""
+
+    def __init__(self):
+        self._taken: Dict[str, Set[datetime]] = {}
+        self._lock = threading.Lock()
+        self._fetch_taken = None
+
+    def configure(self, fetch_taken):
+        """Set the loader returning (doctor_id, appointment_date) rows of scheduled appointments"""
+        self._fetch_taken = fetch_taken
+
+    def reload(self):
+        """Rebuild the index from the database and swap it in"""
+        if self._fetch_taken is None:
+            return
+        taken: Dict[str, Set[datetime]] = {}
+        for doctor_id, appointment_date in self._fetch_taken():
+            taken.setdefault(str(doctor_id), set()).add(normalize_slot(appointment_date))
+        with self._lock:
+            self._taken = taken
+
+    def mark_taken(self, doctor_id, slot):
+        with self._lock:
+            self._taken.setdefault(str(doctor_id), set()).add(normalize_slot(slot))
+
+    def release(self, doctor_id, slot):
+        with self._lock:
+            self._taken.get(str(doctor_id), set()).discard(normalize_slot(slot))
+
+    def apply(self, event: Dict):
+        """Update one doctor from a slot event"""
+        if event["type"] == "taken":
+            self.mark_taken(event["doctor_id"], event["slot"])
+        elif event["type"] == "released":
+            self.release(event["doctor_id"], event["slot"])
+
+    def taken_slots(self, doctor_id, after: datetime) -> List[datetime]:
+        """A doctor's taken slots from `after` on, in order"""
+        return sorted(slot for slot in self._taken.get(str(doctor_id), ()) if slot >= after)
+
+    def is_taken(self, doctor_id, slot) -> bool:
+        return normalize_slot(slot) in self._taken.get(str(doctor_id), ())
+
+    def free_slots(self, doctor_id, after: datetime, until: datetime) -> Iterator[datetime]:
+        """Lazily yield a doctor's free slots in time order"""
+        taken = self._taken.get(str(doctor_id), ())
+        for slot in iter_schedule(after, until):
+            if slot not in taken:
+                yield slot
+
+    def _tagged_free_slots(self, rank: int, doctor, after: datetime, until: datetime):
+        # (slot, rank) orders the heap; rank keeps the doctor object out of comparisons
+        for slot in self.free_slots(doctor.id, after, until):
+            yield slot, rank, doctor
+
+    def next_available(self, doctors: Iterable, after: Optional[datetime] = None, k: int = 1,
+                       horizon: timedelta = SEARCH_HORIZON) -> List[Tuple[datetime, object]]:
+        """The k earliest free (slot, doctor) pairs across the given doctors.
+
+        `doctors` are catalog entries (anything with an `id`). Ties on the
+        same slot are broken by the order of `doctors`.
+        """
+        after = normalize_slot(after or utc_now())
+        until = after + horizon
+        streams = [
+            self._tagged_free_slots(rank, doctor, after, until)
+            for rank, doctor in enumerate(doctors)
+        ]
+        merged = heapq.merge(*streams)
+        return [(slot, doctor) for slot, _, doctor in itertools.islice(merged, k)]
+
+
+class AvailabilityCache:
+    """Computed availability per doctor, dropped when that doctor's slots change"""
+
+    def __init__(self, ttl_seconds: float = 300, max_entries_per_doctor: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_doctor = max_entries_per_doctor
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: Dict[str, Dict[object, Tuple[float, object]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._generation = 0  # bumped by clear()
+        self._lock = threading.Lock()
+
+    def get(self, doctor_id, key, compute):
+        """compute() once per (doctor, key) until the doctor is invalidated or the entry expires"""
+        doctor_id = str(doctor_id)
+        with self._lock:
+            entry = self._entries.get(doctor_id, {}).get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            version = (self._generation, self._versions.get(doctor_id, 0))
+        value = compute()
+        with self._lock:
+            # Not stored if the doctor (or everything) changed while computing
+            if (self._generation, self._versions.get(doctor_id, 0)) == version:
+                entries = self._entries.setdefault(doctor_id, {})
+                if len(entries) >= self.max_entries_per_doctor:
+                    entries.clear()
+                entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        return value
+
+    def invalidate(self, doctor_id):
+        doctor_id = str(doctor_id)
+        with self._lock:
+            self._versions[doctor_id] = self._versions.get(doctor_id, 0) + 1
+            if self._entries.pop(doctor_id, None):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "doctors": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+# One index and one cache per worker process, loaded by the application lifespan
+slot_index = SlotIndex()
+availability_cache = AvailabilityCache()
+
+
+def next_available(department: str, after: Optional[datetime] = None, k: int = 1) -> List[Tuple[datetime, object]]:
+    """The k earliest free (slot, doctor) pairs in a department"""
+    return slot_index.next_available(catalog.in_department(department), after=after, k=k)
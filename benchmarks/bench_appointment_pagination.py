@@ -0,0 +1,121 @@
+"""
+OFFSET vs keyset pagination deep into a large appointments table.
+
+Fills an appointments table with --rows rows (SQLite in memory by default,
+or a TEMP table on PostgreSQL with --dsn) and times fetching one page at
+increasing depths with both strategies.
+
+    python benchmarks/bench_appointment_pagination.py --rows 1000000
+    python benchmarks/bench_appointment_pagination.py --dsn "$DATABASE_URL"
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pagination import decode_cursor, encode_cursor  # noqa: E402
+
+PAGE = 50
+
+
+def rows(count, seed=11):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 9)
+    for i in range(1, count + 1):
+        yield (i, rng.randint(1, 200), start + timedelta(hours=rng.randint(0, 24 * 700)),
+               rng.choice(("scheduled", "completed", "cancelled")))
+
+
+def setup_sqlite(count):
+    conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    conn.execute("""CREATE TABLE appointments (
+        id INTEGER PRIMARY KEY, doctor_id INTEGER, appointment_date TIMESTAMP, status TEXT)""")
+    conn.executemany("INSERT INTO appointments VALUES (?, ?, ?, ?)", rows(count))
+    conn.execute("CREATE INDEX idx_appointments_date ON appointments (appointment_date, id)")
+    conn.commit()
+    return conn, "?"
+
+
+def setup_postgres(dsn, count):
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    # TEMP: dropped with the session, never touches the real table
+    cur.execute("""CREATE TEMP TABLE appointments (
+        id INTEGER PRIMARY KEY, doctor_id INTEGER, appointment_date TIMESTAMP, status TEXT)""")
+    execute_values(cur, "INSERT INTO appointments VALUES %s", rows(count), page_size=10000)
+    cur.execute("CREATE INDEX ON appointments (appointment_date, id)")
+    cur.execute("ANALYZE appointments")
+    conn.commit()
+    return conn, "%s"
+
+
+def offset_page(conn, ph, depth):
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, appointment_date FROM appointments ORDER BY appointment_date, id "
+                f"LIMIT {ph} OFFSET {ph}", (PAGE, depth))
+    return cur.fetchall()
+
+
+def keyset_page(conn, ph, cursor):
+    last_date, last_id = decode_cursor(cursor)
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, appointment_date FROM appointments "
+                f"WHERE (appointment_date, id) > ({ph}, {ph}) ORDER BY appointment_date, id LIMIT {ph}",
+                (last_date, last_id, PAGE))
+    return cur.fetchall()
+
+
+def cursor_at(conn, ph, depth):
+    """The cursor a client would hold after paging to `depth` rows"""
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, appointment_date FROM appointments ORDER BY appointment_date, id "
+                f"LIMIT 1 OFFSET {ph}", (depth - 1,))
+    appointment_id, appointment_date = cur.fetchone()
+    if isinstance(appointment_date, str):
+        appointment_date = datetime.fromisoformat(appointment_date)
+    return encode_cursor(appointment_date, appointment_id)
+
+
+def best_ms(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        began = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - began)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dsn", help="PostgreSQL DSN (uses a TEMP table)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    conn, ph = setup_postgres(args.dsn, args.rows) if args.dsn else setup_sqlite(args.rows)
+    print(f"loaded {args.rows:,} rows into {'postgres' if args.dsn else 'sqlite'} "
+          f"in {time.perf_counter() - began:.1f}s; page size {PAGE}")
+
+    print(f"{'depth':>10} {'OFFSET ms':>10} {'keyset ms':>10}")
+    depth = PAGE
+    while depth < args.rows:
+        cursor = cursor_at(conn, ph, depth)
+        assert offset_page(conn, ph, depth) == keyset_page(conn, ph, cursor), "pages differ"
+        offset_ms = best_ms(lambda: offset_page(conn, ph, depth), args.repeat)
+        keyset_ms = best_ms(lambda: keyset_page(conn, ph, cursor), args.repeat)
+        print(f"{depth:>10,} {offset_ms:>10.2f} {keyset_ms:>10.3f}")
+        depth *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Booking burst: synchronous inserts vs the write-behind outbox (booking_outbox.py).
+
+Fires --bookings bookings at once from --concurrency threads (the request
+threadpool) and reports, per mode:
+
+  p50 / p99 ms    time from the start of the burst until a booking is answered
+  answered/s      bookings answered per second of the burst
+  stored after s  time until every booking is in the appointments table
+  stored/s        bookings written to the database per second
+
+sync runs Database.create_appointment per booking (patient lookup and
+insert, one pooled connection each). outbox appends each booking to the
+SQLite outbox (fsync'd) while a flusher thread inserts them in batches
+through Database.create_appointments.
+
+Without --dsn the mock Database is used and each database round trip is
+modelled as --rtt-ms of latency over --pool connections. With --dsn the
+bookings go to TEMP tables on PostgreSQL over a single pooled connection.
+
+    python benchmarks/bench_booking_burst.py --bookings 2000 --rtt-ms 5
+    python benchmarks/bench_booking_burst.py --dsn "$DATABASE_URL" --bookings 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from booking_outbox import BookingOutbox  # noqa: E402
+from database import Database  # noqa: E402
+
+TC_NUMBER = "10000000001"
+
+
+class ModelledLatency:
+    """Mock Database whose calls hold one of `pool` connections for their round trips"""
+
+    def __init__(self, db, rtt, pool):
+        self.db = db
+        self.rtt = rtt
+        self.connections = threading.BoundedSemaphore(pool)
+
+    def create_appointment(self, booking):
+        with self.connections:
+            time.sleep(2 * self.rtt)  # patient lookup, insert
+            return self.db.create_appointment(booking)
+
+    def create_appointments(self, bookings):
+        with self.connections:
+            time.sleep(3 * self.rtt)  # patient lookup, batch insert, commit
+            return self.db.create_appointments(bookings)
+
+    def count(self):
+        return len(self.db.mock_appointments)
+
+
+class Postgres:
+    def __init__(self, dsn):
+        os.environ.update({"DATABASE_URL": dsn, "DB_POOL_SIZE": "1"})
+        self.db = Database()
+        self.db.connect()
+        if not self.db.pool:
+            sys.exit("could not connect")
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            # TEMP tables shadow the real ones for this (only) pooled connection
+            cur.execute("""CREATE TEMP TABLE patients (
+                id SERIAL PRIMARY KEY, tc_number VARCHAR(11) UNIQUE NOT NULL, name VARCHAR(100) NOT NULL,
+                date_of_birth DATE NOT NULL, phone VARCHAR(20) NOT NULL, email VARCHAR(100) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+            cur.execute("""CREATE TEMP TABLE appointments (
+                id SERIAL PRIMARY KEY, patient_id INTEGER, department VARCHAR(100) NOT NULL,
+                doctor_name VARCHAR(100) NOT NULL, doctor_id VARCHAR(100) NOT NULL,
+                appointment_date TIMESTAMP NOT NULL, symptoms TEXT, status VARCHAR(20) DEFAULT 'scheduled',
+                idempotency_key VARCHAR(64) UNIQUE, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+            cur.execute("""INSERT INTO patients (tc_number, name, date_of_birth, phone, email)
+                VALUES (%s, 'Patient', DATE '1980-01-01', '555', 'p@example.com')""", (TC_NUMBER,))
+            cur.close()
+        self.create_appointment = self.db.create_appointment
+        self.create_appointments = self.db.create_appointments
+
+    def count(self):
+        with self.db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*) FROM appointments")
+            return cur.fetchone()[0]
+
+
+def bookings(count, run):
+    start = datetime(2027, 1, 4, 9) + timedelta(days=run * 400)
+    return [{
+        "tc_number": TC_NUMBER, "department": "Neurology", "doctor_id": str(i % 50), "doctor_name": f"Dr. {i % 50}",
+        "appointment_date": (start + timedelta(hours=i // 50)).isoformat(), "symptoms": "headache",
+    } for i in range(count)]
+
+
+def burst(handle, items, concurrency):
+    """Answer every booking from the pool; returns (latencies, wall seconds)
+
+    Every booking arrives when the burst starts, so its latency includes the
+    wait for a free thread.
+    """
+    latencies = [0.0] * len(items)
+    began = time.perf_counter()
+
+    def request(i):
+        handle(i, items[i])
+        latencies[i] = time.perf_counter() - began
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(request, range(len(items))))
+    return latencies, time.perf_counter() - began
+
+
+def run_sync(backend, items, concurrency):
+    before = backend.count()
+    latencies, wall = burst(lambda i, booking: backend.create_appointment(booking), items, concurrency)
+    assert backend.count() - before == len(items)
+    return latencies, wall, wall
+
+
+def run_outbox(backend, items, concurrency, batch, flush_ms):
+    before = backend.count()
+    directory = tempfile.mkdtemp()
+    outbox = BookingOutbox(path=os.path.join(directory, "outbox.db"), batch_size=batch)
+    outbox.open()
+    outbox._write = backend.create_appointments
+    stop = threading.Event()
+
+    def flusher():
+        while not stop.is_set():
+            outbox.flush()
+            stop.wait(flush_ms / 1000)
+
+    thread = threading.Thread(target=flusher, daemon=True)
+    began = time.perf_counter()
+    thread.start()
+    latencies, wall = burst(lambda i, booking: outbox.submit(f"bench-{i}", booking), items, concurrency)
+    while backend.count() - before < len(items):
+        time.sleep(0.005)
+    stored = time.perf_counter() - began
+    stop.set()
+    thread.join()
+    outbox.close()
+    return latencies, wall, stored
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="PostgreSQL DSN (uses TEMP tables)")
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=40, help="request threads (Starlette's default is 40)")
+    parser.add_argument("--rtt-ms", type=float, default=5, help="modelled round trip (without --dsn)")
+    parser.add_argument("--pool", type=int, default=5, help="modelled connections (without --dsn)")
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--flush-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    if args.dsn:
+        backend = Postgres(args.dsn)
+        print(f"PostgreSQL, 1 connection, {args.bookings} bookings from {args.concurrency} threads")
+    else:
+        db = Database()
+        db.mock_mode = True
+        db.init_mock_data()
+        backend = ModelledLatency(db, args.rtt_ms / 1000, args.pool)
+        print(f"mock database, {args.rtt_ms:g} ms round trips over {args.pool} connections, "
+              f"{args.bookings} bookings from {args.concurrency} threads")
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p99 ms':>8} {'answered/s':>11} {'stored after s':>15} {'stored/s':>9}")
+    for run, mode in enumerate(("sync", "outbox")):
+        items = bookings(args.bookings, run)
+        # The Database methods log every call; keep that out of the timing
+        with contextlib.redirect_stdout(io.StringIO()):
+            if mode == "sync":
+                latencies, wall, stored = run_sync(backend, items, args.concurrency)
+            else:
+                latencies, wall, stored = run_outbox(backend, items, args.concurrency, args.batch, args.flush_ms)
+        print(f"{mode:<8} {percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+              f"{len(items) / wall:>11,.0f} {stored:>15.2f} {len(items) / stored:>9,.0f}")
+
+    if args.dsn:
+        backend.db.close()
+
+
+if __name__ == "__main__":
+    main()
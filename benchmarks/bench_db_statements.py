@@ -0,0 +1,125 @@
+"""
+Per-call overhead of the hot Database queries.
+
+Row decoding (no database needed): a RealDictRow per row, as RealDictCursor
+builds, against a PatientRecord built from the plain tuple row.
+
+With --dsn, also times Database.check_patient_exists and
+Database.create_appointment against PostgreSQL with plain SQL text and with
+prepared statements. It uses a single pooled connection and TEMP tables,
+so nothing is written to the real tables.
+
+    python benchmarks/bench_db_statements.py
+    python benchmarks/bench_db_statements.py --dsn "$DATABASE_URL" --calls 2000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from psycopg2.extras import RealDictRow  # noqa: E402
+
+from database import Database, PatientRecord  # noqa: E402
+
+COLUMNS = PatientRecord._fields
+ROW = (1, "12345678901", "Ayse Yilmaz", date(1990, 5, 17), "5551234567", "ayse@example.com", datetime(2026, 1, 5, 9))
+
+
+def bench_decode(rows):
+    def per_row(build):
+        began = time.perf_counter()
+        for _ in range(rows):
+            build(ROW)
+        return (time.perf_counter() - began) / rows * 1e9
+
+    def footprint(build):
+        tracemalloc.start()
+        kept = [build(ROW) for _ in range(10000)]
+        size = tracemalloc.get_traced_memory()[0] / len(kept)
+        tracemalloc.stop()
+        return size
+
+    def as_real_dict(row):
+        return RealDictRow(zip(COLUMNS, row))
+
+    print(f"{'row type':<14} {'ns/row':>8} {'bytes/row':>10}")
+    for name, build in (("RealDictRow", as_real_dict), ("PatientRecord", PatientRecord._make)):
+        print(f"{name:<14} {per_row(build):>8.0f} {footprint(build):>10.0f}")
+
+
+def bench_queries(dsn, calls, patients):
+    os.environ.update({"DATABASE_URL": dsn, "DB_POOL_SIZE": "1"})
+    db = Database()
+    db.connect()
+    if not db.pool:
+        sys.exit("could not connect")
+
+    with db.connection() as conn:
+        cur = conn.cursor()
+        # TEMP tables shadow the real ones for this (only) pooled connection
+        cur.execute("""CREATE TEMP TABLE patients (
+            id SERIAL PRIMARY KEY, tc_number VARCHAR(11) UNIQUE NOT NULL, name VARCHAR(100) NOT NULL,
+            date_of_birth DATE NOT NULL, phone VARCHAR(20) NOT NULL, email VARCHAR(100) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+        cur.execute("""CREATE TEMP TABLE appointments (
+            id SERIAL PRIMARY KEY, patient_id INTEGER, department VARCHAR(100) NOT NULL,
+            doctor_name VARCHAR(100) NOT NULL, doctor_id VARCHAR(100) NOT NULL,
+            appointment_date TIMESTAMP NOT NULL, symptoms TEXT, status VARCHAR(20) DEFAULT 'scheduled',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+        cur.execute("""INSERT INTO patients (tc_number, name, date_of_birth, phone, email)
+            SELECT (10000000000 + g)::text, 'Patient ' || g, DATE '1980-01-01', '555', 'p' || g || '@example.com'
+            FROM generate_series(1, %s) g""", (patients,))
+        cur.execute("ANALYZE patients")
+        cur.close()
+
+    start = datetime(2026, 1, 5, 9)
+
+    def check(i):
+        db.check_patient_exists(str(10000000000 + i % patients + 1))
+
+    def book(i):
+        db.create_appointment({
+            "tc_number": str(10000000000 + i % patients + 1), "department": "Neurology",
+            "doctor_id": "1", "doctor_name": "Dr. 1",
+            "appointment_date": (start + timedelta(hours=i)).isoformat(), "symptoms": "",
+        })
+
+    print(f"{'query':<22} {'plain us':>9} {'prepared us':>12}")
+    for name, func in (("check_patient_exists", check), ("create_appointment", book)):
+        timings = []
+        for prepared in (False, True):
+            db.prepared_statements = prepared
+            func(0)  # prepares on the first call
+            # The Database methods log every call; keep that out of the timing
+            with contextlib.redirect_stdout(io.StringIO()):
+                began = time.perf_counter()
+                for i in range(calls):
+                    func(i)
+                timings.append((time.perf_counter() - began) / calls * 1e6)
+        print(f"{name:<22} {timings[0]:>9.0f} {timings[1]:>12.0f}")
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="PostgreSQL DSN (uses TEMP tables)")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--patients", type=int, default=100000)
+    parser.add_argument("--rows", type=int, default=200000, help="rows for the decoding benchmark")
+    args = parser.parse_args()
+
+    bench_decode(args.rows)
+    if args.dsn:
+        print()
+        bench_queries(args.dsn, args.calls, args.patients)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+DiagnosisAgent department ranking: TF-IDF vs hashing vectorizer.
+
+For each vectorizer, on a labelled set of symptom reports:
+
+  top1 / top3   share of reports whose department is ranked first / in the top 3
+  score us      time to score every department for one report
+  update ms     time to add one department at runtime (update_department)
+  memory KB     memory of the agent after adding --departments synthetic
+                departments: department vectors for both, plus a vocabulary
+                that keeps growing (TF-IDF) or a fixed IDF table (hashing)
+
+The tfidf rows need scikit-learn and are skipped without it.
+
+    python benchmarks/bench_diagnosis_vectorizer.py
+    python benchmarks/bench_diagnosis_vectorizer.py --departments 2000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agents.diagnosis_agent import DiagnosisAgent  # noqa: E402
+from agents.keyword_vectors import HashingKeywordVectorizer  # noqa: E402
+
+# (primary symptoms, secondary symptoms, expected department)
+LABELLED = [
+    (["chest pain"], ["shortness of breath"], "cardiology"),
+    (["heart racing"], ["palpitations at night"], "cardiology"),
+    (["high blood pressure"], [], "cardiology"),
+    (["chest pain when climbing stairs"], [], "cardiology"),
+    (["headache"], ["dizziness"], "neurology"),
+    (["numbness in left arm"], ["tremor"], "neurology"),
+    (["seizure"], [], "neurology"),
+    (["memory loss"], ["confusion"], "neurology"),
+    (["back pain"], [], "orthopedics"),
+    (["joint pain in knees"], ["muscle ache"], "orthopedics"),
+    (["ankle sprain"], [], "orthopedics"),
+    (["possible fracture"], ["bone pain"], "orthopedics"),
+    (["child has a fever"], ["cough"], "pediatrics"),
+    (["vaccination for my child"], [], "pediatrics"),
+    (["growth and development check"], [], "pediatrics"),
+    (["itchy rash"], ["dry skin"], "dermatology"),
+    (["acne"], [], "dermatology"),
+    (["skin allergy"], ["itching"], "dermatology"),
+    (["blurry vision"], ["eye pain"], "ophthalmology"),
+    (["need new glasses"], [], "ophthalmology"),
+    (["cataract"], [], "ophthalmology"),
+    (["sore throat"], ["ear ache"], "ent"),
+    (["blocked nose"], ["sinus pressure"], "ent"),
+    (["hearing loss"], [], "ent"),
+    (["loss of taste"], [], "ent"),
+    (["anxiety"], ["trouble sleeping"], "psychiatry"),
+    (["depression"], ["low mood"], "psychiatry"),
+    (["stress at work"], ["sleep problems"], "psychiatry"),
+    (["stomach ache"], ["nausea"], "gastroenterology"),
+    (["vomiting"], ["diarrhea"], "gastroenterology"),
+    (["constipation"], ["bloating after meals", "poor digestion"], "gastroenterology"),
+    (["diabetes check"], [], "endocrinology"),
+    (["thyroid problem"], ["weight gain"], "endocrinology"),
+    (["hormone imbalance"], ["slow metabolism"], "endocrinology"),
+]
+
+NEW_DEPARTMENT = ("urology", ["kidney", "bladder", "urine", "prostate", "urinary infection"])
+NEW_CASES = [(["pain when passing urine"], ["bladder pressure"], "urology"), (["kidney stones"], [], "urology")]
+
+
+def make_agent(mode, ngrams=(1, 2)):
+    os.environ["DIAGNOSIS_VECTORIZER"] = mode
+    agent = DiagnosisAgent()
+    agent._initialize_vectors()
+    if mode == "hashing" and ngrams != (1, 2):
+        vectorizer = HashingKeywordVectorizer(ngram_range=ngrams)
+        vectorizer.fit_idf(k for keywords in agent.department_keywords.values() for k in keywords)
+        for dept, keywords in agent.department_keywords.items():
+            vectorizer.set_department(dept, keywords)
+        agent.vectorizer = vectorizer
+    return agent
+
+
+def accuracy(agent, cases):
+    top1 = top3 = 0
+    for primary, secondary, expected in cases:
+        result = asyncio.run(agent.analyze({"primary": primary, "secondary": secondary}))
+        ranked = [d["department"] for d in result["recommended_departments"] if d["confidence"] > 0]
+        top1 += bool(ranked) and ranked[0] == expected
+        top3 += expected in ranked[:3]
+    return top1 / len(cases), top3 / len(cases)
+
+
+def score_us(agent, repeat):
+    texts = [" ".join(p + s) for p, s, _ in LABELLED]
+    began = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            agent._department_scores(text)
+    return (time.perf_counter() - began) / (repeat * len(texts)) * 1e6
+
+
+def update_ms(agent):
+    began = time.perf_counter()
+    agent.update_department(*NEW_DEPARTMENT)
+    return (time.perf_counter() - began) * 1000
+
+
+def memory_kb(mode, ngrams, departments):
+    rng = random.Random(7)
+    words = [f"term{i}" for i in range(departments * 5)]
+    tracemalloc.start()
+    agent = make_agent(mode, ngrams)
+    for i in range(departments):
+        agent.update_department(f"synthetic{i}", rng.sample(words, 6))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--departments", type=int, default=500, help="synthetic departments for the memory column")
+    args = parser.parse_args()
+
+    variants = [("tfidf", "tfidf", None), ("hashing 1-gram", "hashing", (1, 1)), ("hashing 1-2-gram", "hashing", (1, 2))]
+    print(f"{len(LABELLED)} labelled reports, {len(NEW_CASES)} for the department added at runtime")
+    print(f"{'vectorizer':<18} {'top1':>6} {'top3':>6} {'score us':>9} {'update ms':>10} {'new dept top1':>14} {'memory KB':>10}")
+    for name, mode, ngrams in variants:
+        try:
+            agent = make_agent(mode, ngrams)
+        except ImportError as e:
+            print(f"{name:<18} skipped: {e}")
+            continue
+        top1, top3 = accuracy(agent, LABELLED)
+        latency = score_us(agent, args.repeat)
+        update = update_ms(agent)
+        new_top1, _ = accuracy(agent, NEW_CASES)
+        memory = memory_kb(mode, ngrams, args.departments)
+        print(f"{name:<18} {top1:>6.0%} {top3:>6.0%} {latency:>9.1f} {update:>10.2f} {new_top1:>14.0%} {memory:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
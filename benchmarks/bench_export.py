@@ -0,0 +1,151 @@
+"""
+Memory use of the streaming export as the table grows.
+
+Runs export.stream_export into /dev/null for increasing row counts and
+samples the process RSS while it runs. The peak should stay flat as the
+row count grows; the "fetchall" baseline, which loads every row before
+encoding, grows with it.
+
+Without --dsn the rows come from a generator shaped like the appointments
+export, which measures the encoding and gzip pipeline. With --dsn the rows
+are inserted into a TEMP appointments table and read back through
+Database.export_rows (a named server-side cursor).
+
+    python benchmarks/bench_export.py --rows 100000 1000000 3000000
+    python benchmarks/bench_export.py --dsn "$DATABASE_URL" --rows 1000000 5000000
+"""
+import argparse
+import gc
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from export import stream_export  # noqa: E402
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+class PeakRSS:
+    """Samples RSS in a background thread; .peak is the growth over the start"""
+
+    def __enter__(self):
+        gc.collect()
+        self.start = rss_bytes()
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, rss_bytes() - self.start)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes() - self.start)
+
+
+class GeneratedRows:
+    """Row source shaped like Database.export_rows('appointments')"""
+
+    def __init__(self, count):
+        self.count = count
+
+    def export_rows(self, table, fetch_size=5000):
+        start = datetime(2026, 1, 5, 9)
+        for i in range(1, self.count + 1):
+            yield (i, i % 50000 + 1, str(10000000000 + i % 50000), "Neurology", str(i % 200 + 1),
+                   f"Dr. {i % 200 + 1}", start + timedelta(hours=i % 5000), "headache, dizziness",
+                   "scheduled", start)
+
+
+class Materialized:
+    """The fetchall approach: every row in memory before encoding starts"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def export_rows(self, table, fetch_size=5000):
+        return iter(list(self.source.export_rows(table, fetch_size)))
+
+
+def setup_postgres(dsn, count):
+    os.environ.update({"DATABASE_URL": dsn, "DB_POOL_SIZE": "1", "DB_STATEMENT_TIMEOUT_MS": "0"})
+    from database import Database
+
+    db = Database()
+    db.connect()
+    if not db.pool:
+        sys.exit("could not connect")
+    with db.connection() as conn:
+        cur = conn.cursor()
+        # TEMP tables shadow the real ones on this (only) pooled connection
+        cur.execute("DROP TABLE IF EXISTS pg_temp.appointments, pg_temp.patients")
+        cur.execute("CREATE TEMP TABLE patients (id SERIAL PRIMARY KEY, tc_number TEXT)")
+        cur.execute("""CREATE TEMP TABLE appointments (
+            id SERIAL PRIMARY KEY, patient_id INTEGER, department TEXT, doctor_id TEXT, doctor_name TEXT,
+            appointment_date TIMESTAMP, symptoms TEXT, status TEXT, created_at TIMESTAMP)""")
+        cur.execute("INSERT INTO patients (tc_number) SELECT (10000000000 + g)::text FROM generate_series(1, 50000) g")
+        cur.execute("""INSERT INTO appointments
+            (patient_id, department, doctor_id, doctor_name, appointment_date, symptoms, status, created_at)
+            SELECT g % 50000 + 1, 'Neurology', (g % 200 + 1)::text, 'Dr. ' || (g % 200 + 1),
+                   TIMESTAMP '2026-01-05 09:00' + (g % 5000) * INTERVAL '1 hour',
+                   'headache, dizziness', 'scheduled', now()
+            FROM generate_series(1, %s) g""", (count,))
+        cur.close()
+    return db
+
+
+def run(source, fmt, compress, fetch_size):
+    began = time.perf_counter()
+    written = 0
+    with PeakRSS() as rss, open(os.devnull, "wb") as out:
+        for chunk in stream_export(source, "appointments", fmt, fetch_size, compress):
+            out.write(chunk)
+            written += len(chunk)
+    return time.perf_counter() - began, rss.peak, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 3_000_000])
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--fetch-size", type=int, default=5000)
+    parser.add_argument("--dsn", help="PostgreSQL DSN (uses TEMP tables)")
+    parser.add_argument("--no-baseline", action="store_true", help="skip the fetchall comparison")
+    args = parser.parse_args()
+
+    print(f"{args.format}{' + gzip' if args.gzip else ''}, fetch size {args.fetch_size}, "
+          f"source: {'postgres' if args.dsn else 'generated rows'}")
+    print(f"{'rows':>10} {'mode':<10} {'seconds':>8} {'rows/s':>10} {'output MB':>10} {'peak RSS MB':>12}")
+    for count in args.rows:
+        if args.dsn:
+            source = setup_postgres(args.dsn, count)
+        else:
+            source = GeneratedRows(count)
+        modes = [("stream", source)]
+        if not args.no_baseline:
+            modes.append(("fetchall", Materialized(source)))
+        for mode, rows in modes:
+            seconds, peak, written = run(rows, args.format, args.gzip, args.fetch_size)
+            print(f"{count:>10,} {mode:<10} {seconds:>8.1f} {count / seconds:>10,.0f} "
+                  f"{written / 1e6:>10.1f} {peak / 1e6:>12.1f}")
+        if args.dsn:
+            source.close()
+
+
+if __name__ == "__main__":
+    main()
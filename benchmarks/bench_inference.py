@@ -0,0 +1,129 @@
+"""
+CPU inference benchmark and accuracy-parity check for the diagnosis classifier.
+
+Each backend runs in its own process (so peak RSS is per backend) on the
+same symptom texts. Reports single-text latency, batched throughput, peak
+memory and how often each backend agrees with the PyTorch reference.
+
+    python benchmarks/bench_inference.py --backends torch torch-int8 onnx
+    python benchmarks/bench_inference.py --min-agreement 0.95   # fails below
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SAMPLES = [
+    "chest pain and palpitations when climbing stairs",
+    "severe headache with dizziness and numbness in my left arm",
+    "my knee joint hurts after a fall, possible fracture",
+    "child has had a fever and cough for three days",
+    "itchy red rash on both arms after using a new soap",
+    "blurred vision and pain behind the eyes",
+    "ear pain and a sore throat, hard to swallow",
+    "feeling anxious, cannot sleep, low mood for weeks",
+    "nausea, vomiting and diarrhea since last night",
+    "always thirsty, losing weight, maybe diabetes",
+    "shortness of breath and high blood pressure",
+    "back pain radiating down my leg",
+    "tremor in my hands and memory problems",
+    "acne and dry skin on my face",
+    "sinus pressure and blocked nose",
+    "constipation and stomach cramps",
+]
+
+
+def run_backend(backend, repeat, batch_size):
+    """Measure one backend in this process and print a JSON result"""
+    os.environ["DIAGNOSIS_BACKEND"] = backend
+    from agents.diagnosis_agent import CLASSIFIER_MODEL
+    from agents.inference import load_text_classifier
+
+    start = time.perf_counter()
+    classifier = load_text_classifier(CLASSIFIER_MODEL, backend=backend)
+    load_seconds = time.perf_counter() - start
+
+    predictions = [classifier(text)[0] for text in SAMPLES]
+
+    latencies = []
+    for _ in range(repeat):
+        for text in SAMPLES:
+            start = time.perf_counter()
+            classifier(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    batches = [SAMPLES[i:i + batch_size] for i in range(0, len(SAMPLES), batch_size)]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for batch in batches:
+            classifier(batch)
+    throughput = repeat * len(SAMPLES) / (time.perf_counter() - start)
+
+    latencies.sort()
+    print(json.dumps({
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "throughput": throughput,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "predictions": predictions,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--min-agreement", type=float, default=0.0)
+    parser.add_argument("--run-backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_backend:
+        run_backend(args.run_backend, args.repeat, args.batch_size)
+        return 0
+
+    backends = args.backends if "torch" in args.backends else ["torch"] + args.backends
+    results = {}
+    for backend in backends:
+        proc = subprocess.run(
+            [sys.executable, __file__, "--run-backend", backend,
+             "--repeat", str(args.repeat), "--batch-size", str(args.batch_size)],
+            capture_output=True, text=True, env=dict(os.environ, CUDA_VISIBLE_DEVICES=""),
+        )
+        if proc.returncode != 0:
+            print(f"{backend}: failed\n{proc.stderr.strip().splitlines()[-1]}")
+            continue
+        results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    if "torch" not in results:
+        print("The torch reference backend did not run; cannot check parity")
+        return 1
+
+    reference = results["torch"]["predictions"]
+    print(f"\n{'backend':<12} {'load s':>7} {'p50 ms':>8} {'p95 ms':>8} {'texts/s':>9} {'RSS MB':>8} "
+          f"{'agree':>7} {'max |dscore|':>13}")
+    failed = False
+    for backend, result in results.items():
+        agree = sum(p["label"] == r["label"] for p, r in zip(result["predictions"], reference)) / len(reference)
+        delta = max(abs(p["score"] - r["score"]) for p, r in zip(result["predictions"], reference))
+        print(f"{backend:<12} {result['load_seconds']:>7.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['throughput']:>9.1f} {result['peak_rss_mb']:>8.0f} {agree:>7.1%} {delta:>13.4f}")
+        if agree < args.min_agreement:
+            failed = True
+            print(f"FAIL: {backend} agrees with torch on {agree:.1%} of samples "
+                  f"(minimum {args.min_agreement:.1%})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Earliest-slot search in a large department with dense calendars.
+
+Compares availability.SlotIndex.next_available (heap merge, stops after k)
+with the RecommendationAgent approach: build every doctor's full free-slot
+list over the horizon, then sort everything.
+
+    python benchmarks/bench_next_available.py --doctors 60 --density 0.9 --k 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from availability import SlotIndex, iter_schedule  # noqa: E402
+from doctor_catalog import DoctorEntry  # noqa: E402
+
+
+def build(doctors, density, days, start, seed=7):
+    rng = random.Random(seed)
+    catalog = [
+        DoctorEntry(id=str(i), name=f"Dr. {i}", department="Neurology", specialization="", experience=10, rating=4.5)
+        for i in range(1, doctors + 1)
+    ]
+    index = SlotIndex()
+    for doctor in catalog:
+        for slot in iter_schedule(start, start + timedelta(days=days)):
+            if rng.random() < density:
+                index.mark_taken(doctor.id, slot)
+    return catalog, index
+
+
+def full_scan(catalog, index, start, days, k):
+    until = start + timedelta(days=days)
+    everything = []
+    for rank, doctor in enumerate(catalog):
+        everything.extend((slot, rank, doctor.id) for slot in index.free_slots(doctor.id, start, until))
+    everything.sort()
+    return [(slot, doctor_id) for slot, _, doctor_id in everything[:k]]
+
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - began)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doctors", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--density", type=float, default=0.9, help="fraction of slots already taken")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    start = datetime(2026, 1, 5, 8, 0)
+    print(f"density {args.density:.0%}, {args.days}-day horizon, k={args.k}")
+    print(f"{'doctors':>8} {'full scan ms':>13} {'heap merge ms':>14} {'speedup':>8}")
+    for doctors in args.doctors:
+        catalog, index = build(doctors, args.density, args.days, start)
+        scan_ms, expected = timed(lambda: full_scan(catalog, index, start, args.days, args.k), args.repeat)
+        merge_ms, found = timed(
+            lambda: index.next_available(catalog, after=start, k=args.k, horizon=timedelta(days=args.days)),
+            args.repeat,
+        )
+        assert [(slot, doctor.id) for slot, doctor in found] == expected, "results differ"
+        print(f"{doctors:>8} {scan_ms:>13.2f} {merge_ms:>14.3f} {scan_ms / merge_ms:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Load test for scheduling.PriorityScheduler.
+
+Open-loop arrivals: low-priority requests at --overload times the capacity
+of the slots (so the worker is saturated and the backlog keeps growing)
+plus a trickle of high-priority requests. Every request holds a slot for
+--service-ms. Runs the same traffic through a single FIFO queue and through
+the priority queues and prints per-priority latency of the served requests.
+
+    python benchmarks/bench_priority_scheduler.py --seconds 10 --overload 1.5
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scheduling import PriorityScheduler  # noqa: E402
+
+
+async def load(scheduler, fifo, args, seed=3):
+    rng = random.Random(seed)
+    service = args.service_ms / 1000
+    rate = args.slots / service * args.overload
+    latencies = {"high": [], "low": []}
+    tasks = []
+
+    async def request(priority):
+        began = time.monotonic()
+        # FIFO baseline: everything shares one queue
+        async with scheduler.slot("medium" if fifo else priority):
+            await asyncio.sleep(service)
+        latencies[priority].append((time.monotonic() - began) * 1000)
+
+    stop = time.monotonic() + args.seconds
+    while time.monotonic() < stop:
+        priority = "high" if rng.random() < args.high_share else "low"
+        tasks.append(asyncio.ensure_future(request(priority)))
+        await asyncio.sleep(rng.expovariate(rate))
+
+    # Whatever is still queued at the end is dropped; only served requests count
+    await asyncio.sleep(service * 2)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return latencies
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[math.ceil(len(ordered) * q) - 1] if ordered else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--slots", type=int, default=4)
+    parser.add_argument("--service-ms", type=float, default=20)
+    parser.add_argument("--overload", type=float, default=1.5, help="arrival rate / capacity")
+    parser.add_argument("--high-share", type=float, default=0.05)
+    parser.add_argument("--aging-seconds", type=float, default=2)
+    args = parser.parse_args()
+
+    print(f"{args.slots} slots x {args.service_ms:.0f} ms, arrivals at {args.overload:.1f}x capacity, "
+          f"{args.high_share:.0%} high priority, {args.seconds:.0f}s")
+    print(f"{'queueing':<10} {'class':<6} {'served':>7} {'p50 ms':>9} {'p99 ms':>9}")
+    for fifo in (True, False):
+        scheduler = PriorityScheduler(slots=args.slots, aging_seconds=args.aging_seconds)
+        latencies = asyncio.run(load(scheduler, fifo, args))
+        for priority in ("high", "low"):
+            values = latencies[priority]
+            print(f"{'fifo' if fifo else 'priority':<10} {priority:<6} {len(values):>7} "
+                  f"{percentile(values, 0.5):>9.1f} {percentile(values, 0.99):>9.1f}")
+        if not fifo:
+            promoted = scheduler.stats()["priorities"]["low"]["promoted"]
+            print(f"{'':<10} low requests promoted by aging: {promoted}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Overhead of the profiling hooks (profiling.py).
+
+  span cost    a @timed function called outside a profiled request, and
+               inside one (span recorded, thread registered)
+  sampling     chat symptom detection (without its span) in a loop with no
+               profile and with a profile sampling the thread every --interval-ms
+
+    python benchmarks/bench_profiling.py
+    python benchmarks/bench_profiling.py --interval-ms 1
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat import detect_symptoms  # noqa: E402
+from profiling import profiler, timed  # noqa: E402
+
+MESSAGE = "I have had a headache and some dizziness since yesterday, and a bit of a cough " * 4
+
+
+def plain():
+    return None
+
+
+@timed("bench.noop")
+def decorated():
+    return None
+
+
+def per_call_ns(func, calls):
+    began = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - began) / calls * 1e9
+
+
+def detection_rate(seconds):
+    detect = detect_symptoms.__wrapped__  # sampling cost only, no span per call
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        detect(MESSAGE)
+        calls += 1
+    return calls / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500_000)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    args = parser.parse_args()
+    profiler.sampler.interval = args.interval_ms / 1000
+    profiler.max_seconds = args.seconds * 2
+
+    base = per_call_ns(plain, args.calls)
+    print(f"{'call':<28} {'ns/call':>8}")
+    print(f"{'plain function':<28} {base:>8.0f}")
+    print(f"{'@timed, not profiled':<28} {per_call_ns(decorated, args.calls):>8.0f}")
+    profile = profiler.start("/bench")
+    inside = per_call_ns(decorated, args.calls // 10)
+    profiler.stop(profile)
+    print(f"{'@timed, profiled':<28} {inside:>8.0f}")
+
+    print(f"\n{'detect_symptoms':<28} {'calls/s':>10}")
+    unprofiled = detection_rate(args.seconds)
+    print(f"{'no profile':<28} {unprofiled:>10,.0f}")
+    profile = profiler.start("/bench")
+    profiled = detection_rate(args.seconds)
+    profiler.stop(profile)
+    print(f"{f'sampled every {args.interval_ms:g} ms':<28} {profiled:>10,.0f}"
+          f"   ({(profiled / unprofiled - 1) * 100:+.1f}% throughput, {len(profile.samples)} samples)")
+
+
+if __name__ == "__main__":
+    main()
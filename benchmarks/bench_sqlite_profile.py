@@ -0,0 +1,125 @@
+"""
+Mixed read/write concurrency on SQLite: default engine vs production profile.
+
+Writer threads insert and commit rows (like PatientIntakeAgent.process)
+while reader threads look rows up, for a fixed duration. Reports commits
+and reads per second, "database is locked" errors and write latency.
+
+    python benchmarks/bench_sqlite_profile.py --writers 8 --readers 8 --seconds 10
+"""
+import argparse
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# database.py shadows the database/ directory as an import name, so load the
+# engine factory straight from its file.
+_spec = importlib.util.spec_from_file_location("db_setup", os.path.join(ROOT, "database", "db_setup.py"))
+db_setup = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(db_setup)
+
+
+def run(profile, writers, readers, seconds):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    url = f"sqlite:///{path}"
+    write_engine = db_setup.create_sqlite_engine(url, profile=profile)
+    read_engine = write_engine if profile == "default" else db_setup.create_sqlite_engine(url, profile=profile, read_only=True)
+    WriteSession = sessionmaker(bind=write_engine)
+    ReadSession = sessionmaker(bind=read_engine)
+
+    with write_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE patients (id INTEGER PRIMARY KEY, tc_number TEXT UNIQUE, name TEXT)"))
+
+    stop = time.monotonic() + seconds
+    counters = {"commits": 0, "reads": 0, "locked": 0}
+    write_latencies = []
+    lock = threading.Lock()
+    next_tc = iter(range(10_000_000_000, 20_000_000_000))
+
+    def writer():
+        while time.monotonic() < stop:
+            with lock:
+                tc_number = str(next(next_tc))
+            began = time.perf_counter()
+            session = WriteSession()
+            try:
+                # Read-then-write, the PatientIntakeAgent pattern
+                session.execute(text("SELECT id FROM patients WHERE tc_number = :tc"), {"tc": tc_number}).first()
+                session.execute(text("INSERT INTO patients (tc_number, name) VALUES (:tc, 'x')"), {"tc": tc_number})
+                session.commit()
+                with lock:
+                    counters["commits"] += 1
+                    write_latencies.append((time.perf_counter() - began) * 1000)
+            except OperationalError as e:
+                session.rollback()
+                if "locked" in str(e):
+                    with lock:
+                        counters["locked"] += 1
+                else:
+                    raise
+            finally:
+                session.close()
+
+    def reader():
+        rng = random.Random()
+        while time.monotonic() < stop:
+            session = ReadSession()
+            try:
+                tc_number = str(10_000_000_000 + rng.randint(0, max(counters["commits"], 1)))
+                session.execute(text("SELECT * FROM patients WHERE tc_number = :tc"), {"tc": tc_number}).first()
+                session.execute(text("SELECT COUNT(*) FROM patients")).scalar()
+                with lock:
+                    counters["reads"] += 1
+            except OperationalError as e:
+                if "locked" in str(e):
+                    with lock:
+                        counters["locked"] += 1
+                else:
+                    raise
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    write_latencies.sort()
+    return {
+        "commits/s": counters["commits"] / seconds,
+        "reads/s": counters["reads"] / seconds,
+        "locked": counters["locked"],
+        "write p50 ms": statistics.median(write_latencies) if write_latencies else float("nan"),
+        "write p99 ms": write_latencies[int(len(write_latencies) * 0.99) - 1] if write_latencies else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    columns = ["commits/s", "reads/s", "locked", "write p50 ms", "write p99 ms"]
+    print(f"{'profile':<11}" + "".join(f"{c:>14}" for c in columns))
+    for profile in ("default", "production"):
+        result = run(profile, args.writers, args.readers, args.seconds)
+        print(f"{profile:<11}" + "".join(f"{result[c]:>14.1f}" for c in columns))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Startup-time report and budget check (CI-runnable).
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter, prints
+the slowest imports by cumulative time and fails if importing the app, or
+running its lifespan startup in mock-database mode, exceeds the budget.
+
+    python benchmarks/bench_startup.py --budget-ms 1500 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must never be imported by `import main`
+FORBIDDEN = ("torch", "transformers", "sklearn")
+
+STARTUP_SNIPPET = """
+import asyncio, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+asyncio.run(main.worker.start())
+ready = time.perf_counter()
+print(f"{(imported - start) * 1000:.1f} {(ready - imported) * 1000:.1f}")
+"""
+
+
+def import_profile():
+    """Return [(cumulative_us, self_us, module)] from -X importtime"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True, env=_env(),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return rows
+
+
+def startup_times():
+    """Wall-clock ms for `import main` and for lifespan startup"""
+    proc = subprocess.run(
+        [sys.executable, "-c", STARTUP_SNIPPET],
+        cwd=ROOT, capture_output=True, text=True, env=_env(),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    import_ms, lifespan_ms = proc.stdout.strip().splitlines()[-1].split()
+    return float(import_ms), float(lifespan_ms)
+
+
+def _env():
+    # Measure the app, not a remote database
+    return dict(os.environ, DATABASE_URL="", PRELOAD_MODELS="false")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")))
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = import_profile()
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    failures = []
+    loaded = {name.strip().split(".")[0] for _, _, name in rows}
+    for module in FORBIDDEN:
+        if module in loaded:
+            failures.append(f"'{module}' is imported at startup")
+
+    import_ms, lifespan_ms = startup_times()
+    total_ms = import_ms + lifespan_ms
+    print(f"\nimport main: {import_ms:.1f} ms, lifespan startup: {lifespan_ms:.1f} ms, "
+          f"total: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if total_ms > args.budget_ms:
+        failures.append(f"startup took {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Recall and latency of keyword vs semantic symptom matching.
+
+Runs chat.detect_symptoms over a labelled set of patient messages, most of
+them paraphrases that share no keyword with the keyword table.
+
+    python benchmarks/bench_symptom_matching.py --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LABELLED = [
+    ("I have a terrible headache", {"headache"}),
+    ("my head is pounding since this morning", {"headache"}),
+    ("I keep throwing up and my tummy hurts", {"stomach pain"}),
+    ("I feel like vomiting after every meal", {"stomach pain"}),
+    ("I'm burning up and shivering", {"fever"}),
+    ("I have a high temperature", {"fever"}),
+    ("coughing all night with a scratchy throat", {"cough"}),
+    ("my lower back aches when I bend", {"back pain"}),
+    ("my knees and wrists are swollen", {"joint pain"}),
+    ("everything looks blurry", {"eye pain"}),
+    ("red itchy bumps all over my arms", {"skin rash"}),
+    ("the room keeps spinning when I stand up", {"dizziness"}),
+    ("I feel lightheaded and about to faint", {"dizziness"}),
+    ("I can't catch my breath and I'm wheezing", {"breathing difficulty"}),
+    ("my chest feels tight and I get out of breath", {"breathing difficulty"}),
+    ("head pain and a fever", {"headache", "fever"}),
+    ("sore throat and my eyes hurt", {"cough", "eye pain"}),
+    ("I broke out in hives and feel dizzy", {"skin rash", "dizziness"}),
+    ("nothing hurts, I just want a checkup", set()),
+    ("I need to renew my prescription", set()),
+]
+
+
+def evaluate(mode, repeat):
+    os.environ["SYMPTOM_MATCHER"] = mode
+    from chat import detect_symptoms
+
+    if mode == "semantic":
+        from symptom_index import get_index
+        start = time.perf_counter()
+        get_index()
+        print(f"semantic index load: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    true_positive = false_positive = expected = 0
+    for message, labels in LABELLED:
+        found = set(detect_symptoms(message))
+        true_positive += len(found & labels)
+        false_positive += len(found - labels)
+        expected += len(labels)
+
+    latencies = []
+    for _ in range(repeat):
+        for message, _ in LABELLED:
+            start = time.perf_counter()
+            detect_symptoms(message)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    return {
+        "recall": true_positive / expected,
+        "precision": true_positive / max(true_positive + false_positive, 1),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", default=["keyword", "semantic"])
+    args = parser.parse_args()
+
+    print(f"{'matcher':<10} {'recall':>7} {'precision':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode in args.modes:
+        result = evaluate(mode, args.repeat)
+        print(f"{mode:<10} {result['recall']:>7.1%} {result['precision']:>10.1%} "
+              f"{result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
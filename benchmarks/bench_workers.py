@@ -0,0 +1,86 @@
+"""
+Multi-worker scaling benchmark.
+
+Starts `python server.py` with an increasing WEB_CONCURRENCY, waits for every
+worker to report ready and then drives /api/chat from a pool of client
+threads. Prints requests/second for each worker count.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --requests 4000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/health/ready", timeout=1) as resp:
+                if resp.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def post_chat(base_url):
+    body = json.dumps({"tc_number": "12345678901", "message": "I have a headache and a fever"}).encode()
+    req = urllib.request.Request(f"{base_url}/api/chat", data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        resp.read()
+
+
+def run(workers, requests, concurrency, port):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port))
+    # Benchmark the server, not the remote database
+    env.setdefault("DATABASE_URL", "")
+    # Every request comes from one patient and one IP: measure throughput, not admission
+    # control, and stop without the pre-stop delay
+    env.update(RATE_LIMIT_PATIENT="0", RATE_LIMIT_IP="0", SCHEDULER_MAX_QUEUED="0", DRAIN_DELAY_SECONDS="0")
+    server = subprocess.Popen([sys.executable, "server.py"], cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        if not wait_ready(base_url):
+            raise RuntimeError(f"server with {workers} worker(s) never became ready")
+        # Give the remaining workers time to finish their own warm-up
+        time.sleep(1)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda _: post_chat(base_url), range(requests)))
+        elapsed = time.perf_counter() - start
+        return requests / elapsed
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, os.cpu_count() or 4])
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    for n in args.workers:
+        rps = run(n, args.requests, args.concurrency, args.port)
+        baseline = baseline or rps
+        print(f"{n:>8} {rps:>10.1f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Fault injection for the Database resilience settings.
+
+Puts a local TCP proxy between Database and PostgreSQL and breaks it while
+worker threads keep calling Database.doctor_catalog_version():
+
+  healthy    proxy forwards traffic
+  drop       open connections are cut and new ones refused
+  blackhole  new connections are accepted but never answered
+  restored   proxy forwards traffic again
+
+For every phase it prints successes, failures, fast failures (circuit open
+or not connected) and the worst call latency, then the circuit breaker
+transitions. It exits non-zero if a call outlived the timeouts or the
+database did not come back after the proxy was restored.
+
+Without --dsn only the "database down at startup" case runs: the proxy
+refuses everything, and calls must fail fast while the pool reconnects in
+the background.
+
+The proxy listens on 127.0.0.1, so the server is reached without its host
+name: against Neon add `options=endpoint%3D<endpoint-id>` to the DSN (or
+point --dsn at a local PostgreSQL).
+
+    python benchmarks/fault_injection_db.py --dsn "$DATABASE_URL"
+    python benchmarks/fault_injection_db.py
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from psycopg2.extensions import make_dsn, parse_dsn  # noqa: E402
+
+from database import Database, DatabaseUnavailable  # noqa: E402
+
+CONNECT_TIMEOUT = 2
+STATEMENT_TIMEOUT_MS = 2000
+BREAKER_RESET = 2
+
+
+class FaultProxy:
+    """TCP proxy whose mode can be switched between forward, drop and blackhole"""
+
+    def __init__(self, upstream_host, upstream_port):
+        self.upstream = (upstream_host, upstream_port)
+        self.mode = "forward"
+        self._sockets = set()
+        self._lock = threading.Lock()
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen(64)
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def set_mode(self, mode):
+        self.mode = mode
+        if mode != "forward":
+            # Cut every open connection
+            with self._lock:
+                sockets, self._sockets = self._sockets, set()
+            for sock in sockets:
+                _close(sock)
+
+    def _accept(self):
+        while True:
+            client, _ = self._server.accept()
+            if self.mode == "drop":
+                _close(client)
+                continue
+            with self._lock:
+                self._sockets.add(client)
+            if self.mode == "blackhole":
+                continue  # never answered, closed on the next mode change
+            try:
+                upstream = socket.create_connection(self.upstream, timeout=5)
+                upstream.settimeout(None)
+            except OSError:
+                _close(client)
+                continue
+            with self._lock:
+                self._sockets.add(upstream)
+            threading.Thread(target=self._pump, args=(client, upstream), daemon=True).start()
+            threading.Thread(target=self._pump, args=(upstream, client), daemon=True).start()
+
+    def _pump(self, source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                target.sendall(data)
+        except OSError:
+            pass
+        _close(source)
+        _close(target)
+
+
+def _close(sock):
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+
+class Load:
+    """Threads calling the database in a loop, with per-phase counters"""
+
+    def __init__(self, db, threads):
+        self.db = db
+        self.phase = None
+        self.results = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(threads)]
+
+    def start(self, phase):
+        self.set_phase(phase)
+        for thread in self._threads:
+            thread.start()
+
+    def set_phase(self, phase):
+        with self._lock:
+            self.phase = phase
+            self.results[phase] = {"ok": 0, "failed": 0, "fast_failed": 0, "max_ms": 0.0, "first_ok": None}
+            self._phase_started = time.monotonic()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            began = time.monotonic()
+            outcome = "ok"
+            try:
+                self.db.doctor_catalog_version()
+            except DatabaseUnavailable:
+                outcome = "fast_failed"
+            except Exception:
+                outcome = "failed"
+            elapsed = time.monotonic() - began
+            with self._lock:
+                result = self.results[self.phase]
+                result[outcome] += 1
+                result["max_ms"] = max(result["max_ms"], elapsed * 1000)
+                if outcome == "ok" and result["first_ok"] is None:
+                    result["first_ok"] = time.monotonic() - self._phase_started
+            if outcome != "ok":
+                time.sleep(0.05)
+
+
+def configure(dsn):
+    os.environ.update({
+        "DATABASE_URL": dsn,
+        "DB_POOL_SIZE": "4",
+        "DB_CONNECT_TIMEOUT": str(CONNECT_TIMEOUT),
+        "DB_STATEMENT_TIMEOUT_MS": str(STATEMENT_TIMEOUT_MS),
+        "DB_POOL_TIMEOUT": "2",
+        "DB_BREAKER_FAILURES": "3",
+        "DB_BREAKER_RESET_SECONDS": str(BREAKER_RESET),
+        "DB_RECONNECT_MAX_SECONDS": "4",
+        "DB_PREPARED_STATEMENTS": "false",
+    })
+
+
+def report(load, db):
+    print(f"{'phase':<10} {'ok':>6} {'failed':>7} {'fast fail':>10} {'max ms':>8} {'first ok s':>11}")
+    for phase, r in load.results.items():
+        first_ok = f"{r['first_ok']:.1f}" if r["first_ok"] is not None else "-"
+        print(f"{phase:<10} {r['ok']:>6} {r['failed']:>7} {r['fast_failed']:>10} {r['max_ms']:>8.0f} {first_ok:>11}")
+    stats = db.stats()
+    print(f"\nstate {stats['state']}, reconnect attempts {stats['reconnect_attempts']}")
+    print("breaker transitions:", stats["breaker"]["transitions"] or "none",
+          f"- rejected {stats['breaker']['rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="PostgreSQL DSN to proxy")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--phase-seconds", type=float, default=6)
+    args = parser.parse_args()
+
+    # A call may take a connect timeout plus a statement timeout at worst
+    limit_ms = (CONNECT_TIMEOUT + STATEMENT_TIMEOUT_MS / 1000 + 1) * 1000
+    failures = []
+
+    if args.dsn:
+        params = parse_dsn(args.dsn)
+        proxy = FaultProxy(params.get("host", "localhost"), int(params.get("port", 5432)))
+        params.update(host="127.0.0.1", port=str(proxy.port))
+        configure(make_dsn(**params))
+        phases = [("healthy", "forward"), ("drop", "drop"), ("blackhole", "blackhole"), ("restored", "forward")]
+    else:
+        # Nothing listens behind the proxy: every connection is refused
+        proxy = FaultProxy("127.0.0.1", 9)
+        proxy.set_mode("drop")
+        configure(f"postgresql://bench@127.0.0.1:{proxy.port}/bench")
+        phases = [("down", "drop")]
+
+    db = Database()
+    db.connect()
+    load = Load(db, args.threads)
+    for index, (phase, mode) in enumerate(phases):
+        proxy.set_mode(mode)
+        load.start(phase) if index == 0 else load.set_phase(phase)
+        time.sleep(args.phase_seconds)
+    load.stop()
+    db.close()
+
+    report(load, db)
+    for phase, r in load.results.items():
+        if r["max_ms"] > limit_ms:
+            failures.append(f"{phase}: a call took {r['max_ms']:.0f} ms (limit {limit_ms:.0f} ms)")
+    if args.dsn:
+        restored = load.results["restored"]
+        if not restored["ok"]:
+            failures.append("the database never came back after the proxy was restored")
+        if not load.results["drop"]["fast_failed"]:
+            failures.append("the circuit breaker never failed calls fast during the outage")
+    elif not load.results["down"]["fast_failed"]:
+        failures.append("calls did not fail fast while the database was down")
+
+    for failure in failures:
+        print("FAIL", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
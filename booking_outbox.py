@@ -0,0 +1,338 @@
+"""
+Write-behind outbox for appointment bookings (BOOKING_MODE=outbox).
+
+In the default mode a booking waits for its database round trips before
+the response. In outbox mode /api/appointment/create only reserves the
+slot and appends the booking to a local SQLite file, then answers 202 with
+an idempotency key; a background task of every worker sends the pending
+bookings to PostgreSQL in batches, one transaction per batch.
+
+- Reservation: a slot is refused while the slot index has it taken or a
+  pending booking of any worker on this host holds it (a unique index over
+  the pending rows of the shared file).
+- Durability: the row is committed (WAL, synchronous=FULL) before the
+  response, so an accepted booking survives a worker crash or restart;
+  whichever worker flushes next sends it.
+- Idempotency: each booking has a key (the client's Idempotency-Key header
+  or a generated one), stored in appointments.idempotency_key (unique). A
+  batch retried after a crash between the PostgreSQL commit and the outbox
+  update inserts nothing twice, and a client retrying with the same key
+  gets the original booking back. A key belongs to the patient who used it
+  first: reusing it for another patient, doctor or slot is a conflict.
+- Failures: when the database is unreachable (a `transient` error) the
+  batch stays pending and is retried with backoff, up to
+  BOOKING_OUTBOX_MAX_ATTEMPTS times. Any other error splits the batch until
+  the bookings PostgreSQL rejects are found; those, and bookings of unknown
+  patients, are marked failed, which frees the slot, and the rest of the
+  batch goes through.
+
+GET /api/appointment/status/{key}?tc_number=... reports pending /
+confirmed / failed. Reservations cover one host: workers on other hosts
+share only the database.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from availability import normalize_slot
+
+
+class SlotTaken(Exception):
+    pass
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different booking"""
+
+
+class BookingOutbox:
+    def __init__(self, path: Optional[str] = None, batch_size: int = 100, claim_seconds: float = 30,
+                 retention_seconds: float = 86400, max_backoff: float = 60, max_attempts: int = 30):
+        self.enabled = False
+        self.path = path
+        self.batch_size = batch_size
+        self.claim_seconds = claim_seconds
+        self.retention_seconds = retention_seconds
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        # Errors worth retrying; until configured every error is
+        self.transient: Tuple[type, ...] = (Exception,)
+        self.accepted = 0
+        self.duplicates = 0
+        self.confirmed = 0
+        self.failed = 0
+        self.flush_errors = 0
+        self.last_batch = 0
+        self._write: Optional[Callable[[List[Dict]], Dict[str, Dict]]] = None
+        self._on_settled: Optional[Callable[[Dict, Dict], None]] = None
+        self._db = None
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+
+    def configure(self, write: Callable[[List[Dict]], Dict[str, Dict]],
+                  on_settled: Optional[Callable[[Dict, Dict], None]] = None,
+                  transient: Tuple[type, ...] = (Exception,)):
+        """Set the batch writer (Database.create_appointments) and open the file in outbox mode"""
+        self._write = write
+        self._on_settled = on_settled
+        self.transient = transient
+        self.enabled = os.getenv("BOOKING_MODE", "sync").lower() == "outbox"
+        self.path = os.getenv("BOOKING_OUTBOX_DB", self.path or os.path.join("var", "booking_outbox.db"))
+        self.batch_size = int(os.getenv("BOOKING_OUTBOX_BATCH", str(self.batch_size)))
+        self.retention_seconds = float(os.getenv("BOOKING_OUTBOX_RETENTION_SECONDS", str(self.retention_seconds)))
+        self.max_attempts = int(os.getenv("BOOKING_OUTBOX_MAX_ATTEMPTS", str(self.max_attempts)))
+        if self.enabled:
+            self.open()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Autocommit: every statement is its own transaction unless BEGIN is issued
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=5, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=FULL")  # an acknowledged booking is on disk
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS booking_outbox (
+                idempotency_key TEXT PRIMARY KEY,
+                doctor_id TEXT NOT NULL,
+                slot TEXT NOT NULL,
+                booking TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                appointment_id INTEGER,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                claimed_until REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        db.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS booking_outbox_pending_slot
+            ON booking_outbox (doctor_id, slot) WHERE state = 'pending'
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS booking_outbox_due ON booking_outbox (state, next_attempt_at)")
+        self._db = db
+
+    def close(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Booking outbox: final flush failed, pending bookings stay on disk: {e}")
+        if self._db is not None:
+            with self._lock:
+                self._db.close()
+                self._db = None
+
+    def submit(self, key: str, booking: Dict, slot_taken: Optional[Callable[[], bool]] = None) -> Tuple[Dict, bool]:
+        """Store a booking durably; returns (status, created)
+
+        A known key returns the stored booking's status with created=False.
+        Raises IdempotencyConflict when the key belongs to a different
+        booking, and SlotTaken when `slot_taken()` says so or a pending
+        booking already holds the slot.
+        """
+        now = time.time()
+        slot = normalize_slot(booking["appointment_date"]).isoformat()
+        with self._lock:
+            # A retried request gets its booking back, even once the slot shows as taken
+            row = self._row(key)
+            if row is not None:
+                return self._replay(row, booking), False
+            if slot_taken is not None and slot_taken():
+                raise SlotTaken("Slot is already taken")
+            try:
+                self._db.execute(
+                    "INSERT INTO booking_outbox (idempotency_key, doctor_id, slot, booking, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, str(booking["doctor_id"]), slot, json.dumps({**booking, "idempotency_key": key}), now, now),
+                )
+            except sqlite3.IntegrityError:
+                row = self._row(key)
+                if row is None:
+                    raise SlotTaken("Slot is already taken")
+                return self._replay(row, booking), False
+            row = self._row(key)
+        self.accepted += 1
+        return _status(row), True
+
+    def status(self, key: str, tc_number: Optional[str] = None) -> Optional[Dict]:
+        """Status of a booking; None when unknown or (with tc_number) another patient's"""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._row(key)
+        if row is None or (tc_number is not None and json.loads(row[1])["tc_number"] != tc_number):
+            return None
+        return _status(row)
+
+    def flush(self) -> int:
+        """Send due pending bookings to PostgreSQL, a batch at a time; returns how many settled"""
+        if self._db is None or self._write is None:
+            return 0
+        settled = 0
+        while True:
+            batch = self._claim()
+            if not batch:
+                break
+            self.last_batch = len(batch)
+            bookings = [booking for _, booking in batch]
+            try:
+                results = self._write_isolating(bookings)
+            except self.transient as e:
+                self.flush_errors += 1
+                exhausted = self._retry(batch, e)
+                if exhausted:
+                    self._settle(exhausted, {booking["idempotency_key"]: {
+                        "success": False, "message": "Could not reach the database"} for booking in exhausted})
+                raise
+            self._settle(bookings, results)
+            settled += len(batch)
+            if len(batch) < self.batch_size:
+                break
+        self._purge()
+        return settled
+
+    def stats(self) -> Dict:
+        counts: Dict[str, int] = {}
+        oldest = None
+        if self._db is not None:
+            with self._lock:
+                counts = dict(self._db.execute(
+                    "SELECT state, COUNT(*) FROM booking_outbox GROUP BY state").fetchall())
+                oldest = self._db.execute(
+                    "SELECT MIN(created_at) FROM booking_outbox WHERE state = 'pending'").fetchone()[0]
+        return {
+            "enabled": self.enabled,
+            "pending": counts.get("pending", 0),
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+            "confirmed": self.confirmed,
+            "failed": self.failed,
+            "flush_errors": self.flush_errors,
+            "last_batch": self.last_batch,
+        }
+
+    def _replay(self, row: Tuple, booking: Dict) -> Dict:
+        # Caller holds self._lock
+        stored = json.loads(row[1])
+        if (stored["tc_number"] != booking["tc_number"] or str(stored["doctor_id"]) != str(booking["doctor_id"])
+                or normalize_slot(stored["appointment_date"]) != normalize_slot(booking["appointment_date"])):
+            raise IdempotencyConflict("Idempotency-Key was already used for a different booking")
+        self.duplicates += 1
+        return _status(row)
+
+    def _row(self, key: str) -> Optional[Tuple]:
+        # Caller holds self._lock
+        return self._db.execute(
+            "SELECT idempotency_key, booking, state, appointment_id, error, attempts "
+            "FROM booking_outbox WHERE idempotency_key = ?", (key,)
+        ).fetchone()
+
+    def _claim(self) -> List[Tuple[str, Dict]]:
+        """Take due pending bookings for claim_seconds, so other workers skip them"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT idempotency_key, booking FROM booking_outbox "
+                    "WHERE state = 'pending' AND next_attempt_at <= ? AND claimed_until <= ? "
+                    "ORDER BY created_at LIMIT ?", (now, now, self.batch_size),
+                ).fetchall()
+                self._db.executemany("UPDATE booking_outbox SET claimed_until = ? WHERE idempotency_key = ?",
+                                     [(now + self.claim_seconds, key) for key, _ in rows])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [(key, json.loads(booking)) for key, booking in rows]
+
+    def _write_isolating(self, bookings: List[Dict]) -> Dict[str, Dict]:
+        """Write a batch; on a non-transient error, split it to find the rejected bookings"""
+        try:
+            return self._write(bookings)
+        except self.transient:
+            raise
+        except Exception as e:
+            self.flush_errors += 1
+            if len(bookings) == 1:
+                print(f"Booking outbox: {bookings[0]['idempotency_key']} rejected by the database: {e}")
+                return {bookings[0]["idempotency_key"]: {"success": False,
+                                                          "message": "Booking rejected by the database"}}
+            middle = len(bookings) // 2
+            return {**self._write_isolating(bookings[:middle]), **self._write_isolating(bookings[middle:])}
+
+    def _retry(self, batch: List[Tuple[str, Dict]], error: Exception) -> List[Dict]:
+        """Reschedule a batch with backoff; returns the bookings out of attempts"""
+        print(f"Booking outbox: database unavailable, retrying {len(batch)} booking(s): {error}")
+        now = time.time()
+        exhausted = []
+        with self._lock:
+            for key, booking in batch:
+                attempts = self._db.execute("SELECT attempts FROM booking_outbox WHERE idempotency_key = ?",
+                                            (key,)).fetchone()[0] + 1
+                if attempts >= self.max_attempts:
+                    exhausted.append(booking)
+                    continue
+                delay = min(self.max_backoff, 2 ** attempts) * random.uniform(0.5, 1.0)
+                self._db.execute(
+                    "UPDATE booking_outbox SET attempts = ?, error = ?, next_attempt_at = ?, claimed_until = 0, "
+                    "updated_at = ? WHERE idempotency_key = ?",
+                    (attempts, "Database unavailable, retrying", now + delay, now, key))
+        return exhausted
+
+    def _settle(self, bookings: List[Dict], results: Dict[str, Dict]):
+        now = time.time()
+        rows = []
+        for booking in bookings:
+            result = results.get(booking["idempotency_key"]) or {"success": False, "message": "No result"}
+            if result.get("success"):
+                rows.append(("confirmed", result["appointment_id"], None, now, booking["idempotency_key"]))
+                self.confirmed += 1
+            else:
+                rows.append(("failed", None, result.get("message"), now, booking["idempotency_key"]))
+                self.failed += 1
+        with self._lock:
+            self._db.executemany(
+                "UPDATE booking_outbox SET state = ?, appointment_id = ?, error = ?, attempts = attempts + 1, "
+                "claimed_until = 0, updated_at = ? WHERE idempotency_key = ?", rows)
+        if self._on_settled is not None:
+            for booking in bookings:
+                try:
+                    self._on_settled(booking, results.get(booking["idempotency_key"], {}))
+                except Exception as e:
+                    print(f"Booking outbox callback failed: {e}")
+
+    def _purge(self):
+        """Drop settled bookings after the retention period (at most once a minute)"""
+        now = time.time()
+        if now - self._purged_at < 60:
+            return
+        self._purged_at = now
+        with self._lock:
+            self._db.execute("DELETE FROM booking_outbox WHERE state != 'pending' AND updated_at < ?",
+                             (now - self.retention_seconds,))
+
+
+def _status(row: Tuple) -> Dict:
+    key, booking, state, appointment_id, error, attempts = row
+    booking = json.loads(booking)
+    return {
+        "idempotency_key": key,
+        "status": state,
+        "appointment_id": appointment_id,
+        "department": booking["department"],
+        "doctor_name": booking["doctor_name"],
+        "appointment_date": booking["appointment_date"],
+        "attempts": attempts,
+        "message": error,
+    }
+
+
+# One outbox per worker process (the file is shared by the workers of a host)
+outbox = BookingOutbox()
@@ -0,0 +1,109 @@
+"""
+Chat message analysis shared by the blocking and streaming chat endpoints
+"""
+import os
+from typing import Dict, List
+
+from doctor_catalog import catalog
+from profiling import timed
+
+# Check for symptoms in the message
+symptom_keywords = {
+    "headache": ["headache", "head pain", "migraine"],
+    "stomach pain": ["stomach", "belly", "nausea", "abdomen"],
+    "fever": ["fever", "temperature", "hot"],
+    "cough": ["cough", "throat", "phlegm"],
+    "back pain": ["back pain", "backache"],
+    "joint pain": ["joint", "arthritis"],
+    "eye pain": ["eye", "vision"],
+    "skin rash": ["rash", "skin", "itch"],
+    "dizziness": ["dizzy", "vertigo", "balance"],
+    "breathing difficulty": ["breath", "inhale", "exhale", "suffocate"]
+}
+
+# Map departments to symptoms
+department_mapping = {
+    "headache": ["Neurology", "ENT"],
+    "stomach pain": ["Gastroenterology", "Internal Medicine"],
+    "fever": ["Internal Medicine"],
+    "cough": ["ENT", "Internal Medicine"],
+    "back pain": ["Orthopedics", "Neurology"],
+    "joint pain": ["Orthopedics", "Rheumatology"],
+    "eye pain": ["Ophthalmology"],
+    "skin rash": ["Dermatology"],
+    "dizziness": ["ENT", "Neurology"],
+    "breathing difficulty": ["Pulmonology", "Cardiology"]
+}
+
+
+def semantic_matching_enabled() -> bool:
+    return os.getenv("SYMPTOM_MATCHER", "keyword").lower() == "semantic"
+
+
+@timed("chat.detect_symptoms")
+def detect_symptoms(message: str) -> List[str]:
+    """Return the canonical symptoms mentioned in a chat message"""
+    # This is a simplified version - in a real implementation,
+    # we would use NLP to analyze symptoms
+    msg = message.lower()
+
+    # Simple keyword matching for the demo
+    detected_symptoms = []
+    for symptom, keywords in symptom_keywords.items():
+        for keyword in keywords:
+            if keyword in msg:
+                detected_symptoms.append(symptom)
+                break
+
+    # Embedding search catches paraphrases the keywords miss
+    if semantic_matching_enabled():
+        from symptom_index import get_index
+        for symptom in get_index().match(message):
+            if symptom not in detected_symptoms:
+                detected_symptoms.append(symptom)
+
+    return detected_symptoms
+
+
+def analyze_message(message: str) -> Dict:
+    """Detect symptoms in a chat message and build the chat response"""
+    return build_response(detect_symptoms(message))
+
+
+@timed("chat.build_response")
+def build_response(detected_symptoms: List[str]) -> Dict:
+    """Chat response for a set of detected symptoms"""
+    # Add associated departments
+    departments = []
+    for symptom in detected_symptoms:
+        departments.extend(department_mapping.get(symptom, []))
+
+    # Remove duplicates
+    detected_symptoms = list(set(detected_symptoms))
+    departments = list(set(departments))
+
+    # If no symptoms detected
+    if not detected_symptoms:
+        return {
+            "message": "I'm not sure I understood your symptoms. Could you describe what you're experiencing in more detail?",
+            "detected_symptoms": [],
+            "action": "ask_more"
+        }
+
+    # Doctors for each department, from the in-memory catalog
+    doctors = []
+    for dept in departments:
+        for doctor in catalog.in_department(dept):
+            doctors.append({"id": doctor.id, "name": doctor.name, "department": dept})
+
+    # Return response with detected symptoms and recommendations
+    return {
+        "message": f"Based on your symptoms, I've detected you may have: {', '.join(detected_symptoms)}. " +
+                  f"I recommend consulting with doctors in these departments: {', '.join(departments)}.",
+        "detected_symptoms": detected_symptoms,
+        "severity": "medium",
+        "recommended_departments": departments,
+        "initial_treatment": ["Rest and drink plenty of fluids. Take over-the-counter medication if needed."],
+        "available_doctors": doctors,
+        "action": "recommend_department"
+    }
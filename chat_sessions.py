@@ -0,0 +1,208 @@
+"""
+Server-side chat sessions keyed by tc_number.
+
+Each session keeps the symptoms detected so far in the conversation, so a
+new message is run through symptom detection on its own and merged into
+what is already known instead of re-analysing the whole conversation.
+
+Sessions live in an in-memory LRU with a TTL, a session count cap and an
+approximate memory cap; the least recently used sessions are evicted first.
+Changed sessions are written behind to a local SQLite file (every
+CHAT_SESSION_FLUSH_SECONDS and on shutdown) and loaded back on a cache
+miss, so a conversation survives a worker restart. Workers share the file;
+if two workers serve the same patient the last flush wins.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from chat import build_response, detect_symptoms
+
+
+class ChatSession:
+    __slots__ = ("tc_number", "symptoms", "message_count", "created_at", "last_seen", "_size")
+
+    def __init__(self, tc_number: str, symptoms: Optional[List[str]] = None, message_count: int = 0,
+                 created_at: Optional[float] = None, last_seen: Optional[float] = None):
+        now = time.time()
+        self.tc_number = tc_number
+        self.symptoms = list(symptoms or [])
+        self.message_count = message_count
+        self.created_at = created_at or now
+        self.last_seen = last_seen or now
+        self._size = 0
+
+    def add(self, symptoms: List[str]) -> List[str]:
+        """Merge newly detected symptoms, returning the ones not seen before"""
+        new = [s for s in symptoms if s not in self.symptoms]
+        self.symptoms.extend(new)
+        self.message_count += 1
+        self.last_seen = time.time()
+        return new
+
+    def footprint(self) -> int:
+        """Rough size in bytes, for the memory cap"""
+        return 200 + len(self.tc_number) + sum(len(s) + 60 for s in self.symptoms)
+
+    def to_dict(self) -> Dict:
+        return {
+            "tc_number": self.tc_number,
+            "symptoms": self.symptoms,
+            "message_count": self.message_count,
+            "created_at": self.created_at,
+            "last_seen": self.last_seen,
+        }
+
+
+class SessionStore:
+    def __init__(self, ttl_seconds: float = 1800, max_sessions: int = 10000,
+                 max_bytes: int = 16 * 1024 * 1024, path: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.path = path
+        self.bytes = 0
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._dirty: Dict[str, ChatSession] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+
+    def configure(self):
+        self.ttl_seconds = float(os.getenv("CHAT_SESSION_TTL_SECONDS", str(self.ttl_seconds)))
+        self.max_sessions = int(os.getenv("CHAT_SESSION_MAX", str(self.max_sessions)))
+        self.max_bytes = int(os.getenv("CHAT_SESSION_MAX_BYTES", str(self.max_bytes)))
+        self.path = os.getenv("CHAT_SESSION_DB", self.path or os.path.join("var", "chat_sessions.db"))
+        self.open()
+
+    def open(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                tc_number TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                last_seen REAL NOT NULL
+            )
+        """)
+        db.execute("DELETE FROM chat_sessions WHERE last_seen < ?", (time.time() - self.ttl_seconds,))
+        db.commit()
+        self._db = db
+
+    def close(self):
+        self.flush()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+    def analyze(self, tc_number: str, message: str) -> Dict:
+        """Analyse only the new message and answer from the whole session"""
+        detected = detect_symptoms(message)
+        session = self.get(tc_number) or ChatSession(tc_number)
+        with self._lock:
+            # Another request of the same patient may have stored it meanwhile
+            session = self._sessions.get(tc_number, session)
+            new_symptoms = session.add(detected)
+            symptoms = list(session.symptoms)
+            message_count = session.message_count
+            self._put(session)
+
+        response = build_response(symptoms)
+        response["session"] = {"message_count": message_count, "new_symptoms": new_symptoms}
+        return response
+
+    def get(self, tc_number: str) -> Optional[ChatSession]:
+        with self._lock:
+            session = self._sessions.get(tc_number)
+            if session is not None:
+                if self._expired(session):
+                    self._remove(tc_number)
+                    return None
+                self._sessions.move_to_end(tc_number)
+                return session
+            session = self._dirty.get(tc_number)  # evicted but not flushed yet
+        if session is None:
+            session = self._load(tc_number)
+        return None if session is None or self._expired(session) else session
+
+    def reset(self, tc_number: str):
+        with self._lock:
+            self._remove(tc_number)
+            self._dirty.pop(tc_number, None)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM chat_sessions WHERE tc_number = ?", (tc_number,))
+                self._db.commit()
+
+    def flush(self) -> int:
+        """Write changed sessions to the local store and drop expired ones"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            rows = [(tc, json.dumps(s.to_dict()), s.last_seen) for tc, s in dirty.items()]
+        if self._db is None:
+            return 0
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT INTO chat_sessions (tc_number, data, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT(tc_number) DO UPDATE SET data = excluded.data, last_seen = excluded.last_seen",
+                rows,
+            )
+            self._db.execute("DELETE FROM chat_sessions WHERE last_seen < ?", (time.time() - self.ttl_seconds,))
+            self._db.commit()
+        return len(rows)
+
+    def stats(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self.bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "unflushed": len(self._dirty),
+            "evictions": self.evictions,
+        }
+
+    def _put(self, session: ChatSession):
+        # Caller holds self._lock
+        previous = self._sessions.pop(session.tc_number, None)
+        if previous is not None:
+            self.bytes -= previous._size
+        session._size = session.footprint()
+        self._sessions[session.tc_number] = session
+        self.bytes += session._size
+        self._dirty[session.tc_number] = session
+
+        while self._sessions and (len(self._sessions) > self.max_sessions or self.bytes > self.max_bytes):
+            tc_number, _ = next(iter(self._sessions.items()))
+            self._remove(tc_number)
+            self.evictions += 1
+
+    def _remove(self, tc_number: str):
+        session = self._sessions.pop(tc_number, None)
+        if session is not None:
+            self.bytes -= session._size
+
+    def _expired(self, session: ChatSession) -> bool:
+        return time.time() - session.last_seen > self.ttl_seconds
+
+    def _load(self, tc_number: str) -> Optional[ChatSession]:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT data FROM chat_sessions WHERE tc_number = ?", (tc_number,)
+            ).fetchone()
+        return ChatSession(**json.loads(row[0])) if row else None
+
+
+# One store per worker process
+sessions = SessionStore()
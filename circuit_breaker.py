@@ -0,0 +1,92 @@
+"""
+Circuit breaker for calls to a dependency that can go down (the database).
+
+closed     calls go through; consecutive failures are counted
+open       after `failure_threshold` consecutive failures: calls fail at once
+           with CircuitOpen instead of waiting on timeouts
+half_open  once `reset_timeout` has passed, one probe call is let through;
+           success closes the circuit, failure opens it again
+
+Shared by the request threads, so state changes happen under a lock.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self.transitions: Dict[str, int] = {}
+        self.history: List[Dict] = []
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpen if the call must not go through"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpen(self.name, remaining)
+                self._transition(HALF_OPEN)
+            # Half open: a single probe at a time
+            if self._probe_in_flight:
+                self.rejected += 1
+                raise CircuitOpen(self.name, self.reset_timeout)
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def reset(self):
+        """Close the circuit (e.g. after a successful reconnect)"""
+        self.record_success()
+
+    def _transition(self, state: str):
+        # Caller holds self._lock
+        key = f"{self.state}->{state}"
+        self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.history = (self.history + [{"from": self.state, "to": state, "at": time.time()}])[-20:]
+        print(f"Circuit '{self.name}': {self.state} -> {state}")
+        self.state = state
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+            "transitions": dict(self.transitions),
+            "recent": list(self.history),
+        }
@@ -1,76 +1,467 @@
 import os
+import random
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import NamedTuple, Optional
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from dotenv import load_dotenv
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from doctor_catalog import SEED_DOCTORS
+from pagination import DEFAULT_PAGE_SIZE, build_page
+from profiling import timed
+import slot_events
+
+# Hot statements, prepared once per connection and run with EXECUTE so the
+# server skips parsing and planning on every call.
+STATEMENTS = {
+    "patient_by_tc": """
+        SELECT id, tc_number, name, date_of_birth, phone, email, created_at
+        FROM patients WHERE tc_number = %s
+    """,
+    "patient_id_by_tc": "SELECT id FROM patients WHERE tc_number = %s",
+    "insert_patient": """
+        INSERT INTO patients (tc_number, name, date_of_birth, phone, email)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id, tc_number, name, date_of_birth, phone, email, created_at
+    """,
+    "insert_appointment": """
+        INSERT INTO appointments (patient_id, department, doctor_name, doctor_id, appointment_date, symptoms)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """,
+}
+
+
+# Full-table exports, in primary key order
+EXPORTS = {
+    "patients": """
+        SELECT id, tc_number, name, date_of_birth, phone, email, created_at
+        FROM patients ORDER BY id
+    """,
+    "appointments": """
+        SELECT a.id, a.patient_id, p.tc_number, a.department, a.doctor_id, a.doctor_name,
+               a.appointment_date, a.symptoms, a.status, a.created_at
+        FROM appointments a
+        LEFT JOIN patients p ON p.id = a.patient_id
+        ORDER BY a.id
+    """,
+}
+EXPORT_COLUMNS = {
+    "patients": ("id", "tc_number", "name", "date_of_birth", "phone", "email", "created_at"),
+    "appointments": ("id", "patient_id", "tc_number", "department", "doctor_id", "doctor_name",
+                     "appointment_date", "symptoms", "status", "created_at"),
+}
+
+# Daily load rollups (see rollups.py): table -> key columns
+ROLLUPS = {
+    "appointment_rollups": ("day", "department", "doctor_id", "status"),
+    "symptom_rollups": ("day", "department", "symptom"),
+}
+
+
+class PatientRecord(NamedTuple):
+    """A patients row; plain tuple rows are decoded into this, not into dicts"""
+    id: int
+    tc_number: str
+    name: str
+    date_of_birth: date
+    phone: str
+    email: str
+    created_at: Optional[datetime] = None
+
+    def to_dict(self):
+        return self._asdict()
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Connection that remembers which STATEMENTS it has prepared and whether its session is set up"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.configured = False
+
+
+class DatabaseUnavailable(Exception):
+    pass
+
+
+# Errors that say nothing about the query itself: retrying later can succeed
+TRANSIENT_ERRORS = (DatabaseUnavailable, psycopg2.OperationalError, psycopg2.InterfaceError)
+
+# Result of a booking whose doctor and slot are already scheduled
+SLOT_TAKEN = {"success": False, "slot_taken": True, "message": "Slot is already taken"}
 
-# Load environment variables
-load_dotenv()
 
 class Database:
     def __init__(self):
-        self.conn = None
-        self.connect()
+        # The pool is opened per worker process by the application lifespan
+        # (see main.lifespan), never at import time. Settings are read in
+        # connect() so that .env has been loaded by then.
+        self.pool = None
+        self.pool_size = 5
+        self.prepared_statements = True
+        self.mock_mode = False
+        self.breaker = CircuitBreaker("database")
+        self.reconnect_attempts = 0
+        self._slots = None
+        self._database_url = None
+        self._reconnect_thread = None
+        self._closing = threading.Event()
 
     def connect(self):
-        """Connect to Neon PostgreSQL database"""
+        """Open the connection pool to the Neon PostgreSQL database"""
+        # Get connection string from environment variable
+        database_url = os.getenv("DATABASE_URL")
+
+        if not database_url:
+            # No database configured: run on in-memory data (local development)
+            print("Database connection error: DATABASE_URL environment variable not set")
+            self.mock_mode = True
+            self.init_mock_data()
+            return
+
+        self._database_url = database_url
+        self.pool_size = int(os.getenv("DB_POOL_SIZE", "5"))
+        self.connect_timeout = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+        # Unacknowledged writes give up after this long (network partitions)
+        self.tcp_user_timeout_ms = int(os.getenv("DB_TCP_USER_TIMEOUT_MS", "10000"))
+        self.statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+        # Schema changes may wait on locks or rebuild indexes: 0 means no limit
+        self.migration_timeout_ms = int(os.getenv("DB_MIGRATION_TIMEOUT_MS", "0"))
+        # Longest a request waits for a free pooled connection
+        self.pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+        self.reconnect_max_delay = float(os.getenv("DB_RECONNECT_MAX_SECONDS", "60"))
+        self.breaker.failure_threshold = int(os.getenv("DB_BREAKER_FAILURES", "5"))
+        self.breaker.reset_timeout = float(os.getenv("DB_BREAKER_RESET_SECONDS", "10"))
+        # PgBouncer in transaction mode cannot keep SQL-level prepared statements
+        prepared = os.getenv("DB_PREPARED_STATEMENTS", "auto").lower()
+        if prepared == "auto":
+            self.prepared_statements = not behind_pooler(database_url)
+        else:
+            self.prepared_statements = prepared in ("1", "true", "yes")
+        self._closing.clear()
+
         try:
-            # Get connection string from environment variable
-            database_url = os.getenv("DATABASE_URL")
-            
-            if not database_url:
-                raise ValueError("DATABASE_URL environment variable not set")
+            self._open_pool()
+        except Exception as e:
+            print(f"Database connection error: {e}")
+            if os.getenv("DB_MOCK_FALLBACK", "false").lower() in ("1", "true", "yes"):
+                # Old behaviour: serve in-memory data for the life of the process
+                self.mock_mode = True
+                self.init_mock_data()
+                return
+            # Keep serving (requests fail fast) and retry in the background
+            self._start_reconnect()
             
-            # Connect to Neon DB
-            self.conn = psycopg2.connect(database_url)
-            self.conn.autocommit = True
+    def _open_pool(self):
+        # Never block on an unreachable host; keepalives notice dropped connections
+        pool = ThreadedConnectionPool(
+            1, self.pool_size, self._database_url,
+            connect_timeout=self.connect_timeout,
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3,
+            tcp_user_timeout=self.tcp_user_timeout_ms,
+            connection_factory=PreparedConnection,
+        )
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self.pool = pool
             
-            # Create tables if they don't exist
+        # Schema changes are an explicit step (python migrate.py); only
+        # run them on boot when asked to.
+        if os.getenv("DB_AUTO_MIGRATE", "false").lower() in ("1", "true", "yes"):
             self.create_tables()
             
-            print("Connected to Neon Database successfully!")
+        print(f"Connected to Neon Database successfully! (pool size {self.pool_size}, pid {os.getpid()})")
             
-        except Exception as e:
-            print(f"Database connection error: {e}")
-            # If connection fails, create in-memory data structures for testing
-            self.init_mock_data()
+    def _start_reconnect(self):
+        if self._reconnect_thread and self._reconnect_thread.is_alive():
+            return
+        self._reconnect_thread = threading.Thread(target=self._reconnect_loop, name="db-reconnect", daemon=True)
+        self._reconnect_thread.start()
+
+    def _reconnect_loop(self):
+        """Retry opening the pool with exponential backoff and jitter"""
+        delay = 1.0
+        while not self._closing.wait(delay * random.uniform(0.5, 1.0)):
+            self.reconnect_attempts += 1
+            try:
+                self._open_pool()
+                self.breaker.reset()
+                return
+            except Exception as e:
+                print(f"Database reconnect attempt {self.reconnect_attempts} failed: {e}")
+                delay = min(delay * 2, self.reconnect_max_delay)
+
+    def close(self):
+        """Close every pooled connection"""
+        self._closing.set()
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
+            print(f"Database pool closed (pid {os.getpid()})")
+
+    @contextmanager
+    def connection(self, autocommit=True):
+        """Borrow a connection from the pool, waiting if all of them are in use"""
+        if self.pool is None:
+            raise DatabaseUnavailable("Database is not connected, reconnecting in the background")
+        # ThreadedConnectionPool raises instead of blocking when exhausted,
+        # so the semaphore makes callers queue for a free connection.
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            raise DatabaseUnavailable("Timed out waiting for a database connection")
+        try:
+            try:
+                # Fail fast while the database is known to be down
+                self.breaker.before_call()
+            except CircuitOpen as e:
+                raise DatabaseUnavailable(str(e))
+
+            conn = None
+            try:
+                conn = self.pool.getconn()
+                conn.autocommit = autocommit
+                if not conn.configured:
+                    cursor = conn.cursor()
+                    cursor.execute("SET statement_timeout = %s", (self.statement_timeout_ms,))
+                    cursor.close()
+                    conn.configured = True
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # Connection lost, refused or timed out (statement_timeout included):
+                # callers see one error type and the API answers 503
+                self.breaker.record_failure()
+                if isinstance(e, psycopg2.extensions.QueryCanceledError):
+                    raise DatabaseUnavailable("Database query timed out") from e
+                raise DatabaseUnavailable("Database connection failed") from e
+            except BaseException:
+                self.breaker.record_success()
+                raise
+            else:
+                self.breaker.record_success()
+            finally:
+                if conn is not None:
+                    self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        if self.mock_mode:
+            state = "mock"
+        elif self.pool is None:
+            state = "reconnecting"
+        else:
+            state = "connected"
+        return {
+            "state": state,
+            "reconnect_attempts": self.reconnect_attempts,
+            "breaker": self.breaker.stats(),
+        }
+
+    def execute(self, conn, cursor, name, params):
+        """Run one of STATEMENTS, preparing it on this connection first if needed"""
+        if not self.prepared_statements:
+            cursor.execute(STATEMENTS[name], params)
+            return
+        if name not in conn.prepared:
+            _prepare(cursor, name)
+            conn.prepared.add(name)
+        execute = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+        try:
+            cursor.execute(execute, params)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # The server dropped it (DISCARD ALL, a pooler switching backends)
+            conn.prepared.clear()
+            _prepare(cursor, name)
+            conn.prepared.add(name)
+            cursor.execute(execute, params)
+
+    @contextmanager
+    def migration_connection(self):
+        """A dedicated connection for schema changes, outside the pool and the circuit breaker.
 
-    def create_tables(self):
+        Everything runs in one transaction with DB_MIGRATION_TIMEOUT_MS instead of the
+        request statement_timeout, and is rolled back if a step fails.
+        """
+        conn = psycopg2.connect(self._database_url, connect_timeout=self.connect_timeout,
+                                keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+        try:
+            with conn:
+                cursor = conn.cursor()
+                cursor.execute("SET LOCAL statement_timeout = %s", (self.migration_timeout_ms,))
+                cursor.close()
+                yield conn
+        finally:
+            conn.close()
+
+    def create_tables(self, raise_errors=False):
         """Create necessary tables if they don't exist"""
         try:
-            cursor = self.conn.cursor()
+            with self.migration_connection() as conn:
+                cursor = conn.cursor()
             
-            # Create patients table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS patients (
-                    id SERIAL PRIMARY KEY,
-                    tc_number VARCHAR(11) UNIQUE NOT NULL,
-                    name VARCHAR(100) NOT NULL,
-                    date_of_birth DATE NOT NULL,
-                    phone VARCHAR(20) NOT NULL,
-                    email VARCHAR(100) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
+                # Create patients table
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS patients (
+                        id SERIAL PRIMARY KEY,
+                        tc_number VARCHAR(11) UNIQUE NOT NULL,
+                        name VARCHAR(100) NOT NULL,
+                        date_of_birth DATE NOT NULL,
+                        phone VARCHAR(20) NOT NULL,
+                        email VARCHAR(100) NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
             
-            # Create appointments table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS appointments (
-                    id SERIAL PRIMARY KEY,
-                    patient_id INTEGER REFERENCES patients(id),
-                    department VARCHAR(100) NOT NULL,
-                    doctor_name VARCHAR(100) NOT NULL,
-                    doctor_id VARCHAR(100) NOT NULL,
-                    appointment_date TIMESTAMP NOT NULL,
-                    symptoms TEXT,
-                    status VARCHAR(20) DEFAULT 'scheduled',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
+                # Create appointments table
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS appointments (
+                        id SERIAL PRIMARY KEY,
+                        patient_id INTEGER REFERENCES patients(id),
+                        department VARCHAR(100) NOT NULL,
+                        doctor_name VARCHAR(100) NOT NULL,
+                        doctor_id VARCHAR(100) NOT NULL,
+                        appointment_date TIMESTAMP NOT NULL,
+                        symptoms TEXT,
+                        status VARCHAR(20) DEFAULT 'scheduled',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
             
-            cursor.close()
+                # Create doctors table (source of the in-memory doctor catalog)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS doctors (
+                        id SERIAL PRIMARY KEY,
+                        name VARCHAR(100) NOT NULL,
+                        department VARCHAR(100) NOT NULL,
+                        specialization VARCHAR(100),
+                        email VARCHAR(100) UNIQUE,
+                        phone VARCHAR(20),
+                        experience INTEGER DEFAULT 0,
+                        rating REAL DEFAULT 0,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_doctors_department ON doctors (department);")
+                # The catalog version (doctor_catalog_version) reads MAX(updated_at): keep it
+                # current for every UPDATE, including ones made outside the app
+                cursor.execute("""
+                    CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+                    BEGIN
+                        NEW.updated_at = now();
+                        RETURN NEW;
+                    END;
+                    $$ LANGUAGE plpgsql;
+                """)
+                cursor.execute("DROP TRIGGER IF EXISTS doctors_touch_updated_at ON doctors;")
+                cursor.execute("""
+                    CREATE TRIGGER doctors_touch_updated_at
+                    BEFORE UPDATE ON doctors
+                    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+                """)
+                # Keyset pagination and slot lookups scan these in (date, id) order
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date
+                    ON appointments (doctor_id, appointment_date, id);
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_appointments_patient_date
+                    ON appointments (patient_id, appointment_date, id);
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_appointments_date
+                    ON appointments (appointment_date, id);
+                """)
+
+                # Outbox bookings (booking_outbox.py) are inserted at most once per key
+                cursor.execute("ALTER TABLE appointments ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64);")
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_idempotency_key
+                    ON appointments (idempotency_key);
+                """)
+                # One scheduled appointment per doctor and slot, whichever worker books it
+                cursor.execute("SAVEPOINT doctor_slot_index")
+                try:
+                    cursor.execute("""
+                        CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_doctor_slot
+                        ON appointments (doctor_id, appointment_date) WHERE status = 'scheduled';
+                    """)
+                    cursor.execute("RELEASE SAVEPOINT doctor_slot_index")
+                except psycopg2.errors.UniqueViolation:
+                    # Keep the rest of the migration
+                    cursor.execute("ROLLBACK TO SAVEPOINT doctor_slot_index")
+                    print("Warning: double-booked slots exist, idx_appointments_doctor_slot not created")
+
+                # Slot changes are pushed to every worker (LISTEN slot_changes, see slot_events.py);
+                # the trigger sends them when the change commits, whoever makes it
+                cursor.execute("""
+                    CREATE OR REPLACE FUNCTION notify_slot_change() RETURNS trigger AS $$
+                    BEGIN
+                        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'scheduled'
+                           AND (TG_OP = 'DELETE' OR NEW.status IS DISTINCT FROM 'scheduled'
+                                OR NEW.doctor_id <> OLD.doctor_id OR NEW.appointment_date <> OLD.appointment_date) THEN
+                            PERFORM pg_notify('slot_changes', json_build_object(
+                                'type', 'released', 'doctor_id', OLD.doctor_id, 'department', OLD.department,
+                                'slot', OLD.appointment_date, 'appointment_id', OLD.id)::text);
+                        END IF;
+                        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'scheduled'
+                           AND (TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM 'scheduled'
+                                OR NEW.doctor_id <> OLD.doctor_id OR NEW.appointment_date <> OLD.appointment_date) THEN
+                            PERFORM pg_notify('slot_changes', json_build_object(
+                                'type', 'taken', 'doctor_id', NEW.doctor_id, 'department', NEW.department,
+                                'slot', NEW.appointment_date, 'appointment_id', NEW.id)::text);
+                        END IF;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql;
+                """)
+                cursor.execute("DROP TRIGGER IF EXISTS appointments_slot_change ON appointments;")
+                cursor.execute("""
+                    CREATE TRIGGER appointments_slot_change
+                    AFTER INSERT OR UPDATE OR DELETE ON appointments
+                    FOR EACH ROW EXECUTE FUNCTION notify_slot_change();
+                """)
+
+                # Daily rollups for /api/stats, maintained by rollups.py
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS appointment_rollups (
+                        day DATE NOT NULL,
+                        department VARCHAR(100) NOT NULL,
+                        doctor_id VARCHAR(100) NOT NULL,
+                        status VARCHAR(20) NOT NULL,
+                        count INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (day, department, doctor_id, status)
+                    );
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS symptom_rollups (
+                        day DATE NOT NULL,
+                        department VARCHAR(100) NOT NULL,
+                        symptom VARCHAR(100) NOT NULL,
+                        count INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (day, department, symptom)
+                    );
+                """)
+
+                # Seed doctors on a fresh database
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM doctors)")
+                if not cursor.fetchone()[0]:
+                    cursor.executemany("""
+                        INSERT INTO doctors (name, department, specialization, experience, rating)
+                        VALUES (%(name)s, %(department)s, %(specialization)s, %(experience)s, %(rating)s)
+                    """, SEED_DOCTORS)
+
+                cursor.close()
             
         except Exception as e:
             print(f"Error creating tables: {e}")
+            if raise_errors:
+                raise
 
     def init_mock_data(self):
         """Initialize mock data if database connection fails"""
@@ -95,13 +486,67 @@ class Database:
         }
         
         self.mock_appointments = []
+        self.mock_rollups = {table: {} for table in ROLLUPS}
+        self.mock_doctors = [
+            {"id": index + 1, **doctor} for index, doctor in enumerate(SEED_DOCTORS)
+        ]
+
+    @timed("db.fetch_doctors")
+    def fetch_doctors(self):
+        """Return every row of the doctors table"""
+        if self.mock_mode:
+            return list(self.mock_doctors)
+
+        with self.connection() as conn:
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute("""
+                SELECT id, name, department, specialization, experience, rating
+                FROM doctors ORDER BY id
+            """)
+            doctors = cursor.fetchall()
+            cursor.close()
+        return doctors
+
+    @timed("db.doctor_catalog_version")
+    def doctor_catalog_version(self):
+        """Cheap probe that changes whenever a doctor is added, removed or updated"""
+        if self.mock_mode:
+            return ("mock", len(self.mock_doctors))
 
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*), MAX(updated_at) FROM doctors")
+            version = cursor.fetchone()
+            cursor.close()
+        return tuple(version)
+
+    @timed("db.fetch_taken_slots")
+    def fetch_taken_slots(self, since):
+        """Return (doctor_id, appointment_date) for scheduled appointments from `since` on"""
+        if self.mock_mode:
+            return [
+                (appointment["doctor_id"], appointment["appointment_date"])
+                for appointment in self.mock_appointments
+                if appointment.get("status", "scheduled") == "scheduled"
+            ]
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT doctor_id, appointment_date FROM appointments
+                WHERE status = 'scheduled' AND appointment_date >= %s
+            """, (since,))
+            slots = cursor.fetchall()
+            cursor.close()
+        return slots
+
+    @timed("db.check_patient_exists")
     def check_patient_exists(self, tc_number):
         """Check if a patient exists in the database"""
         try:
             print(f"Checking if patient with TC {tc_number} exists")
             
-            if not self.conn:
+            if self.mock_mode:
                 # Using mock data
                 exists = tc_number in self.mock_patients
                 patient = self.mock_patients.get(tc_number)
@@ -109,10 +554,12 @@ class Database:
                 return {"exists": exists, "patient": patient}
             
             # Using real database
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute("SELECT * FROM patients WHERE tc_number = %s", (tc_number,))
-            patient = cursor.fetchone()
-            cursor.close()
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                self.execute(conn, cursor, "patient_by_tc", (tc_number,))
+                row = cursor.fetchone()
+                cursor.close()
+            patient = PatientRecord(*row) if row else None
             
             print(f"Using database, patient exists: {patient is not None}")
             return {
@@ -120,16 +567,20 @@ class Database:
                 "patient": patient
             }
             
+        except DatabaseUnavailable:
+            # "Not found" would send a registered patient to registration
+            raise
         except Exception as e:
             print(f"Error checking patient: {e}")
             return {"exists": False, "patient": None}
 
+    @timed("db.register_patient")
     def register_patient(self, patient_data):
         """Register a new patient in the database"""
         try:
             print(f"Registering patient with TC {patient_data['tc_number']}")
             
-            if not self.conn:
+            if self.mock_mode:
                 # Using mock data
                 tc_number = patient_data["tc_number"]
                 if tc_number in self.mock_patients:
@@ -150,31 +601,28 @@ class Database:
                 }
             
             # Using real database
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+            with self.connection() as conn:
+                cursor = conn.cursor()
             
-            # Check if patient already exists
-            cursor.execute("SELECT id FROM patients WHERE tc_number = %s", (patient_data["tc_number"],))
-            if cursor.fetchone():
-                print(f"Database: Patient {patient_data['tc_number']} already exists")
+                # Check if patient already exists
+                self.execute(conn, cursor, "patient_id_by_tc", (patient_data["tc_number"],))
+                if cursor.fetchone():
+                    print(f"Database: Patient {patient_data['tc_number']} already exists")
+                    cursor.close()
+                    return {"success": False, "message": "Patient already exists"}
+
+                # Insert new patient
+                print(f"Database: Registering new patient with data: {patient_data}")
+                self.execute(conn, cursor, "insert_patient", (
+                    patient_data["tc_number"],
+                    patient_data["name"],
+                    patient_data["date_of_birth"],
+                    patient_data["phone"],
+                    patient_data["email"]
+                ))
+
+                new_patient = PatientRecord(*cursor.fetchone())
                 cursor.close()
-                return {"success": False, "message": "Patient already exists"}
-            
-            # Insert new patient
-            print(f"Database: Registering new patient with data: {patient_data}")
-            cursor.execute("""
-                INSERT INTO patients (tc_number, name, date_of_birth, phone, email)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id, tc_number, name, date_of_birth, phone, email
-            """, (
-                patient_data["tc_number"],
-                patient_data["name"],
-                patient_data["date_of_birth"],
-                patient_data["phone"],
-                patient_data["email"]
-            ))
-            
-            new_patient = cursor.fetchone()
-            cursor.close()
             
             print(f"Database: Patient registered successfully: {new_patient}")
             return {
@@ -183,20 +631,26 @@ class Database:
                 "patient": new_patient
             }
             
+        except DatabaseUnavailable:
+            raise
         except Exception as e:
             print(f"Error registering patient: {e}")
             return {"success": False, "message": f"Registration failed: {str(e)}"}
 
+    @timed("db.create_appointment")
     def create_appointment(self, appointment_data):
         """Create a new appointment in the database"""
         try:
-            if not self.conn:
+            if self.mock_mode:
                 # Using mock data
+                if any(a["doctor_id"] == appointment_data["doctor_id"] and a["status"] == "scheduled"
+                       and a["appointment_date"] == appointment_data["appointment_date"]
+                       for a in self.mock_appointments):
+                    return dict(SLOT_TAKEN)
                 appointment_id = len(self.mock_appointments) + 1
-                self.mock_appointments.append({
-                    "id": appointment_id,
-                    **appointment_data
-                })
+                appointment = {"id": appointment_id, "status": "scheduled", **appointment_data}
+                self.mock_appointments.append(appointment)
+                slot_events.bus.publish(slot_events.slot_event("taken", appointment))
                 
                 return {
                     "success": True,
@@ -207,36 +661,37 @@ class Database:
                 }
             
             # Using real database
-            cursor = self.conn.cursor(cursor_factory=RealDictCursor)
+            with self.connection() as conn:
+                cursor = conn.cursor()
             
-            # Get patient ID from tc_number
-            tc_number = appointment_data["tc_number"]
-            cursor.execute("SELECT id FROM patients WHERE tc_number = %s", (tc_number,))
-            patient = cursor.fetchone()
+                # Get patient ID from tc_number
+                tc_number = appointment_data["tc_number"]
+                self.execute(conn, cursor, "patient_id_by_tc", (tc_number,))
+                patient = cursor.fetchone()
             
-            if not patient:
+                if not patient:
+                    cursor.close()
+                    return {"success": False, "message": "Patient not found"}
+
+                patient_id = patient[0]
+
+                # Insert appointment
+                try:
+                    self.execute(conn, cursor, "insert_appointment", (
+                        patient_id,
+                        appointment_data["department"],
+                        appointment_data["doctor_name"],
+                        appointment_data["doctor_id"],
+                        appointment_data["appointment_date"],
+                        appointment_data.get("symptoms", "")
+                    ))
+                except psycopg2.errors.UniqueViolation:
+                    # Booked by another worker since the slot index was checked
+                    cursor.close()
+                    return dict(SLOT_TAKEN)
+
+                appointment_id = cursor.fetchone()[0]
                 cursor.close()
-                return {"success": False, "message": "Patient not found"}
-            
-            patient_id = patient["id"]
-            
-            # Insert appointment
-            cursor.execute("""
-                INSERT INTO appointments (patient_id, department, doctor_name, doctor_id, appointment_date, symptoms)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (
-                patient_id,
-                appointment_data["department"],
-                appointment_data["doctor_name"],
-                appointment_data["doctor_id"],
-                appointment_data["appointment_date"],
-                appointment_data.get("symptoms", "")
-            ))
-            
-            result = cursor.fetchone()
-            appointment_id = result["id"]
-            cursor.close()
             
             return {
                 "success": True,
@@ -246,9 +701,316 @@ class Database:
                 "doctor_name": appointment_data["doctor_name"]
             }
             
+        except DatabaseUnavailable:
+            raise
         except Exception as e:
             print(f"Error creating appointment: {e}")
             return {"success": False, "message": f"Appointment creation failed: {str(e)}"}
 
-# Create a database instance
-db = Database() 
\ No newline at end of file
+    @timed("db.create_appointments")
+    def create_appointments(self, bookings):
+        """Insert a batch of bookings in one transaction, at most once per idempotency_key
+
+        Returns {idempotency_key: result}. A key that is already in the table
+        (a batch retried after its commit) returns the existing appointment id;
+        a booking whose slot is already scheduled returns SLOT_TAKEN.
+        """
+        if self.mock_mode:
+            results = {}
+            for booking in bookings:
+                key = booking["idempotency_key"]
+                existing = next((a for a in self.mock_appointments if a.get("idempotency_key") == key), None)
+                if existing is not None:
+                    results[key] = {"success": True, "appointment_id": existing["id"]}
+                else:
+                    results[key] = self.create_appointment(booking)
+            return results
+
+        results = {}
+        with self.connection(autocommit=False) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT tc_number, id FROM patients WHERE tc_number = ANY(%s)",
+                           (sorted({b["tc_number"] for b in bookings}),))
+            patient_ids = dict(cursor.fetchall())
+
+            rows = []
+            for booking in bookings:
+                patient_id = patient_ids.get(booking["tc_number"])
+                if patient_id is None:
+                    results[booking["idempotency_key"]] = {"success": False, "message": "Patient not found"}
+                    continue
+                rows.append((patient_id, booking["department"], booking["doctor_name"], booking["doctor_id"],
+                             booking["appointment_date"], booking.get("symptoms", ""), booking["idempotency_key"]))
+
+            if rows:
+                inserted = execute_values(cursor, """
+                    INSERT INTO appointments
+                        (patient_id, department, doctor_name, doctor_id, appointment_date, symptoms, idempotency_key)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING
+                    RETURNING idempotency_key, id
+                """, rows, fetch=True)
+                ids = dict(inserted)
+                already = [row[-1] for row in rows if row[-1] not in ids]
+                if already:
+                    cursor.execute("SELECT idempotency_key, id FROM appointments WHERE idempotency_key = ANY(%s)",
+                                   (already,))
+                    ids.update(cursor.fetchall())
+                for key, appointment_id in ids.items():
+                    results[key] = {"success": True, "appointment_id": appointment_id}
+                # Skipped by the (doctor_id, appointment_date) index, not a retry
+                for key in already:
+                    results.setdefault(key, dict(SLOT_TAKEN))
+            conn.commit()
+            cursor.close()
+        return results
+
+    def export_rows(self, table, fetch_size=5000):
+        """Yield every row of an EXPORTS table as a tuple (columns in EXPORT_COLUMNS order)
+
+        Rows come from a named (server-side) cursor, `fetch_size` at a time,
+        so memory use does not grow with the table. The pooled connection is
+        held until the generator is exhausted or closed.
+        """
+        if table not in EXPORTS:
+            raise ValueError(f"Unknown export: {table}")
+
+        if self.mock_mode:
+            yield from _mock_export_rows(self, table)
+            return
+
+        # Named cursors only live inside a transaction
+        with self.connection(autocommit=False) as conn:
+            try:
+                cursor = conn.cursor(name=f"export_{table}")
+                cursor.itersize = fetch_size
+                cursor.execute(EXPORTS[table])
+                yield from cursor
+                cursor.close()
+            finally:
+                # Read-only work: end the transaction (and the cursor) either way
+                if not conn.closed:
+                    conn.rollback()
+
+    @timed("db.cancel_appointment")
+    def cancel_appointment(self, appointment_id, tc_number):
+        """Cancel a scheduled appointment of a patient, freeing its slot"""
+        try:
+            if self.mock_mode:
+                # Using mock data
+                for appointment in self.mock_appointments:
+                    if (appointment["id"] == appointment_id and appointment["tc_number"] == tc_number
+                            and appointment["status"] == "scheduled"):
+                        appointment["status"] = "cancelled"
+                        slot_events.bus.publish(slot_events.slot_event("released", appointment))
+                        row = (appointment["department"], appointment["doctor_id"], appointment["appointment_date"])
+                        break
+                else:
+                    row = None
+            else:
+                # Using real database (the trigger notifies the other workers)
+                with self.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        UPDATE appointments a SET status = 'cancelled'
+                        FROM patients p
+                        WHERE a.id = %s AND a.patient_id = p.id AND p.tc_number = %s AND a.status = 'scheduled'
+                        RETURNING a.department, a.doctor_id, a.appointment_date
+                    """, (appointment_id, tc_number))
+                    row = cursor.fetchone()
+                    cursor.close()
+
+            if row is None:
+                return {"success": False, "message": "Scheduled appointment not found"}
+            department, doctor_id, appointment_date = row
+            return {
+                "success": True,
+                "appointment_id": appointment_id,
+                "department": department,
+                "doctor_id": str(doctor_id),
+                "appointment_date": appointment_date if isinstance(appointment_date, str) else appointment_date.isoformat(),
+            }
+
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            # The driver's text stays in the log
+            print(f"Error cancelling appointment: {e}")
+            return {"success": False, "error": True, "message": "Appointment cancellation failed"}
+
+    @timed("db.add_rollups")
+    def add_rollups(self, counts):
+        """Add {table: {key: increment}} to the ROLLUPS tables in one transaction"""
+        if self.mock_mode:
+            for table, increments in counts.items():
+                rows = self.mock_rollups[table]
+                for key, increment in increments.items():
+                    rows[key] = rows.get(key, 0) + increment
+            return
+
+        with self.connection(autocommit=False) as conn:
+            cursor = conn.cursor()
+            for table, increments in counts.items():
+                if increments:
+                    keys = ROLLUPS[table]
+                    # Sorted, so workers flushing the same keys lock rows in the same order
+                    execute_values(cursor, f"""
+                        INSERT INTO {table} ({', '.join(keys)}, count) VALUES %s
+                        ON CONFLICT ({', '.join(keys)}) DO UPDATE SET count = {table}.count + EXCLUDED.count
+                    """, [key + (increment,) for key, increment in sorted(increments.items())])
+            conn.commit()
+            cursor.close()
+
+    @timed("db.replace_rollups")
+    def replace_rollups(self, counts):
+        """Replace the contents of the ROLLUPS tables with {table: {key: count}}"""
+        if self.mock_mode:
+            self.mock_rollups = {table: dict(counts.get(table, {})) for table in ROLLUPS}
+            return
+
+        with self.connection(autocommit=False) as conn:
+            cursor = conn.cursor()
+            for table, keys in ROLLUPS.items():
+                # Flushes from running workers wait until the new contents are committed
+                cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+                cursor.execute(f"DELETE FROM {table}")
+                execute_values(cursor, f"INSERT INTO {table} ({', '.join(keys)}, count) VALUES %s",
+                               [key + (count,) for key, count in counts.get(table, {}).items()])
+            conn.commit()
+            cursor.close()
+
+    @timed("db.fetch_rollups")
+    def fetch_rollups(self, start, end):
+        """Rollup rows with start <= day < end, as {table: [(*key, count), ...]}"""
+        if self.mock_mode:
+            return {
+                table: sorted(key + (count,) for key, count in rows.items() if start <= key[0] < end)
+                for table, rows in self.mock_rollups.items()
+            }
+
+        result = {}
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for table, keys in ROLLUPS.items():
+                # A range scan of the primary key: a few rows per department and day
+                cursor.execute(
+                    f"SELECT {', '.join(keys)}, count FROM {table} WHERE day >= %s AND day < %s ORDER BY {', '.join(keys)}",
+                    (start, end),
+                )
+                result[table] = cursor.fetchall()
+            cursor.close()
+        return result
+
+    @timed("db.list_appointments")
+    def list_appointments(self, tc_number=None, doctor_id=None, start=None, end=None,
+                          status=None, after=None, limit=DEFAULT_PAGE_SIZE):
+        """List appointments ordered by (appointment_date, id), one keyset page at a time"""
+        try:
+            if self.mock_mode:
+                # Using mock data
+                rows = []
+                for appointment in self.mock_appointments:
+                    row = dict(appointment, appointment_date=_as_datetime(appointment["appointment_date"]))
+                    if tc_number is not None and row.get("tc_number") != tc_number:
+                        continue
+                    if doctor_id is not None and str(row.get("doctor_id")) != str(doctor_id):
+                        continue
+                    if status is not None and row.get("status") != status:
+                        continue
+                    if start is not None and row["appointment_date"] < start:
+                        continue
+                    if end is not None and row["appointment_date"] >= end:
+                        continue
+                    if after is not None and (row["appointment_date"], row["id"]) <= after:
+                        continue
+                    rows.append(row)
+                rows.sort(key=lambda row: (row["appointment_date"], row["id"]))
+                appointments, next_cursor = build_page(rows[:limit + 1], limit)
+                return {"success": True, "appointments": appointments, "next_cursor": next_cursor}
+
+            # Using real database
+            conditions = []
+            params = []
+            if tc_number is not None:
+                conditions.append("p.tc_number = %s")
+                params.append(tc_number)
+            if doctor_id is not None:
+                conditions.append("a.doctor_id = %s")
+                params.append(str(doctor_id))
+            if status is not None:
+                conditions.append("a.status = %s")
+                params.append(status)
+            if start is not None:
+                conditions.append("a.appointment_date >= %s")
+                params.append(start)
+            if end is not None:
+                conditions.append("a.appointment_date < %s")
+                params.append(end)
+            if after is not None:
+                # Row comparison continues right after the previous page's last key
+                conditions.append("(a.appointment_date, a.id) > (%s, %s)")
+                params.extend(after)
+
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            with self.connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute(f"""
+                    SELECT a.id, p.tc_number, a.department, a.doctor_name, a.doctor_id,
+                           a.appointment_date, a.symptoms, a.status, a.created_at
+                    FROM appointments a
+                    JOIN patients p ON p.id = a.patient_id
+                    {where}
+                    ORDER BY a.appointment_date, a.id
+                    LIMIT %s
+                """, (*params, limit + 1))
+                rows = cursor.fetchall()
+                cursor.close()
+
+            appointments, next_cursor = build_page(rows, limit)
+            return {"success": True, "appointments": appointments, "next_cursor": next_cursor}
+
+        except DatabaseUnavailable:
+            raise
+        except Exception as e:
+            print(f"Error listing appointments: {e}")
+            return {"success": False, "message": f"Listing appointments failed: {str(e)}"}
+
+
+def behind_pooler(database_url):
+    """Whether the DSN points at a transaction pooler (Neon's -pooler host, PgBouncer's port)"""
+    try:
+        params = psycopg2.extensions.parse_dsn(database_url)
+    except psycopg2.ProgrammingError:
+        return False
+    return "-pooler" in params.get("host", "") or params.get("port") == "6432"
+
+
+def _mock_export_rows(db, table):
+    if table == "patients":
+        for patient in db.mock_patients.values():
+            yield tuple(patient.get(column) for column in EXPORT_COLUMNS["patients"])
+    else:
+        patients = {p["tc_number"]: p for p in db.mock_patients.values()}
+        for appointment in db.mock_appointments:
+            row = dict(appointment, patient_id=patients.get(appointment["tc_number"], {}).get("id"))
+            yield tuple(row.get(column) for column in EXPORT_COLUMNS["appointments"])
+
+
+def _prepare(cursor, name):
+    # PREPARE takes $n parameters; no params are passed, so psycopg2 sends it verbatim
+    parts = STATEMENTS[name].split("%s")
+    sql = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], start=1))
+    try:
+        cursor.execute(f"PREPARE {name} AS {sql}")
+    except psycopg2.errors.DuplicatePreparedStatement:
+        pass
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value.replace(tzinfo=None)
+
+
+# Create a database instance (connected per worker in the app lifespan)
+db = Database() 
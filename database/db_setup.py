@@ -1,13 +1,75 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./pris.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# "production": WAL journal, one pooled writer connection plus a pool of
+# read-only connections. "default": the plain engine used before.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "8"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Negative cache_size is in KiB: 64 MiB page cache per connection
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+def _apply_pragmas(dbapi_connection, read_only: bool):
+    cursor = dbapi_connection.cursor()
+    # WAL: readers never block the writer and the writer never blocks readers
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Durable at checkpoints, no fsync on every commit (safe with WAL)
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def create_sqlite_engine(url: str = SQLALCHEMY_DATABASE_URL, profile: str = SQLITE_PROFILE,
+                         read_only: bool = False):
+    """SQLite engine for the given profile; the writer pool holds a single connection"""
+    if profile == "default":
+        return create_engine(url, connect_args={"check_same_thread": False})
+
+    engine = create_engine(
+        url,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+            # Let SQLAlchemy, not pysqlite, issue BEGIN (see _begin below)
+            "isolation_level": None,
+        },
+        poolclass=QueuePool,
+        pool_size=SQLITE_READERS if read_only else 1,
+        max_overflow=0,
+        pool_timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        pool_pre_ping=False,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, read_only)
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        # The writer takes the write lock up front instead of upgrading a read
+        # lock mid-transaction, which is what fails with "database is locked".
+        conn.exec_driver_sql("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
+    return engine
+
+
+engine = create_sqlite_engine()
+read_engine = engine if SQLITE_PROFILE == "default" else create_sqlite_engine(read_only=True)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 Base = declarative_base()
 
@@ -20,5 +82,14 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    """Session on the read-only pool, for queries that never write"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -0,0 +1,130 @@
+"""
+In-memory doctor catalog.
+
+The `doctors` table is loaded into an immutable snapshot indexed by id and
+by department. Readers grab `catalog.snapshot` once and never see a half
+built index: a refresh builds a complete new snapshot and swaps the
+reference in one assignment. Lookups are dictionary reads, with no query
+per request; the lifespan re-checks the table's version periodically and
+reloads only when it changed.
+"""
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+# Initial doctors, inserted by the migration when the table is empty and
+# served directly in mock-data mode.
+SEED_DOCTORS = [
+    {"name": "Dr. Emma Wilson", "department": "Cardiology", "specialization": "Interventional Cardiology", "experience": 15, "rating": 4.8},
+    {"name": "Dr. James Smith", "department": "Cardiology", "specialization": "Heart Failure", "experience": 12, "rating": 4.6},
+    {"name": "Dr. Michael Chen", "department": "Neurology", "specialization": "Headache Medicine", "experience": 18, "rating": 4.9},
+    {"name": "Dr. Sarah Johnson", "department": "Neurology", "specialization": "Neuromuscular Disorders", "experience": 14, "rating": 4.7},
+    {"name": "Dr. Robert Brown", "department": "Orthopedics", "specialization": "Spine Surgery", "experience": 16, "rating": 4.8},
+    {"name": "Dr. Lisa Anderson", "department": "Orthopedics", "specialization": "Sports Medicine", "experience": 13, "rating": 4.5},
+    {"name": "Dr. David Kim", "department": "Pediatrics", "specialization": "General Pediatrics", "experience": 17, "rating": 4.9},
+    {"name": "Dr. Maria Garcia", "department": "Pediatrics", "specialization": "Pediatric Infectious Disease", "experience": 15, "rating": 4.7},
+    {"name": "Dr. Thomas Lee", "department": "Dermatology", "specialization": "Clinical Dermatology", "experience": 14, "rating": 4.6},
+    {"name": "Dr. Jennifer White", "department": "Dermatology", "specialization": "Allergy and Immunology", "experience": 12, "rating": 4.5},
+    {"name": "Dr. William Taylor", "department": "Ophthalmology", "specialization": "Retina", "experience": 16, "rating": 4.8},
+    {"name": "Dr. Emily Davis", "department": "Ophthalmology", "specialization": "Glaucoma", "experience": 13, "rating": 4.6},
+    {"name": "Dr. Daniel Moore", "department": "ENT", "specialization": "Rhinology", "experience": 11, "rating": 4.5},
+    {"name": "Dr. Olivia Martin", "department": "ENT", "specialization": "Otology", "experience": 9, "rating": 4.6},
+    {"name": "Dr. Henry Clark", "department": "Gastroenterology", "specialization": "Hepatology", "experience": 19, "rating": 4.7},
+    {"name": "Dr. Sophia Lewis", "department": "Gastroenterology", "specialization": "Endoscopy", "experience": 10, "rating": 4.6},
+    {"name": "Dr. Benjamin Hall", "department": "Internal Medicine", "specialization": "General Internal Medicine", "experience": 21, "rating": 4.8},
+    {"name": "Dr. Grace Young", "department": "Internal Medicine", "specialization": "Infectious Disease", "experience": 8, "rating": 4.4},
+    {"name": "Dr. Samuel King", "department": "Rheumatology", "specialization": "Inflammatory Arthritis", "experience": 14, "rating": 4.6},
+    {"name": "Dr. Chloe Wright", "department": "Rheumatology", "specialization": "Autoimmune Disease", "experience": 11, "rating": 4.5},
+    {"name": "Dr. Lucas Scott", "department": "Pulmonology", "specialization": "Asthma and COPD", "experience": 15, "rating": 4.7},
+    {"name": "Dr. Amelia Green", "department": "Pulmonology", "specialization": "Sleep Medicine", "experience": 9, "rating": 4.5},
+    {"name": "Dr. Noah Baker", "department": "Psychiatry", "specialization": "Mood Disorders", "experience": 13, "rating": 4.6},
+    {"name": "Dr. Mia Adams", "department": "Endocrinology", "specialization": "Diabetes", "experience": 12, "rating": 4.7},
+]
+
+
+class DoctorEntry(NamedTuple):
+    id: str
+    name: str
+    department: str
+    specialization: str
+    experience: int
+    rating: float
+
+    def to_dict(self) -> Dict:
+        return self._asdict()
+
+
+class CatalogSnapshot:
+    """Read-only view of every doctor, indexed by id and by department"""
+
+    __slots__ = ("version", "loaded_at", "by_id", "by_department")
+
+    def __init__(self, doctors: Iterable[DoctorEntry], version=None):
+        by_id = {}
+        by_department: Dict[str, list] = {}
+        for doctor in doctors:
+            by_id[doctor.id] = doctor
+            by_department.setdefault(doctor.department.lower(), []).append(doctor)
+
+        self.version = version
+        self.loaded_at = time.time()
+        self.by_id = MappingProxyType(by_id)
+        self.by_department = MappingProxyType({dept: tuple(docs) for dept, docs in by_department.items()})
+
+    def get(self, doctor_id) -> Optional[DoctorEntry]:
+        return self.by_id.get(str(doctor_id))
+
+    def in_department(self, department: str) -> Tuple[DoctorEntry, ...]:
+        return self.by_department.get(department.lower(), ())
+
+
+def entry_from_row(row) -> DoctorEntry:
+    """Build a catalog entry from a `doctors` row (dict-like)"""
+    return DoctorEntry(
+        id=str(row["id"]),
+        name=row["name"],
+        department=row["department"],
+        specialization=row.get("specialization") or "",
+        experience=int(row.get("experience") or 0),
+        rating=float(row.get("rating") or 0.0),
+    )
+
+
+class DoctorCatalog:
+    def __init__(self):
+        self.snapshot = CatalogSnapshot(())
+        self._fetch_rows: Optional[Callable[[], Iterable]] = None
+        self._fetch_version: Optional[Callable[[], object]] = None
+        self._refresh_lock = threading.Lock()
+
+    def configure(self, fetch_rows: Callable[[], Iterable], fetch_version: Callable[[], object]):
+        """Set where the catalog loads from (rows of the `doctors` table and a cheap version probe)"""
+        self._fetch_rows = fetch_rows
+        self._fetch_version = fetch_version
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload the snapshot if the table changed. Returns True when it was swapped."""
+        if self._fetch_rows is None:
+            return False
+
+        with self._refresh_lock:
+            version = self._fetch_version()
+            if not force and version is not None and version == self.snapshot.version:
+                return False
+
+            snapshot = CatalogSnapshot((entry_from_row(row) for row in self._fetch_rows()), version)
+            # Single reference assignment: readers see the old or the new snapshot, never a mix
+            self.snapshot = snapshot
+            print(f"Doctor catalog loaded: {len(snapshot.by_id)} doctors in {len(snapshot.by_department)} departments")
+            return True
+
+    def get(self, doctor_id) -> Optional[DoctorEntry]:
+        return self.snapshot.get(doctor_id)
+
+    def in_department(self, department: str) -> Tuple[DoctorEntry, ...]:
+        return self.snapshot.in_department(department)
+
+
+# One catalog per worker process, filled by the application lifespan
+catalog = DoctorCatalog()
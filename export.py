@@ -0,0 +1,117 @@
+"""
+Streaming CSV / NDJSON export of the patients and appointments tables.
+
+Rows are read through Database.export_rows (a server-side cursor, fetched
+`fetch_size` rows at a time) and encoded in small batches, optionally
+gzipped on the fly, so memory use stays flat whatever the table size.
+The same byte stream feeds the /api/export endpoint and this CLI:
+
+    python export.py patients --format csv -o patients.csv
+    python export.py appointments --format ndjson --gzip -o appointments.ndjson.gz
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date, datetime
+from typing import Iterable, Iterator, Sequence
+
+from dotenv import load_dotenv
+
+from database import EXPORT_COLUMNS, EXPORTS, db
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+BATCH_ROWS = 1000
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_csv(columns: Sequence[str], rows: Iterable[tuple]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % BATCH_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def encode_ndjson(columns: Sequence[str], rows: Iterable[tuple]) -> Iterator[bytes]:
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(dict(zip(columns, row)), default=_json_value, ensure_ascii=False))
+        if len(batch) == BATCH_ROWS:
+            yield ("\n".join(batch) + "\n").encode()
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode()
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a byte stream incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(db, table: str, fmt: str = "csv", fetch_size: int = 5000,
+                  compress: bool = False) -> Iterator[bytes]:
+    """Bytes of a full-table export, produced as the rows are read"""
+    if table not in EXPORTS:
+        raise ValueError(f"Unknown export: {table}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt} (expected csv or ndjson)")
+    columns = EXPORT_COLUMNS[table]
+    rows = db.export_rows(table, fetch_size)
+    encode = encode_csv if fmt == "csv" else encode_ndjson
+    chunks = encode(columns, rows)
+    return gzip_stream(chunks) if compress else chunks
+
+
+def write_export(db, table: str, path: str, fmt: str = "csv", fetch_size: int = 5000,
+                 compress: bool = False) -> int:
+    """Write an export to a file; returns the bytes written"""
+    written = 0
+    with open(path, "wb") as out:
+        for chunk in stream_export(db, table, fmt, fetch_size, compress):
+            out.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a table as CSV or NDJSON")
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--fetch-size", type=int, default=5000, help="rows per server round trip")
+    # Not stdout: Database logs its progress there
+    parser.add_argument("-o", "--output", required=True, help="file to write")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db.connect()
+    try:
+        written = write_export(db, args.table, args.output, args.format, args.fetch_size, args.gzip)
+    finally:
+        db.close()
+    print(f"Exported {args.table} to {args.output}: {written} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+Worker lifecycle: startup warm-up hooks, readiness and graceful draining.
+
+Every server process (one per uvicorn worker) owns a single WorkerState.
+The application lifespan runs the registered startup hooks (open the
+database pool, preload models, ...) before the worker reports ready and
+runs the shutdown hooks once in-flight requests have drained.
+
+Under `python server.py` the server is a DrainingServer: on SIGTERM the
+worker reports draining (readiness 503) at once but keeps serving for
+DRAIN_DELAY_SECONDS, so load balancers stop routing to it before uvicorn
+closes its sockets. A second signal stops it immediately.
+"""
+import asyncio
+import inspect
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+import uvicorn
+from starlette.responses import JSONResponse
+from uvicorn.supervisors import Multiprocess
+
+
+class WorkerState:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.started_at = None
+        self.ready_at = None
+        self.ready = False
+        self.draining = False
+        self.stopping = False
+        self.in_flight = 0
+        self.warmup_times: Dict[str, float] = {}
+        self.warmup_errors: Dict[str, str] = {}
+        self._startup_hooks: List[Tuple[str, Callable, bool]] = []
+        self._shutdown_hooks: List[Tuple[str, Callable]] = []
+
+    def on_startup(self, name: str, func: Callable, required: bool = True):
+        """Register a warm-up hook. A failing required hook keeps the worker unready."""
+        self._startup_hooks.append((name, func, required))
+
+    def on_shutdown(self, name: str, func: Callable):
+        """Register a hook that runs after the worker has drained."""
+        self._shutdown_hooks.append((name, func))
+
+    async def start(self):
+        """Run the startup hooks in registration order and mark the worker ready"""
+        self.pid = os.getpid()
+        self.started_at = time.time()
+        self.ready = False
+        self.draining = False
+        self.stopping = False
+
+        failed_required = False
+        for name, func, required in self._startup_hooks:
+            start = time.perf_counter()
+            try:
+                await _call(func)
+                self.warmup_times[name] = time.perf_counter() - start
+                print(f"[worker {self.pid}] warm-up '{name}' finished in {self.warmup_times[name]:.2f}s")
+            except Exception as e:
+                self.warmup_errors[name] = str(e)
+                print(f"[worker {self.pid}] warm-up '{name}' failed: {e}")
+                if required:
+                    failed_required = True
+
+        self.ready = not failed_required
+        self.ready_at = time.time()
+
+    def mark_draining(self):
+        """Stop reporting ready; requests are still served until `stopping`"""
+        if not self.draining:
+            print(f"[worker {self.pid}] draining, readiness now reports 503")
+        self.ready = False
+        self.draining = True
+
+    async def drain(self, timeout: float = 30.0):
+        """Stop reporting ready, wait for in-flight requests, then run shutdown hooks"""
+        self.ready = False
+        self.draining = True
+        self.stopping = True
+        print(f"[worker {self.pid}] draining {self.in_flight} in-flight request(s)")
+
+        deadline = time.monotonic() + timeout
+        while self.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        if self.in_flight > 0:
+            print(f"[worker {self.pid}] drain timeout, {self.in_flight} request(s) still running")
+
+        for name, func in reversed(self._shutdown_hooks):
+            try:
+                await _call(func)
+            except Exception as e:
+                print(f"[worker {self.pid}] shutdown hook '{name}' failed: {e}")
+
+    def liveness(self) -> Dict:
+        return {
+            "status": "alive",
+            "pid": self.pid,
+            "uptime_seconds": round(time.time() - self.started_at, 3) if self.started_at else 0.0,
+        }
+
+    def readiness(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "pid": self.pid,
+            "in_flight": self.in_flight,
+            "warmup_seconds": {name: round(t, 3) for name, t in self.warmup_times.items()},
+            "warmup_errors": self.warmup_errors,
+        }
+
+
+class InFlightMiddleware:
+    """Counts HTTP requests in `state.in_flight` until their whole body is sent.
+
+    A plain ASGI middleware: an @app.middleware("http") function gets its
+    response back from call_next as soon as the headers are ready, so a
+    streamed (SSE) body would still be running when drain() sees zero.
+    Once the worker is stopping, new requests get 503.
+    """
+
+    def __init__(self, app, state: WorkerState, exempt: Tuple[str, ...] = ()):
+        self.app = app
+        self.state = state
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt):
+            return await self.app(scope, receive, send)
+        if self.state.stopping:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is shutting down"},
+                headers={"Connection": "close"},
+            )
+            return await response(scope, receive, send)
+        self.state.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.state.in_flight -= 1
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that reports draining for `drain_delay` seconds before it stops"""
+
+    drain_delay = 0.0
+
+    def handle_exit(self, sig, frame):
+        if worker.draining or self.drain_delay <= 0:
+            worker.mark_draining()
+            worker.stopping = True
+            return super().handle_exit(sig, frame)
+        worker.mark_draining()
+        asyncio.get_event_loop().call_later(self.drain_delay, self._stop, sig, frame)
+
+    def _stop(self, sig, frame):
+        worker.stopping = True
+        super().handle_exit(sig, frame)
+
+
+def serve(app: str, drain_delay: float = 0.0, **kwargs):
+    """uvicorn.run() with a DrainingServer in every worker process"""
+    config = uvicorn.Config(app, **kwargs)
+    server = DrainingServer(config=config)
+    server.drain_delay = drain_delay
+    if config.workers > 1:
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    else:
+        server.run()
+
+
+async def _call(func: Callable):
+    """Await coroutine hooks; run blocking hooks in the default executor"""
+    if inspect.iscoroutinefunction(func):
+        return await func()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func)
+
+
+# One state object per worker process
+worker = WorkerState()
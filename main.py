@@ -1,18 +1,319 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from typing import Dict, Optional, List
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+import asyncio
+import hmac
 import random
 import json
 import os
+import threading
+import uuid
 
 # Import our database connection
-from database import db
-from pydantic import BaseModel
+from database import SLOT_TAKEN, TRANSIENT_ERRORS, DatabaseUnavailable, PatientRecord, behind_pooler, db
+from chat import analyze_message, semantic_matching_enabled
+from chat_sessions import sessions as chat_sessions
+from doctor_catalog import catalog as doctor_catalog
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor
+from availability import availability_cache, normalize_slot, slot_index, utc_now, next_available as find_next_available
+from dotenv import load_dotenv
+from lifecycle import InFlightMiddleware, worker
+from scheduling import SchedulerFull, priority_for_text, scheduler
+from admission import TooManyRequests, rate_limiter, retry_after_header
+from singleflight import normalize_text, single_flight
+from export import FORMATS as EXPORT_FORMATS, stream_export
+from profiling import profiler, timed
+from slot_events import bus as slot_bus, hub as slot_hub
+from booking_outbox import IdempotencyConflict, SlotTaken, outbox as booking_outbox
+from rollups import MAX_STATS_DAYS, rollups, summarize as summarize_rollups
+from pydantic import BaseModel, Field
 
-app = FastAPI(title="Intelligent Patient System")
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "false").lower() in ("1", "true", "yes")
+
+
+def _preload_models():
+    """Load the diagnosis model into this worker before it reports ready"""
+    if not _env_flag("PRELOAD_MODELS"):
+        return
+    # Imported here: transformers/torch/sklearn cost seconds to import
+    from agents.diagnosis_agent import DiagnosisAgent
+    agent = DiagnosisAgent()
+    agent.warm_up()
+    app.state.diagnosis_agent = agent
+    _get_text_generator().llm_model
+
+
+def _load_doctor_catalog():
+    """Build this worker's doctor catalog snapshot from the doctors table"""
+    doctor_catalog.configure(db.fetch_doctors, db.doctor_catalog_version)
+    doctor_catalog.refresh(force=True)
+
+
+async def _refresh_doctor_catalog():
+    """Swap in a new catalog snapshot whenever the doctors table changes"""
+    interval = float(os.getenv("DOCTOR_CATALOG_REFRESH_SECONDS", "60"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(doctor_catalog.refresh)
+        except Exception as e:
+            print(f"Doctor catalog refresh failed, keeping the current snapshot: {e}")
+        if slot_bus.live:
+            continue  # slot events keep the index current
+        try:
+            # Picks up bookings made by the other workers
+            await run_in_threadpool(slot_index.reload)
+        except Exception as e:
+            print(f"Slot index reload failed, keeping the current index: {e}")
+
+
+async def _flush_chat_sessions():
+    """Write changed chat sessions to the local store in the background"""
+    interval = float(os.getenv("CHAT_SESSION_FLUSH_SECONDS", "5"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(chat_sessions.flush)
+        except Exception as e:
+            print(f"Chat session flush failed, will retry: {e}")
+
+
+async def _flush_rollups():
+    """Add this worker's load counts to the rollup tables in the background"""
+    interval = float(os.getenv("ROLLUP_FLUSH_SECONDS", "10"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(rollups.flush)
+        except Exception as e:
+            print(f"Rollup flush failed, will retry: {e}")
+
+
+def _configure_rollups():
+    rollups.configure(db.add_rollups)
+
+
+async def _flush_booking_outbox():
+    """Send outbox bookings (BOOKING_MODE=outbox) to the database in batches"""
+    if not booking_outbox.enabled:
+        return
+    interval = float(os.getenv("BOOKING_OUTBOX_FLUSH_MS", "100")) / 1000
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(booking_outbox.flush)
+        except Exception as e:
+            print(f"Booking outbox flush failed, will retry: {e}")
+
+
+def _booking_settled(booking: Dict, result: Dict):
+    if result.get("success"):
+        rollups.record_appointment(booking["department"], booking["doctor_id"], booking["appointment_date"])
+    elif not result.get("slot_taken"):
+        # Rejected by the database: the slot is free again
+        slot_index.release(booking["doctor_id"], booking["appointment_date"])
+
+
+def _configure_booking_outbox():
+    booking_outbox.configure(db.create_appointments, on_settled=_booking_settled, transient=TRANSIENT_ERRORS)
+
+
+@timed("chat.analyze")
+def _analyze_chat(message: "ChatMessage") -> Dict:
+    """Analyse a chat message within the patient's session (CHAT_SESSIONS=false: stateless)"""
+    if os.getenv("CHAT_SESSIONS", "true").lower() in ("1", "true", "yes"):
+        return chat_sessions.analyze(message.tc_number, message.message)
+    return analyze_message(message.message)
+
+
+def _chat_key(message: "ChatMessage"):
+    """Identical chat input; per patient while sessions make the answer patient-specific"""
+    text = normalize_text(message.message)
+    if os.getenv("CHAT_SESSIONS", "true").lower() in ("1", "true", "yes"):
+        return message.tc_number, text
+    return text
+
+
+async def _scheduled_chat(message: "ChatMessage") -> Dict:
+    # Urgent messages are served ahead of routine ones when the worker is busy
+    async with scheduler.slot(priority_for_text(message.message)):
+        analysis = await run_in_threadpool(_analyze_chat, message)
+    rollups.record_chat(analysis)
+    return analysis
+
+
+def _load_slot_index():
+    """Index the taken appointment slots of this worker"""
+    slot_index.configure(lambda: db.fetch_taken_slots(utc_now()))
+    slot_index.reload()
+
+
+async def _start_slot_events():
+    """Receive slot changes from every worker (LISTEN/NOTIFY; in process in mock mode)"""
+    slot_hub.bind(asyncio.get_running_loop())
+    if os.getenv("SLOT_EVENTS", "true").lower() not in ("1", "true", "yes"):
+        return
+    if db.mock_mode:
+        slot_bus.start_local()
+    elif os.getenv("SLOT_EVENTS_DATABASE_URL"):
+        slot_bus.start_postgres(os.getenv("SLOT_EVENTS_DATABASE_URL"))
+    elif behind_pooler(os.getenv("DATABASE_URL", "")):
+        print("Slot events off: DATABASE_URL is a transaction pooler, set SLOT_EVENTS_DATABASE_URL "
+              "to a direct endpoint (the slot index is reloaded periodically)")
+    else:
+        slot_bus.start_postgres(os.getenv("DATABASE_URL"))
+
+
+def _on_slot_event(event: Dict):
+    # Only the doctor whose slot changed is touched
+    slot_index.apply(event)
+    availability_cache.invalidate(event["doctor_id"])
+    slot_hub.publish(event)
+
+
+def _resync_slots():
+    """Events may have been missed (listener reconnected): rebuild everything once"""
+    slot_index.reload()
+    availability_cache.clear()
+    slot_hub.resync()
+
+
+def _load_symptom_index():
+    """Map the symptom vectors into this worker when semantic matching is on"""
+    if not semantic_matching_enabled():
+        return
+    from symptom_index import get_index
+    get_index()
+
+
+class StreamSlots:
+    """Caps the number of concurrent chat streams in this worker"""
+
+    def __init__(self, limit: int = 4):
+        self.limit = limit
+        self.active = 0
+
+    def configure(self):
+        self.limit = int(os.getenv("MAX_CONCURRENT_STREAMS", str(self.limit)))
+
+    def try_acquire(self) -> bool:
+        # Single event loop per worker, so no lock is needed
+        if self.active >= self.limit:
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+
+
+stream_slots = StreamSlots()
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """Gives the stream slot back however the response ends.
+
+    A generator's `finally` does not run if the client is gone before the
+    first chunk is pulled, so the release cannot live in the generator.
+    Closing the body also stops a generator abandoned mid-stream right away.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            stream_slots.release()
+            await self.body_iterator.aclose()
+
+
+_text_generator = None
+_text_generator_lock = threading.Lock()
+
+
+def _get_text_generator():
+    """Create the text-generation agent once per worker"""
+    global _text_generator
+    with _text_generator_lock:
+        if _text_generator is None:
+            from agents.diagnosis import DiagnosisAgent as TextGenerationAgent
+            _text_generator = TextGenerationAgent(agent_id=os.getpid())
+        return _text_generator
+
+
+def _with_patient_dict(result: Dict) -> Dict:
+    """Database methods return PatientRecord tuples; turn them into JSON objects here"""
+    patient = result.get("patient")
+    if isinstance(patient, PatientRecord):
+        return {**result, "patient": patient.to_dict()}
+    return result
+
+
+def _client_ip(request: Request) -> Optional[str]:
+    return request.client.host if request.client else None
+
+
+def _save_profile(profile):
+    try:
+        path = profiler.write(profile)
+        print(f"Profile of {profile.route} ({profile.duration * 1000:.0f} ms) saved to {path}")
+    except OSError as e:
+        print(f"Could not save profile of {profile.route}: {e}")
+
+
+def _sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Per-worker warm-up: nothing below runs at import time. Each process loads
+# the environment, opens its own pool and (optionally) loads its own models.
+worker.on_startup("environment", load_dotenv)
+worker.on_startup("database", db.connect)
+# Not required: if the database is down at boot, the refresh loop fills
+# both in once the background reconnect succeeds.
+worker.on_startup("doctor_catalog", _load_doctor_catalog, required=False)
+worker.on_startup("slot_index", _load_slot_index, required=False)
+worker.on_startup("slot_events", _start_slot_events, required=False)
+worker.on_startup("chat_streams", stream_slots.configure)
+worker.on_startup("scheduler", scheduler.configure)
+worker.on_startup("rate_limiter", rate_limiter.configure)
+worker.on_startup("chat_sessions", chat_sessions.configure)
+worker.on_startup("rollups", _configure_rollups)
+worker.on_startup("booking_outbox", _configure_booking_outbox)
+worker.on_startup("profiler", profiler.configure)
+worker.on_startup("symptom_index", _load_symptom_index)
+worker.on_startup("diagnosis_model", _preload_models)
+worker.on_shutdown("database", db.close)
+worker.on_shutdown("slot_events", slot_bus.close)
+worker.on_shutdown("chat_sessions", chat_sessions.close)
+worker.on_shutdown("rollups", rollups.flush)
+worker.on_shutdown("booking_outbox", booking_outbox.close)
+
+slot_bus.subscribe(_on_slot_event, resync=_resync_slots)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await worker.start()
+    catalog_refresher = asyncio.create_task(_refresh_doctor_catalog())
+    session_flusher = asyncio.create_task(_flush_chat_sessions())
+    rollup_flusher = asyncio.create_task(_flush_rollups())
+    outbox_flusher = asyncio.create_task(_flush_booking_outbox())
+    yield
+    catalog_refresher.cancel()
+    session_flusher.cancel()
+    rollup_flusher.cancel()
+    outbox_flusher.cancel()
+    await worker.drain(timeout=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30")))
+
+
+app = FastAPI(title="Intelligent Patient System", lifespan=lifespan)
 
 # CORS settings
 app.add_middleware(
@@ -23,8 +324,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Serve static files
-app.mount("/", StaticFiles(directory=".", html=True), name="static")
+# Track in-flight requests (streamed bodies included) so shutdown can drain them
+app.add_middleware(InFlightMiddleware, state=worker, exempt=("/api/health",))
+
+# Sampled stack profiles of a fraction of requests (or on X-Profile: <token>)
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    path = request.url.path
+    if (not path.startswith("/api/") or path.startswith(("/api/health", "/api/metrics"))
+            or not profiler.wanted(request.headers.get("X-Profile"))):
+        return await call_next(request)
+    profile = profiler.start(path)
+    if profile is None:
+        return await call_next(request)
+    try:
+        response = await call_next(request)
+    finally:
+        # Route template (e.g. /api/patient/check/{tc_number}) to group profiles
+        profiler.stop(profile, getattr(request.scope.get("route"), "path", None))
+    response.headers["Server-Timing"] = profile.server_timing()
+    asyncio.ensure_future(run_in_threadpool(_save_profile, profile))
+    return response
 
 # Pydantic models for request validation
 class PatientRegistration(BaseModel):
@@ -34,11 +354,17 @@ class PatientRegistration(BaseModel):
     phone: str
     date_of_birth: str
 
+# Lengths match the appointments/patients columns: a booking queued in the
+# outbox must not be rejected by the database later
 class AppointmentRequest(BaseModel):
+    tc_number: str = Field(max_length=11)
+    department: str = Field(max_length=100)
+    doctor_id: str = Field(max_length=100)
+    appointment_date: str = Field(max_length=40)
+    symptoms: str = Field("", max_length=5000)
+
+class CancelRequest(BaseModel):
     tc_number: str
-    department: str
-    doctor_id: str
-    appointment_date: str
 
 class ChatMessage(BaseModel):
     tc_number: str
@@ -49,128 +375,390 @@ class ChatMessage(BaseModel):
 async def root():
     return {"message": "Welcome to Intelligent Patient System API"}
 
+# Liveness probe: the process is up and serving the event loop
+@app.get("/api/health/live")
+async def health_live():
+    return worker.liveness()
+
+# Readiness probe: warm-up finished and the worker is not draining
+@app.get("/api/health/ready")
+async def health_ready():
+    status = worker.readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+# Per-worker metrics (database, scheduling, admission, sessions, coalescing)
+@app.get("/api/metrics")
+async def metrics():
+    return {
+        "pid": worker.pid,
+        "database": db.stats(),
+        "scheduler": scheduler.stats(),
+        "admission": rate_limiter.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "single_flight": single_flight.stats(),
+        "rollups": rollups.stats(),
+        "profiler": profiler.stats(),
+        "slot_events": {**slot_bus.stats(), "websocket": slot_hub.stats()},
+        "availability_cache": availability_cache.stats(),
+        "booking_outbox": booking_outbox.stats(),
+    }
+
+# Daily load per department, doctor, status and symptom (from the rollup tables)
+@app.get("/api/stats")
+async def load_stats(day: Optional[str] = None, days: int = Query(1, ge=1, le=MAX_STATS_DAYS)):
+    """Counts for `days` days starting at `day` (default: today)"""
+    try:
+        start = date.fromisoformat(day) if day else utc_now().date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid day, expected YYYY-MM-DD")
+    end = start + timedelta(days=days)
+    rows = await run_in_threadpool(db.fetch_rollups, start, end)
+    return {"from": start.isoformat(), "to": (end - timedelta(days=1)).isoformat(), **summarize_rollups(rows)}
+
 # Patient check endpoint
 @app.get("/api/patient/check/{tc_number}")
 async def check_patient(tc_number: str):
     """Check if a patient exists in the database by TC number"""
-    result = db.check_patient_exists(tc_number)
-    return result
+    # Login bursts fire the same check several times at once
+    result = await single_flight.do("patient_check", tc_number, run_in_threadpool, db.check_patient_exists, tc_number)
+    return _with_patient_dict(result)
 
 # Patient registration endpoint
 @app.post("/api/patient/register")
 async def register_patient(patient: PatientRegistration):
     """Register a new patient"""
-    result = db.register_patient({
+    data = {
         "tc_number": patient.tc_number,
         "name": patient.name,
         "date_of_birth": patient.date_of_birth,
         "phone": patient.phone,
         "email": patient.email
-    })
-    return result
+    }
+    # Concurrent retries of the same registration share one insert
+    key = tuple(sorted(data.items()))
+    result = await single_flight.do("patient_register", key, run_in_threadpool, db.register_patient, data)
+    return _with_patient_dict(result)
 
 # Chat endpoint for symptom analysis
 @app.post("/api/chat")
-async def process_chat(message: ChatMessage):
+async def process_chat(message: ChatMessage, request: Request):
     """Process chat messages and detect symptoms"""
-    # This is a simplified version - in a real implementation, 
-    # we would use NLP to analyze symptoms
-    msg = message.message.lower()
-    
-    # Simple keyword matching for the demo
-    detected_symptoms = []
-    departments = []
+    await rate_limiter.check(request.url.path, message.tc_number, _client_ip(request))
+    return await single_flight.do("chat", _chat_key(message), _scheduled_chat, message)
+
+# Streaming chat endpoint (Server-Sent Events)
+@app.post("/api/chat/stream")
+async def stream_chat(message: ChatMessage, request: Request):
+    """Send detected symptoms immediately, then stream the generated assessment"""
+    await rate_limiter.check(request.url.path, message.tc_number, _client_ip(request))
+    if not stream_slots.try_acquire():
+        rate_limiter.reject(request.url.path, "streams_full")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Too many concurrent chat streams, please retry"},
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        analysis = await single_flight.do("chat", _chat_key(message), _scheduled_chat, message)
+    except BaseException:
+        stream_slots.release()
+        raise
+
+    async def events():
+        cancel = threading.Event()
+        try:
+            yield _sse("symptoms", analysis)
+            if analysis["detected_symptoms"]:
+                try:
+                    generator = await run_in_threadpool(_get_text_generator)
+                    tokens = generator.stream_symptoms(
+                        {"symptoms": ", ".join(analysis["detected_symptoms"])},
+                        cancel_event=cancel,
+                        max_new_tokens=int(os.getenv("CHAT_STREAM_MAX_TOKENS", "100")),
+                    )
+                    async for text in iterate_in_threadpool(tokens):
+                        yield _sse("token", {"text": text})
+                except Exception as e:
+                    yield _sse("error", {"detail": f"Text generation unavailable: {e}"})
+            yield _sse("done", {})
+        finally:
+            # Runs when the client disconnects too: stop the model at the next token
+            cancel.set()
+
+    return SlotStreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Chat session of a patient (symptoms collected so far)
+@app.get("/api/chat/session/{tc_number}")
+async def get_chat_session(tc_number: str):
+    session = await run_in_threadpool(chat_sessions.get, tc_number)
+    if session is None:
+        raise HTTPException(status_code=404, detail="No active chat session")
+    return session.to_dict()
+
+# Start a new conversation
+@app.delete("/api/chat/session/{tc_number}")
+async def reset_chat_session(tc_number: str):
+    await run_in_threadpool(chat_sessions.reset, tc_number)
+    return {"success": True}
+
+# Appointment booking endpoint
+@app.post("/api/appointment/create")
+async def create_appointment(appointment: AppointmentRequest, request: Request):
+    """Create a new appointment"""
+    await rate_limiter.check(request.url.path, appointment.tc_number, _client_ip(request))
+    # Parse date
+    try:
+        slot = normalize_slot(appointment.appointment_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
     
-    # Check for symptoms in the message
-    symptom_keywords = {
-        "headache": ["headache", "head pain", "migraine"],
-        "stomach pain": ["stomach", "belly", "nausea", "abdomen"],
-        "fever": ["fever", "temperature", "hot"],
-        "cough": ["cough", "throat", "phlegm"],
-        "back pain": ["back pain", "backache"],
-        "joint pain": ["joint", "arthritis"],
-        "eye pain": ["eye", "vision"],
-        "skin rash": ["rash", "skin", "itch"],
-        "dizziness": ["dizzy", "vertigo", "balance"],
-        "breathing difficulty": ["breath", "inhale", "exhale", "suffocate"]
-    }
+    # Resolve the doctor from the in-memory catalog (no query)
+    doctor = doctor_catalog.get(appointment.doctor_id)
+    if doctor is None:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    if appointment.department.casefold() != doctor.department.casefold():
+        raise HTTPException(status_code=400, detail=f"Doctor does not work in {appointment.department}")
     
-    # Map departments to symptoms
-    department_mapping = {
-        "headache": ["Neurology", "ENT"],
-        "stomach pain": ["Gastroenterology", "Internal Medicine"],
-        "fever": ["Internal Medicine"],
-        "cough": ["ENT", "Internal Medicine"],
-        "back pain": ["Orthopedics", "Neurology"],
-        "joint pain": ["Orthopedics", "Rheumatology"],
-        "eye pain": ["Ophthalmology"],
-        "skin rash": ["Dermatology"],
-        "dizziness": ["ENT", "Neurology"],
-        "breathing difficulty": ["Pulmonology", "Cardiology"]
-    }
+    if booking_outbox.enabled:
+        return await _submit_to_outbox(appointment, doctor, slot, request.headers.get("Idempotency-Key"))
     
-    # Detect symptoms from message
-    for symptom, keywords in symptom_keywords.items():
-        for keyword in keywords:
-            if keyword in msg:
-                detected_symptoms.append(symptom)
-                
-                # Add associated departments
-                if symptom in department_mapping:
-                    departments.extend(department_mapping[symptom])
-                break
+    if slot_index.is_taken(doctor.id, slot):
+        raise HTTPException(status_code=409, detail=SLOT_TAKEN["message"])
     
-    # Remove duplicates
-    detected_symptoms = list(set(detected_symptoms))
-    departments = list(set(departments))
+    # Create appointment (urgent symptoms get a connection first)
+    async with scheduler.slot(priority_for_text(appointment.symptoms)):
+        result = await run_in_threadpool(db.create_appointment, {
+            "tc_number": appointment.tc_number,
+            "department": doctor.department,
+            "doctor_id": doctor.id,
+            "doctor_name": doctor.name,
+            "appointment_date": slot.isoformat(),
+            "symptoms": appointment.symptoms
+        })
     
-    # If no symptoms detected
-    if not detected_symptoms:
-        return {
-            "message": "I'm not sure I understood your symptoms. Could you describe what you're experiencing in more detail?",
-            "detected_symptoms": [],
-            "action": "ask_more"
-        }
+    if result.get("slot_taken"):
+        # Another worker won the race (idx_appointments_doctor_slot)
+        slot_index.mark_taken(doctor.id, slot)
+        raise HTTPException(status_code=409, detail=result["message"])
+    if result.get("success"):
+        slot_index.mark_taken(doctor.id, slot)
+        rollups.record_appointment(doctor.department, doctor.id, slot)
     
-    # Generate mock doctors for each department
-    doctors = []
-    for dept in departments:
-        doctors.append({"name": f"Dr. John Smith", "department": dept})
-        doctors.append({"name": f"Dr. Sarah Johnson", "department": dept})
+    return result
+
+async def _submit_to_outbox(appointment: AppointmentRequest, doctor, slot: datetime, key: Optional[str]):
+    """Reserve the slot and queue the booking durably; 202 with its idempotency key"""
+    if key is not None and not 0 < len(key) <= 64:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 1-64 characters")
+    try:
+        status, created = await run_in_threadpool(booking_outbox.submit, key or uuid.uuid4().hex, {
+            "tc_number": appointment.tc_number,
+            "department": doctor.department,
+            "doctor_id": doctor.id,
+            "doctor_name": doctor.name,
+            "appointment_date": slot.isoformat(),
+            "symptoms": appointment.symptoms,
+        }, lambda: slot_index.is_taken(doctor.id, slot))
+    except (SlotTaken, IdempotencyConflict) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if created:
+        slot_index.mark_taken(doctor.id, slot)
+    return JSONResponse(status_code=202, content={"success": status["status"] != "failed", **status})
+
+# Status of an outbox booking (pending until it is written to the database)
+@app.get("/api/appointment/status/{idempotency_key}")
+async def appointment_status(idempotency_key: str, tc_number: str):
+    status = await run_in_threadpool(booking_outbox.status, idempotency_key, tc_number)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    return status
+
+# Appointment cancellation (frees the slot for everyone watching it)
+@app.post("/api/appointment/{appointment_id}/cancel")
+async def cancel_appointment(appointment_id: int, cancel: CancelRequest, request: Request):
+    await rate_limiter.check("/api/appointment/{id}/cancel", cancel.tc_number, _client_ip(request))
+    result = await run_in_threadpool(db.cancel_appointment, appointment_id, cancel.tc_number)
+    if result.get("error"):
+        raise HTTPException(status_code=500, detail=result["message"])
+    if not result.get("success"):
+        raise HTTPException(status_code=404, detail=result["message"])
+    slot_index.release(result["doctor_id"], result["appointment_date"])
+    rollups.record_status_change(result["department"], result["doctor_id"], result["appointment_date"],
+                                 "scheduled", "cancelled")
+    return result
+
+# Live slot changes for the booking UI: a snapshot of a doctor's taken slots
+# (with doctor_id), then "taken" / "released" deltas; "resync" means refetch
+@app.websocket("/ws/availability")
+async def availability_updates(websocket: WebSocket, department: Optional[str] = None,
+                               doctor_id: Optional[str] = None):
+    await websocket.accept()
+    if worker.stopping:
+        await websocket.close(code=1012)
+        return
+    queue = slot_hub.register(department, doctor_id)
+
+    async def closed():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    disconnect = asyncio.ensure_future(closed())
+    try:
+        if doctor_id:
+            taken = slot_index.taken_slots(doctor_id, utc_now().replace(hour=0, minute=0))
+            await websocket.send_json({"type": "snapshot", "doctor_id": doctor_id,
+                                       "taken": [slot.isoformat() for slot in taken]})
+        while True:
+            event = asyncio.ensure_future(queue.get())
+            await asyncio.wait({event, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect.done():
+                event.cancel()
+                break
+            await websocket.send_json(event.result())
+    except Exception:
+        pass  # the client went away mid-send
+    finally:
+        disconnect.cancel()
+        slot_hub.unregister(queue)
+
+# Appointment listings (keyset pagination on appointment_date, id)
+async def _appointment_page(cursor: Optional[str], limit: int, **filters):
+    try:
+        after = decode_cursor(cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await run_in_threadpool(
+        lambda: db.list_appointments(after=after, limit=limit, **filters)
+    )
+
+def _require_token(request: Request, variable: str, feature: str):
+    """Staff-only endpoints: 404 unless `variable` is set, 403 without its bearer token"""
+    token = os.getenv(variable)
+    if not token:
+        raise HTTPException(status_code=404, detail=f"{feature} is not enabled")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        raise HTTPException(status_code=403, detail=f"Invalid {feature.lower()} token")
+
+# Appointment listings for staff tools (need STAFF_TOKEN)
+@app.get("/api/appointments/patient/{tc_number}")
+async def list_patient_appointments(
+    tc_number: str,
+    request: Request,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """List a patient's appointments, oldest first"""
+    _require_token(request, "STAFF_TOKEN", "Appointment listing")
+    return await _appointment_page(cursor, limit, tc_number=tc_number, status=status)
+
+@app.get("/api/appointments/doctor/{doctor_id}")
+async def list_doctor_appointments(
+    doctor_id: str,
+    request: Request,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """List a doctor's appointments, oldest first"""
+    _require_token(request, "STAFF_TOKEN", "Appointment listing")
+    return await _appointment_page(cursor, limit, doctor_id=doctor_id, status=status)
+
+@app.get("/api/appointments")
+async def list_appointments(
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """List appointments in [start, end), oldest first"""
+    _require_token(request, "STAFF_TOKEN", "Appointment listing")
+    start = normalize_slot(start) if start else None
+    end = normalize_slot(end) if end else None
+    return await _appointment_page(cursor, limit, start=start, end=end, status=status)
+
+# Full-table export for reporting (needs EXPORT_TOKEN)
+@app.get("/api/export/{table}")
+async def export_table(
+    table: str,
+    request: Request,
+    format: str = "csv",
+    gzip: bool = False,
+    fetch_size: int = Query(5000, ge=100, le=100000),
+):
+    """Stream every row of patients or appointments as CSV or NDJSON"""
+    _require_token(request, "EXPORT_TOKEN", "Export")
+    try:
+        chunks = stream_export(db, table, format, fetch_size, compress=gzip)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Return response with detected symptoms and recommendations
-    return {
-        "message": f"Based on your symptoms, I've detected you may have: {', '.join(detected_symptoms)}. " +
-                  f"I recommend consulting with doctors in these departments: {', '.join(departments)}.",
-        "detected_symptoms": detected_symptoms,
-        "severity": "medium",
-        "recommended_departments": departments,
-        "initial_treatment": ["Rest and drink plenty of fluids. Take over-the-counter medication if needed."],
-        "available_doctors": doctors,
-        "action": "recommend_department"
-    }
+    filename = f"{table}.{format}" + (".gz" if gzip else "")
+    # Sync iterator: Starlette pulls each chunk in the thread pool
+    return StreamingResponse(
+        chunks,
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-# Appointment booking endpoint
-@app.post("/api/appointment/create")
-async def create_appointment(appointment: AppointmentRequest):
-    """Create a new appointment"""
-    # Parse date
+# Earliest free slots across a department
+@app.get("/api/availability/next")
+async def next_available(department: str, after: Optional[str] = None, k: int = Query(5, ge=1, le=50)):
+    """Return the k earliest free slots among all doctors of a department"""
     try:
-        appointment_date = appointment.appointment_date
+        start = normalize_slot(after) if after else utc_now()
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format")
     
-    # Create appointment
-    result = db.create_appointment({
-        "tc_number": appointment.tc_number,
-        "department": appointment.department,
-        "doctor_id": appointment.doctor_id,
-        "doctor_name": f"Dr. {appointment.doctor_id}", # In real app, get doctor name from doctor_id
-        "appointment_date": appointment_date,
-        "symptoms": "" # In real app, pass symptoms from chat
-    })
+    doctors = doctor_catalog.in_department(department)
+    if not doctors:
+        raise HTTPException(status_code=404, detail=f"No doctors found in department: {department}")
     
-    return result
+    slots = await single_flight.do(
+        # Keyed on the raw `after`: concurrent "from now" queries share one search
+        "availability", (department.lower(), after, k),
+        run_in_threadpool, find_next_available, department, after=start, k=k,
+    )
+    return {
+        "department": department,
+        "slots": [
+            {"doctor_id": doctor.id, "doctor_name": doctor.name, "appointment_date": slot.isoformat()}
+            for slot, doctor in slots
+        ]
+    }
+
+# Admission control: fast rejections with a retry hint
+@app.exception_handler(TooManyRequests)
+async def too_many_requests_handler(request: Request, exc: TooManyRequests):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.reason},
+        headers=retry_after_header(exc.retry_after),
+    )
+
+@app.exception_handler(SchedulerFull)
+async def scheduler_full_handler(request: Request, exc: SchedulerFull):
+    rate_limiter.reject(request.url.path, "overloaded")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers=retry_after_header(exc.retry_after),
+    )
+
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers=retry_after_header(db.breaker.reset_timeout),
+    )
 
 # Error handler
 @app.exception_handler(Exception)
@@ -180,6 +768,24 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": str(exc)},
     )
 
+# Serve the web client (registered last so it does not shadow the API routes).
+# Only these files: the working directory also holds data (var/, pris.db, .env)
+WEB_FILES = ("index.html", "script.js", "styles.css")
+
+
+def _web_file(name: str):
+    async def serve_file():
+        return FileResponse(name)
+    return serve_file
+
+
+for _name in WEB_FILES:
+    app.add_api_route(f"/{_name}", _web_file(_name), include_in_schema=False)
+app.mount("/logo", StaticFiles(directory="logo"), name="logo")
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # This copy of the module has already registered the worker hooks; start
+    # the server from a fresh interpreter so uvicorn's "main:app" is the only one
+    import sys
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+    os.execv(sys.executable, [sys.executable, server, *sys.argv[1:]])
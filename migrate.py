@@ -0,0 +1,33 @@
+"""
+Explicit schema migration step.
+
+Run once per deployment (not on every worker boot):
+
+    python migrate.py
+"""
+import sys
+from dotenv import load_dotenv
+
+from database import db
+
+
+def main():
+    load_dotenv()
+    db.connect()
+    if not db.pool:
+        print("Migration aborted: database is not reachable")
+        return 1
+
+    try:
+        db.create_tables(raise_errors=True)
+        print("Migration finished: tables are up to date")
+        return 0
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Table, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Table, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 from database.db_setup import Base
 from datetime import datetime
@@ -54,6 +54,11 @@ class Appointment(Base):
     patient = relationship("Patient", back_populates="appointments")
     doctor = relationship("Doctor", back_populates="appointments")
 
+    # RecommendationAgent müsaitlik sorgusu (doctor_id + tarih aralığı) için
+    __table_args__ = (
+        Index("ix_appointments_doctor_date", "doctor_id", "appointment_date"),
+    )
+
 
 class MedicalHistory(Base):
     __tablename__ = "medical_history"
@@ -92,11 +97,15 @@ class Doctor(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String)
-    department = Column(String)
+    department = Column(String, index=True)
     specialization = Column(String)
     email = Column(String, unique=True)
     phone = Column(String)
+    experience = Column(Integer, default=0)
+    rating = Column(Float, default=0.0)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow,
+                        onupdate=datetime.utcnow)
 
     # İlişkiler
     appointments = relationship("Appointment", back_populates="doctor")
@@ -0,0 +1,51 @@
+"""
+Keyset (cursor) pagination helpers for appointment listings.
+
+Pages are ordered by (appointment_date, id). The cursor is the key of the
+last row of the previous page, so the next page is fetched with
+`WHERE (appointment_date, id) > (:date, :id) ORDER BY appointment_date, id
+LIMIT :n`, which is an index range scan whatever the page depth. OFFSET
+would read and discard every earlier row instead.
+
+Cursors are opaque to clients: URL-safe base64 of the key.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(appointment_date, appointment_id) -> str:
+    if isinstance(appointment_date, datetime):
+        appointment_date = appointment_date.isoformat()
+    raw = json.dumps([appointment_date, appointment_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Return the (appointment_date, id) key of a cursor, or None for the first page"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        appointment_date, appointment_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(appointment_date), int(appointment_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid pagination cursor")
+
+
+def build_page(rows, limit: int):
+    """Split limit + 1 fetched rows into a page and the cursor of the next one"""
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(last["appointment_date"], last["id"])
@@ -0,0 +1,342 @@
+"""
+Opt-in request profiling: timing spans and sampled stack profiles.
+
+`span(name)` and the `timed(name)` decorator mark hot paths (diagnosis,
+doctor availability, every Database method, chat analysis). Outside a
+profiled request they cost one context variable lookup.
+
+A request is profiled when PROFILE_SAMPLE_RATE picks it, or when it
+carries `X-Profile: <PROFILE_TOKEN>`. While it runs, a sampler thread
+records the Python stack every PROFILE_INTERVAL_MS of the threads working
+for it: the event loop thread (idle samples dropped) and any thread inside
+one of its spans, e.g. a threadpool thread running a Database call. When
+the response starts the profile is written to
+PROFILE_DIR/<route>/<time>-<pid>.<format>:
+
+  speedscope  one sampled and one span timeline per thread, for
+              https://www.speedscope.app
+  collapsed   "frame;frame;frame count" lines for flamegraph.pl / speedscope
+
+Profiled responses also get a Server-Timing header with the span durations.
+Samples of the event loop thread can include other requests' coroutines.
+"""
+import contextvars
+import functools
+import hmac
+import inspect
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+FORMATS = {"speedscope": "speedscope.json", "collapsed": "collapsed.txt"}
+
+_current: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("profile", default=None)
+
+Frame = Tuple[str, str, int]
+
+# Spans kept per profile (a loop of timed calls must not grow it unbounded)
+MAX_SPANS = 10000
+
+
+class Profile:
+    def __init__(self, route: str, max_samples: int):
+        self.route = route
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.max_samples = max_samples
+        self.samples: List[Tuple[int, float, Tuple[Frame, ...]]] = []
+        self.spans: List[Tuple[int, str, float, float]] = []
+        self.threads: Counter = Counter()
+        self._context = None
+        self._lock = threading.Lock()
+
+    def enter(self, thread_id: int):
+        with self._lock:
+            self.threads[thread_id] += 1
+
+    def exit(self, thread_id: int):
+        with self._lock:
+            self.threads[thread_id] -= 1
+            if self.threads[thread_id] <= 0:
+                del self.threads[thread_id]
+
+    def add_span(self, thread_id: int, name: str, start: float, end: float):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append((thread_id, name, start - self.started, end - self.started))
+
+    def server_timing(self) -> str:
+        totals: Dict[str, float] = Counter()
+        for _, name, start, end in self.spans:
+            totals[name] += end - start
+        return ", ".join(f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)};dur={seconds * 1000:.1f}"
+                         for name, seconds in totals.items())
+
+
+class Sampler:
+    """Samples the stacks of the threads registered with the active profiles"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.profiles: List[Profile] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self.profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            if profile in self.profiles:
+                self.profiles.remove(profile)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                profiles = list(self.profiles)
+                if not profiles:
+                    self._wake.clear()
+            if not profiles:
+                self._wake.wait()
+                continue
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for profile in profiles:
+                if len(profile.samples) >= profile.max_samples:
+                    continue
+                for thread_id in list(profile.threads):
+                    frame = frames.get(thread_id)
+                    if frame is None or thread_id == own:
+                        continue
+                    stack = _stack(frame)
+                    if stack and not _idle(stack):
+                        profile.samples.append((thread_id, now - profile.started, stack))
+            del frames
+            time.sleep(self.interval)
+
+
+def _stack(frame) -> Tuple[Frame, ...]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()  # root first
+    return tuple(stack)
+
+
+def _idle(stack: Tuple[Frame, ...]) -> bool:
+    # The event loop waiting for I/O
+    return stack[-1][1].endswith("selectors.py")
+
+
+class Profiler:
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.token = ""
+        self.directory = os.path.join("var", "profiles")
+        self.format = "speedscope"
+        self.max_concurrent = 2
+        self.max_seconds = 30.0
+        self.sampler = Sampler()
+        self.profiled = 0
+        self.skipped = 0
+        self.written: List[str] = []
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def configure(self):
+        self.sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+        self.token = os.getenv("PROFILE_TOKEN", "")
+        self.directory = os.getenv("PROFILE_DIR", self.directory)
+        self.format = os.getenv("PROFILE_FORMAT", self.format)
+        if self.format not in FORMATS:
+            raise ValueError(f"PROFILE_FORMAT must be one of {', '.join(FORMATS)}")
+        self.max_concurrent = int(os.getenv("PROFILE_MAX_CONCURRENT", str(self.max_concurrent)))
+        self.max_seconds = float(os.getenv("PROFILE_MAX_SECONDS", str(self.max_seconds)))
+        self.sampler.interval = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+    def wanted(self, header: Optional[str]) -> bool:
+        """Whether to profile a request, from its X-Profile header and the sample rate"""
+        if header and self.token and hmac.compare_digest(header, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, route: str) -> Optional[Profile]:
+        """Profile the current thread and context until stop(); None when at the limit"""
+        with self._lock:
+            if self._active >= self.max_concurrent:
+                self.skipped += 1
+                return None
+            self._active += 1
+        max_samples = int(self.max_seconds / max(self.sampler.interval, 0.0005))
+        profile = Profile(route, max_samples)
+        profile.enter(threading.get_ident())
+        profile._context = _current.set(profile)
+        self.sampler.add(profile)
+        return profile
+
+    def stop(self, profile: Profile, route: Optional[str] = None):
+        self.sampler.remove(profile)
+        profile.duration = time.perf_counter() - profile.started
+        if route:
+            profile.route = route
+        _current.reset(profile._context)
+        with self._lock:
+            self._active -= 1
+            self.profiled += 1
+
+    def write(self, profile: Profile) -> str:
+        """Save a finished profile under PROFILE_DIR/<route>/"""
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", profile.route).strip("_") or "root"
+        directory = os.path.join(self.directory, slug)
+        os.makedirs(directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(profile.started_at))
+        path = os.path.join(directory, f"{stamp}-{int(profile.started_at * 1000) % 1000:03d}-{os.getpid()}."
+                                       f"{FORMATS[self.format]}")
+        with open(path, "w") as f:
+            if self.format == "speedscope":
+                json.dump(to_speedscope(profile, self.sampler.interval), f)
+            else:
+                f.write(to_collapsed(profile))
+        self.written = (self.written + [path])[-10:]
+        return path
+
+    def stats(self) -> Dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "header_enabled": bool(self.token),
+            "format": self.format,
+            "active": self._active,
+            "profiled": self.profiled,
+            "skipped": self.skipped,
+            "recent": list(self.written),
+        }
+
+
+@contextmanager
+def span(name: str):
+    """Time a block; in a profiled request also sample the thread running it"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    profile.enter(thread_id)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(thread_id, name, start, time.perf_counter())
+        profile.exit(thread_id)
+
+
+def timed(name: str) -> Callable:
+    """Decorator running a function (or coroutine function) inside span(name)"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return await func(*args, **kwargs)
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def to_collapsed(profile: Profile) -> str:
+    counts: Counter = Counter()
+    for thread_id, _, stack in profile.samples:
+        counts[";".join([f"thread-{thread_id}"] + [_frame_name(frame) for frame in stack])] += 1
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+
+def to_speedscope(profile: Profile, interval: float) -> Dict:
+    frames: List[Dict] = []
+    index: Dict[Frame, int] = {}
+
+    def frame_id(frame: Frame) -> int:
+        if frame not in index:
+            index[frame] = len(frames)
+            name, file, line = frame
+            frames.append({"name": name, "file": file, "line": line})
+        return index[frame]
+
+    end_ms = profile.duration * 1000
+    threads = sorted({t for t, _, _ in profile.samples} | {t for t, _, _, _ in profile.spans})
+    profiles = []
+    for thread_id in threads:
+        samples = [[frame_id(f) for f in stack] for t, _, stack in profile.samples if t == thread_id]
+        if samples:
+            profiles.append({
+                "type": "sampled", "name": f"{profile.route} thread {thread_id} samples",
+                "unit": "milliseconds", "startValue": 0, "endValue": end_ms,
+                "samples": samples, "weights": [interval * 1000] * len(samples),
+            })
+        spans = sorted(((start, -end, name) for t, name, start, end in profile.spans if t == thread_id))
+        if spans:
+            profiles.append({
+                "type": "evented", "name": f"{profile.route} thread {thread_id} spans",
+                "unit": "milliseconds", "startValue": 0, "endValue": end_ms,
+                "events": _span_events(spans, frame_id),
+            })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{profile.route} {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(profile.started_at))}",
+        "exporter": "profiling.py",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
+
+
+def _span_events(spans, frame_id) -> List[Dict]:
+    """Open/close events of properly nested spans (overlapping ones are dropped)"""
+    events = []
+    open_spans: List[Tuple[float, int]] = []
+    for start, neg_end, name in spans:
+        end = -neg_end
+        while open_spans and open_spans[-1][0] <= start:
+            close_at, frame = open_spans.pop()
+            events.append({"type": "C", "frame": frame, "at": close_at * 1000})
+        if open_spans and end > open_spans[-1][0]:
+            continue  # concurrent tasks on one thread: not a nested span
+        frame = frame_id((name, "span", 0))
+        events.append({"type": "O", "frame": frame, "at": start * 1000})
+        open_spans.append((end, frame))
+    while open_spans:
+        close_at, frame = open_spans.pop()
+        events.append({"type": "C", "frame": frame, "at": close_at * 1000})
+    return events
+
+
+def _frame_name(frame: Frame) -> str:
+    name, file, line = frame
+    return f"{name} ({os.path.basename(file)}:{line})"
+
+
+# One profiler per worker process
+profiler = Profiler()
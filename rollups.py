@@ -0,0 +1,193 @@
+"""
+Daily load rollups for the capacity dashboards.
+
+Two pre-aggregated tables answer /api/stats without scanning appointments:
+
+  appointment_rollups  (day, department, doctor_id, status) -> count
+  symptom_rollups      (day, department, symptom) -> count
+
+A booking counts on its appointment day. A symptom detected in the chat
+counts on the day of the message, under every department it maps to, once
+per chat session (only the message that first mentions it).
+
+Each worker counts in memory and adds its counts to the tables every
+ROLLUP_FLUSH_SECONDS and on shutdown, so bookings and chats never wait on
+the rollups; /api/stats lags by at most one flush interval. If a flush
+fails, the counts are kept for the next one.
+
+The tables can be recomputed from the appointments table (symptoms from
+the text recorded with each booking, as chat messages are not stored):
+
+    python rollups.py rebuild
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from chat import department_mapping, detect_symptoms
+from database import EXPORT_COLUMNS, db
+
+APPOINTMENTS = "appointment_rollups"
+SYMPTOMS = "symptom_rollups"
+# Longest range /api/stats reads at once (a bounded number of rollup rows)
+MAX_STATS_DAYS = 31
+
+
+def _day(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).date()
+    return date.today()
+
+
+class RollupAggregator:
+    def __init__(self):
+        self.flushes = 0
+        self.flush_failures = 0
+        self.last_flush: Optional[float] = None
+        self._write: Optional[Callable[[Dict], None]] = None
+        self._counts = {APPOINTMENTS: Counter(), SYMPTOMS: Counter()}
+        self._lock = threading.Lock()
+
+    def configure(self, write: Callable[[Dict], None]):
+        """write(counts) adds {table: {key: increment}} to the rollup tables"""
+        self._write = write
+
+    def record_appointment(self, department: str, doctor_id: str, appointment_date, status: str = "scheduled"):
+        key = (_day(appointment_date), department, str(doctor_id), status)
+        with self._lock:
+            self._counts[APPOINTMENTS][key] += 1
+
+    def record_status_change(self, department: str, doctor_id: str, appointment_date, old: str, new: str):
+        """Move a booking from one status to another (e.g. scheduled -> cancelled)"""
+        day = _day(appointment_date)
+        with self._lock:
+            self._counts[APPOINTMENTS][(day, department, str(doctor_id), old)] -= 1
+            self._counts[APPOINTMENTS][(day, department, str(doctor_id), new)] += 1
+
+    def record_symptoms(self, symptoms: Iterable[str], day=None):
+        day = _day(day)
+        with self._lock:
+            counts = self._counts[SYMPTOMS]
+            for symptom in symptoms:
+                for department in department_mapping.get(symptom, []):
+                    counts[(day, department, symptom)] += 1
+
+    def record_chat(self, response: Dict):
+        """Count the symptoms a chat response added (all of them without sessions)"""
+        session = response.get("session")
+        self.record_symptoms(session["new_symptoms"] if session else response.get("detected_symptoms", []))
+
+    def flush(self) -> int:
+        """Add the counts collected since the last flush to the rollup tables"""
+        with self._lock:
+            counts = {table: dict(c) for table, c in self._counts.items() if c}
+            self._counts = {APPOINTMENTS: Counter(), SYMPTOMS: Counter()}
+        if not counts or self._write is None:
+            self._restore(counts)
+            return 0
+        try:
+            self._write(counts)
+        except Exception:
+            self.flush_failures += 1
+            self._restore(counts)
+            raise
+        self.flushes += 1
+        self.last_flush = time.time()
+        return sum(len(c) for c in counts.values())
+
+    def stats(self) -> Dict:
+        return {
+            "pending_keys": {table: len(c) for table, c in self._counts.items()},
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "last_flush": self.last_flush,
+        }
+
+    def _restore(self, counts: Dict):
+        with self._lock:
+            for table, increments in counts.items():
+                self._counts[table].update(increments)
+
+
+def summarize(rows: Dict[str, List[tuple]]) -> Dict:
+    """/api/stats body from Database.fetch_rollups rows"""
+    departments: Dict[str, Dict] = {}
+
+    def department(name):
+        return departments.setdefault(name, {
+            "appointments": 0, "by_status": Counter(), "by_doctor": Counter(), "symptoms": Counter(),
+        })
+
+    days: Dict[str, int] = Counter()
+    for day, dept, doctor_id, status, count in rows[APPOINTMENTS]:
+        entry = department(dept)
+        entry["appointments"] += count
+        entry["by_status"][status] += count
+        entry["by_doctor"][doctor_id] += count
+        days[day.isoformat()] += count
+    for day, dept, symptom, count in rows[SYMPTOMS]:
+        department(dept)["symptoms"][symptom] += count
+
+    return {
+        "appointments": sum(days.values()),
+        "appointments_by_day": dict(sorted(days.items())),
+        "departments": {
+            name: {key: dict(value) if isinstance(value, Counter) else value for key, value in entry.items()}
+            for name, entry in sorted(departments.items())
+        },
+    }
+
+
+def rebuild(db) -> Dict[str, int]:
+    """Recompute the rollup tables from the appointments table"""
+    counts = {APPOINTMENTS: Counter(), SYMPTOMS: Counter()}
+    for row in db.export_rows("appointments"):
+        record = dict(zip(EXPORT_COLUMNS["appointments"], row))
+        counts[APPOINTMENTS][(_day(record["appointment_date"]), record["department"],
+                              str(record["doctor_id"]), record["status"] or "scheduled")] += 1
+        if record["symptoms"]:
+            day = _day(record["created_at"] or record["appointment_date"])
+            for symptom in detect_symptoms(record["symptoms"]):
+                for department in department_mapping.get(symptom, []):
+                    counts[SYMPTOMS][(day, department, symptom)] += 1
+    db.replace_rollups(counts)
+    return {table: len(c) for table, c in counts.items()}
+
+
+# One aggregator per worker process
+rollups = RollupAggregator()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily load rollups")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    load_dotenv()
+    db.connect()
+    if not db.pool:
+        print("Rebuild aborted: database is not reachable")
+        return 1
+    try:
+        keys = rebuild(db)
+        print(f"Rollups rebuilt: {keys[APPOINTMENTS]} appointment rows, {keys[SYMPTOMS]} symptom rows")
+        return 0
+    except Exception as e:
+        print(f"Rollup rebuild failed: {e}")
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Priority-aware admission for diagnosis and booking work.
+
+Requests are triaged high / medium / low with the DiagnosisAgent rules and
+wait in one queue per priority for a limited number of execution slots.
+When a slot frees up, the next request is picked by smooth weighted round
+robin over the non-empty queues (high 6 : medium 3 : low 1 by default), so
+urgent cases go first without shutting routine traffic out. A low-priority
+request that has waited longer than the aging threshold is promoted to the
+medium queue, which bounds how long it can starve under sustained load.
+
+A request that finds SCHEDULER_MAX_QUEUED requests already waiting (64 by
+default per worker, 0 turns shedding off) is shed at once (SchedulerFull,
+served as 503 with Retry-After) instead of queueing; high priority gets
+twice the room.
+
+One scheduler per worker process; like StreamSlots it is only touched from
+the event loop, so it needs no lock.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+PRIORITIES = ("high", "medium", "low")
+
+URGENT_KEYWORDS = ["severe", "emergency", "acute", "critical", "pain", "bleeding"]
+
+
+def determine_priority(symptoms: Dict) -> str:
+    """Triage level of a symptoms dict (DiagnosisAgent._determine_priority rules)"""
+    severity = symptoms.get("severity", "moderate").lower()
+
+    if severity == "severe" or any(keyword in str(symptoms).lower() for keyword in URGENT_KEYWORDS):
+        return "high"
+    elif severity == "moderate":
+        return "medium"
+    else:
+        return "low"
+
+
+def priority_for_text(text: Optional[str]) -> str:
+    """Triage level of free text such as a chat message"""
+    if not text:
+        return "medium"
+    lowered = text.lower()
+    severity = "mild" if any(word in lowered for word in ("mild", "slight", "minor")) else "moderate"
+    return determine_priority({"description": lowered, "severity": severity})
+
+
+class SchedulerFull(Exception):
+    def __init__(self, priority: str, retry_after: float = 1.0):
+        super().__init__("Server is busy, please retry")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("future", "enqueued_at", "priority")
+
+    def __init__(self, future: asyncio.Future, priority: str):
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.priority = priority
+
+
+class _Samples:
+    """Bounded window of latency samples in milliseconds"""
+
+    def __init__(self, size: int = 2048):
+        self.values = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.values.append(seconds * 1000)
+
+    def summary(self) -> Dict:
+        if not self.values:
+            return {"p50_ms": None, "p99_ms": None}
+        ordered = sorted(self.values)
+        # Nearest-rank percentiles
+        return {
+            "p50_ms": round(ordered[math.ceil(len(ordered) * 0.50) - 1], 2),
+            "p99_ms": round(ordered[math.ceil(len(ordered) * 0.99) - 1], 2),
+        }
+
+
+class PriorityScheduler:
+    def __init__(self, slots: int = 4, weights: Optional[Dict[str, int]] = None, aging_seconds: float = 5.0,
+                 max_queued: int = 0):
+        self.slots = slots
+        self.max_queued = max_queued
+        self.weights = weights or {"high": 6, "medium": 3, "low": 1}
+        self.aging_seconds = aging_seconds
+        self.active = 0
+        self._queues = {p: deque() for p in PRIORITIES}
+        self._credit = {p: 0 for p in PRIORITIES}
+        self._counts = {p: {"admitted": 0, "completed": 0, "promoted": 0, "shed": 0} for p in PRIORITIES}
+        self._wait = {p: _Samples() for p in PRIORITIES}
+        self._latency = {p: _Samples() for p in PRIORITIES}
+
+    def configure(self):
+        self.slots = int(os.getenv("SCHEDULER_SLOTS", str(self.slots)))
+        self.aging_seconds = float(os.getenv("SCHEDULER_AGING_SECONDS", str(self.aging_seconds)))
+        self.max_queued = int(os.getenv("SCHEDULER_MAX_QUEUED", str(self.max_queued)))
+        weights = os.getenv("SCHEDULER_WEIGHTS")  # e.g. "6,3,1"
+        if weights:
+            self.weights = dict(zip(PRIORITIES, (int(w) for w in weights.split(","))))
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "medium"):
+        """Hold one execution slot for the body of the `async with`"""
+        if priority not in self._queues:
+            priority = "medium"
+        began = time.monotonic()
+        await self._acquire(priority)
+        self._wait[priority].add(time.monotonic() - began)
+        try:
+            yield
+        finally:
+            self._latency[priority].add(time.monotonic() - began)
+            self._counts[priority]["completed"] += 1
+            self._release()
+
+    async def run(self, priority: str, func, *args, **kwargs):
+        """Run a coroutine function once a slot is granted"""
+        async with self.slot(priority):
+            return await func(*args, **kwargs)
+
+    async def _acquire(self, priority: str):
+        queued = sum(len(q) for q in self._queues.values())
+        if self.max_queued and queued >= self.max_queued * (2 if priority == "high" else 1):
+            self._counts[priority]["shed"] += 1
+            raise SchedulerFull(priority)
+
+        self._counts[priority]["admitted"] += 1
+        if self.active < self.slots and not queued:
+            self.active += 1
+            return
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority)
+        self._queues[priority].append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                queue = self._queues[waiter.priority]
+                if waiter in queue:
+                    queue.remove(waiter)
+            else:
+                # Granted just before the client went away: hand the slot on
+                self._release()
+            raise
+
+    def _release(self):
+        self.active -= 1
+        while self.active < self.slots:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue  # cancelled while queued
+            self.active += 1
+            waiter.future.set_result(None)
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        self._promote_aged()
+        ready = [p for p in PRIORITIES if self._queues[p]]
+        if not ready:
+            return None
+        # Smooth weighted round robin (as in nginx upstreams)
+        total = 0
+        for p in ready:
+            self._credit[p] += self.weights[p]
+            total += self.weights[p]
+        chosen = max(ready, key=lambda p: self._credit[p])
+        self._credit[chosen] -= total
+        return self._queues[chosen].popleft()
+
+    def _promote_aged(self):
+        # Aged low requests move up to medium only: the high queue is kept for
+        # cases that were triaged urgent, so aging can never slow those down.
+        now = time.monotonic()
+        queue = self._queues["low"]
+        while queue and now - queue[0].enqueued_at >= self.aging_seconds:
+            waiter = queue.popleft()
+            waiter.priority = "medium"
+            self._queues["medium"].append(waiter)
+            self._counts["low"]["promoted"] += 1
+
+    def stats(self) -> Dict:
+        return {
+            "slots": self.slots,
+            "active": self.active,
+            "aging_seconds": self.aging_seconds,
+            "max_queued": self.max_queued,
+            "weights": self.weights,
+            "priorities": {
+                p: {
+                    "queued": len(self._queues[p]),
+                    **self._counts[p],
+                    "wait": self._wait[p].summary(),
+                    "latency": self._latency[p].summary(),
+                }
+                for p in PRIORITIES
+            },
+        }
+
+
+# One scheduler per worker process
+scheduler = PriorityScheduler(max_queued=64)
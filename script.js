@@ -107,6 +107,7 @@ let selectedDoctor = null;
 let inactivityTimer = null;
 let currentAppointmentId = null;
 let detectedSymptoms = [];
+let availabilitySocket = null;
 
 // Event Listeners
 document.addEventListener('DOMContentLoaded', () => {
@@ -349,6 +350,16 @@ async function sendMessage() {
     // Show typing indicator
     addTypingIndicator();
     
+    // Stream the response when talking to the real API
+    if (!USE_MOCK_DATA) {
+        try {
+            await sendMessageStreaming(message);
+            return;
+        } catch (error) {
+            console.warn('Chat stream unavailable, falling back to /chat:', error);
+        }
+    }
+    
     // Process message with AI
     try {
         const response = await fetchWithMockFallback(`${API_URL}/chat`, {
@@ -363,31 +374,7 @@ async function sendMessage() {
         // Remove typing indicator
         removeTypingIndicator();
         
-        // Process response based on action
-        if (response.error) {
-            addMessage('There was an error processing your request. Please try again.', 'system');
-            return;
-        }
-        
-        // Add AI response
-        addMessage(response.message, 'system');
-        
-        // Save detected symptoms
-        if (response.detected_symptoms && response.detected_symptoms.length > 0) {
-            detectedSymptoms = response.detected_symptoms;
-        }
-        
-        // Handle different actions
-        switch (response.action) {
-            case 'ask_more':
-                // Just wait for user to provide more info
-                break;
-                
-            case 'recommend_department':
-                // Show department recommendations
-                recommendDepartments(response.recommended_departments, response.available_doctors);
-                break;
-        }
+        handleChatResponse(response);
     } catch (error) {
         console.error('Chat error:', error);
         removeTypingIndicator();
@@ -395,6 +382,118 @@ async function sendMessage() {
     }
 }
 
+// Send message over the streaming endpoint: symptoms arrive first,
+// then the generated assessment token by token
+async function sendMessageStreaming(message) {
+    let assessment = null;
+    let received = false;
+    
+    try {
+        await streamChat(message, (event, data) => {
+            received = true;
+            switch (event) {
+                case 'symptoms':
+                    removeTypingIndicator();
+                    handleChatResponse(data);
+                    break;
+                    
+                case 'token':
+                    if (!assessment) {
+                        assessment = addMessage('', 'system').querySelector('p');
+                    }
+                    assessment.textContent += data.text;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                    break;
+                    
+                case 'error':
+                    console.warn('Chat stream error:', data.detail);
+                    break;
+            }
+        });
+    } catch (error) {
+        // Only let the caller fall back if nothing was shown yet
+        if (!received) {
+            throw error;
+        }
+        console.error('Chat stream interrupted:', error);
+    }
+}
+
+// Read a Server-Sent Events stream from a POST request
+async function streamChat(message, onEvent) {
+    const response = await fetch(`${API_URL}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify({
+            tc_number: currentTcNumber,
+            message: message
+        })
+    });
+    
+    if (!response.ok || !response.body) {
+        throw new Error(`Chat stream failed with status ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            
+            onEvent(eventName, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
+// Render a chat analysis response
+function handleChatResponse(response) {
+    // Process response based on action
+    if (response.error) {
+        addMessage('There was an error processing your request. Please try again.', 'system');
+        return;
+    }
+    
+    // Add AI response
+    addMessage(response.message, 'system');
+    
+    // Save detected symptoms
+    if (response.detected_symptoms && response.detected_symptoms.length > 0) {
+        detectedSymptoms = response.detected_symptoms;
+    }
+    
+    // Handle different actions
+    switch (response.action) {
+        case 'ask_more':
+            // Just wait for user to provide more info
+            break;
+            
+        case 'recommend_department':
+            // Show department recommendations
+            recommendDepartments(response.recommended_departments, response.available_doctors);
+            break;
+    }
+}
+
 // Recommend departments
 function recommendDepartments(departments, doctors) {
     // Create department buttons
@@ -443,7 +542,7 @@ function showDoctorsForDepartment(department, allDoctors) {
     
     // Create doctor buttons
     const doctorButtons = departmentDoctors.map((doctor, index) => {
-        return `<button class="doctor-button" data-id="${index}" data-name="${doctor.name}" aria-label="Select doctor ${doctor.name}">${doctor.name}</button>`;
+        return `<button class="doctor-button" data-id="${doctor.id ?? index}" data-name="${doctor.name}" aria-label="Select doctor ${doctor.name}">${doctor.name}</button>`;
     }).join('');
     
     // Add clickable doctor buttons
@@ -567,9 +666,13 @@ function showTimeSelection(date) {
     timeContainer.innerHTML = timeButtons;
     chatMessages.appendChild(timeContainer);
     
+    // Grey out slots as other patients book them
+    watchAvailability(selectedDoctor ? selectedDoctor.id : null, timeContainer);
+    
     // Add event listeners to time buttons
     timeContainer.querySelectorAll('.time-button').forEach(button => {
         button.addEventListener('click', () => {
+            stopWatchingAvailability();
             const selectedTimeIso = button.dataset.time;
             const selectedTimeObj = new Date(selectedTimeIso);
             
@@ -591,6 +694,48 @@ function showTimeSelection(date) {
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
+// Live slot updates for the open time list (taken slots are disabled)
+function watchAvailability(doctorId, timeContainer) {
+    stopWatchingAvailability();
+    if (USE_MOCK_DATA || !doctorId || !('WebSocket' in window)) {
+        return;
+    }
+    
+    // Slot keys are UTC without milliseconds, e.g. 2024-05-02T09:00:00
+    const setTaken = (slot, taken) => {
+        timeContainer.querySelectorAll('.time-button').forEach(button => {
+            if (button.dataset.time.slice(0, 19) === slot) {
+                button.disabled = taken;
+            }
+        });
+    };
+    
+    const wsUrl = API_URL.replace(/^http/, 'ws').replace(/\/api$/, '');
+    const socket = new WebSocket(`${wsUrl}/ws/availability?doctor_id=${encodeURIComponent(doctorId)}`);
+    socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type === 'snapshot') {
+            timeContainer.querySelectorAll('.time-button').forEach(button => { button.disabled = false; });
+            event.taken.forEach(slot => setTaken(slot, true));
+        } else if (event.type === 'taken' || event.type === 'released') {
+            setTaken(event.slot, event.type === 'taken');
+        } else if (event.type === 'resync') {
+            // Updates were missed: reconnect for a fresh snapshot
+            watchAvailability(doctorId, timeContainer);
+        }
+    };
+    socket.onerror = () => console.warn('Live availability unavailable');
+    availabilitySocket = socket;
+}
+
+function stopWatchingAvailability() {
+    if (availabilitySocket) {
+        availabilitySocket.onmessage = null;
+        availabilitySocket.close();
+        availabilitySocket = null;
+    }
+}
+
 // Confirm appointment
 function confirmAppointment() {
     const appointmentDate = new Date(selectedDate);
@@ -640,9 +785,11 @@ async function bookAppointment() {
         addMessage('Booking your appointment...', 'system');
         
         // Book the appointment
+        // One key per booking: a retried request cannot book twice
+        const idempotencyKey = window.crypto && crypto.randomUUID ? crypto.randomUUID().replace(/-/g, '') : `${Date.now()}${Math.random().toString(16).slice(2)}`;
         const response = await fetchWithMockFallback(`${API_URL}/appointment/create`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: { 'Content-Type': 'application/json', 'Idempotency-Key': idempotencyKey },
             body: JSON.stringify({
                 tc_number: currentTcNumber,
                 department: selectedDepartment,
@@ -657,7 +804,7 @@ async function bookAppointment() {
                 <div class="appointment-success">
                     <h3>Appointment Booked Successfully!</h3>
                     <p>Your appointment has been confirmed with ${selectedDoctor.name} on ${formatDate(new Date(selectedDate))} at ${formatTime(new Date(selectedDate))}.</p>
-                    <p>Appointment ID: ${response.appointment_id}</p>
+                    <p>${response.status === 'pending' ? `Booking reference: ${response.idempotency_key} (being confirmed)` : `Appointment ID: ${response.appointment_id}`}</p>
                     <p>Please arrive 15 minutes before your appointment time.</p>
                 </div>
             `, 'system');
@@ -693,6 +840,8 @@ function addMessage(message, sender = 'system') {
     
     // Scroll to bottom
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    return messageElement;
 }
 
 // Add typing indicator
@@ -0,0 +1,30 @@
+"""
+Production launcher: `python server.py` (or `python main.py`, which execs it).
+
+uvicorn imports the application from the "main:app" string in every
+worker. Starting it from this module rather than from main.py keeps
+main.py from also running as __main__ (or __mp_main__ in spawned workers),
+which would register every startup and shutdown hook on the worker twice.
+"""
+import os
+
+from dotenv import load_dotenv
+
+from lifecycle import serve
+
+
+def run():
+    load_dotenv()
+    # Workers are separate processes, so uvicorn needs the import string
+    serve(
+        "main:app",
+        drain_delay=float(os.getenv("DRAIN_DELAY_SECONDS", "5")),
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", "30")),
+    )
+
+
+if __name__ == "__main__":
+    run()
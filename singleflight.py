@@ -0,0 +1,55 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+
+While a call for a key is running, further calls with the same key do not
+start their own: they wait for the running one and get its result (or its
+exception). Used for bursts of identical requests - the same patient lookup
+fired several times at login, kiosk retries of the same chat message, the
+same availability query - so they cost one database or model call.
+
+Only in-flight calls are shared; nothing is cached after the call returns.
+The call runs in its own task, so a caller that goes away (client
+disconnect) does not cancel it for the others.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "executions": 0, "coalesced": 0})
+
+    async def do(self, group: str, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs):
+        """Await func(*args, **kwargs), sharing the call with identical in-flight ones"""
+        counts = self._counts[group]
+        counts["calls"] += 1
+        flight_key = (group, key)
+        task = self._in_flight.get(flight_key)
+        if task is None:
+            counts["executions"] += 1
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(flight_key, None))
+        else:
+            counts["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        groups = {}
+        for group, counts in self._counts.items():
+            groups[group] = {
+                **counts,
+                "in_flight": sum(1 for g, _ in self._in_flight if g == group),
+            }
+        return groups
+
+
+def normalize_text(text: str) -> str:
+    """Key for free text: case and whitespace differences do not matter"""
+    return " ".join(text.lower().split())
+
+
+# One coalescer per worker process
+single_flight = SingleFlight()
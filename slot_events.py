@@ -0,0 +1,245 @@
+"""
+Appointment slot change events ("taken" / "released"), pushed to every worker.
+
+Producers
+  PostgreSQL  a trigger on appointments (Database.create_tables) sends
+              NOTIFY slot_changes on every booking, status change and delete,
+              so an event is sent exactly when the change commits
+  mock mode   Database publishes the same events in process
+
+Every worker LISTENs on a dedicated connection (a thread that reconnects
+with backoff) and hands each event to its subscribers: the slot index and
+the availability cache are updated for that one doctor, and the WebSocket
+hub pushes the delta to the clients watching the doctor or department.
+Notifications sent while the listener is disconnected are lost, so after
+every connect the subscribers resync (reload the slot index, drop the caches,
+tell clients to refetch) - the first one too, since the slot index is loaded
+before the listener starts.
+
+LISTEN needs a session-level connection: behind PgBouncer in transaction
+mode (or Neon's pooled endpoint) set SLOT_EVENTS_DATABASE_URL to the
+direct endpoint. The listener only counts as connected once a NOTIFY it
+sends itself comes back; until then the slot index keeps being reloaded
+periodically.
+
+Event: {"type": "taken" | "released", "doctor_id": str, "department": str,
+        "slot": ISO datetime, "appointment_id": int}
+"""
+import asyncio
+import json
+import random
+import select
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from availability import normalize_slot
+
+CHANNEL = "slot_changes"
+PROBE_TIMEOUT = 5.0
+
+
+def slot_event(kind: str, appointment: Dict) -> Dict:
+    """Event for an appointment row (mock mode; the trigger builds the same JSON)"""
+    return {
+        "type": kind,
+        "doctor_id": str(appointment["doctor_id"]),
+        "department": appointment["department"],
+        "slot": normalize_slot(appointment["appointment_date"]).isoformat(),
+        "appointment_id": appointment.get("id"),
+    }
+
+
+class SlotEventBus:
+    def __init__(self):
+        self.mode = "off"  # off | local | postgres
+        self.connected = False
+        self.published = 0
+        self.received = 0
+        self.reconnects = 0
+        self.errors = 0
+        self.reconnect_max_delay = 60.0
+        self._subscribers: List[Callable[[Dict], None]] = []
+        self._resync: List[Callable[[], None]] = []
+        self._closing = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def live(self) -> bool:
+        """Whether slot changes currently reach this worker as events"""
+        return self.mode == "local" or self.connected
+
+    def subscribe(self, callback: Callable[[Dict], None], resync: Optional[Callable[[], None]] = None):
+        self._subscribers.append(callback)
+        if resync is not None:
+            self._resync.append(resync)
+
+    def start_local(self):
+        """In-process delivery only (mock mode: the data lives in this process)"""
+        self.mode = "local"
+
+    def start_postgres(self, dsn: str):
+        self.mode = "postgres"
+        self._closing.clear()
+        self._thread = threading.Thread(target=self._listen, args=(dsn,), name="slot-events", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._closing.set()
+
+    def publish(self, event: Dict):
+        """Deliver an event to this worker's subscribers (mock mode)"""
+        if self.mode != "local":
+            return
+        self.published += 1
+        self._dispatch(event)
+
+    def stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "connected": self.connected,
+            "published": self.published,
+            "received": self.received,
+            "reconnects": self.reconnects,
+            "errors": self.errors,
+        }
+
+    def _dispatch(self, event: Dict):
+        self.received += 1
+        for callback in list(self._subscribers):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Slot event subscriber failed: {e}")
+
+    def _run_resync(self):
+        for resync in list(self._resync):
+            try:
+                resync()
+            except Exception as e:
+                print(f"Slot event resync failed: {e}")
+
+    def _listen(self, dsn: str):
+        delay = 1.0
+        first = True
+        while not self._closing.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(dsn, connect_timeout=5,
+                                        keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {CHANNEL}")
+                cursor.close()
+                if not self._probe(conn):
+                    raise RuntimeError("LISTEN does not receive notifications (transaction pooler?)")
+                self.connected = True
+                delay = 1.0
+                print(f"Listening for slot changes on '{CHANNEL}'")
+                if not first:
+                    self.reconnects += 1
+                first = False
+                # Changes made before LISTEN (or while disconnected) were not notified
+                self._run_resync()
+
+                while not self._closing.is_set():
+                    # Wake up regularly to notice close()
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            event = json.loads(notify.payload)
+                        except ValueError:
+                            self.errors += 1
+                            continue
+                        if event.get("type") != "probe":
+                            self._dispatch(event)
+            except Exception as e:
+                self.errors += 1
+                print(f"Slot event listener error, reconnecting: {e}")
+            finally:
+                self.connected = False
+                if conn is not None:
+                    conn.close()
+            self._closing.wait(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self.reconnect_max_delay)
+
+    def _probe(self, conn) -> bool:
+        """NOTIFY ourselves and wait for it: a pooler may run LISTEN on a backend we never hear from"""
+        token = uuid.uuid4().hex
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, json.dumps({"type": "probe", "token": token})))
+        cursor.close()
+        deadline = time.monotonic() + PROBE_TIMEOUT
+        while True:
+            conn.poll()
+            for notify in conn.notifies:
+                if token in notify.payload:
+                    # Real events that arrived with the probe are kept for the main loop
+                    conn.notifies[:] = [n for n in conn.notifies if n is not notify]
+                    return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            select.select([conn], [], [], remaining)
+
+
+class SlotHub:
+    """Fans slot events out to the WebSocket clients of this worker"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.sent = 0
+        self.overflows = 0
+        self._clients: Dict[asyncio.Queue, Tuple[Optional[str], Optional[str]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def register(self, department: Optional[str] = None, doctor_id: Optional[str] = None) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._clients[queue] = (department.lower() if department else None, doctor_id)
+        return queue
+
+    def unregister(self, queue: asyncio.Queue):
+        self._clients.pop(queue, None)
+
+    def publish(self, event: Dict):
+        """Called from any thread"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fan_out, event)
+
+    def resync(self):
+        self.publish({"type": "resync"})
+
+    def _fan_out(self, event: Dict):
+        department = (event.get("department") or "").lower()
+        for queue, (want_department, want_doctor) in list(self._clients.items()):
+            if event["type"] != "resync":
+                if want_department and want_department != department:
+                    continue
+                if want_doctor and want_doctor != event.get("doctor_id"):
+                    continue
+            try:
+                queue.put_nowait(event)
+                self.sent += 1
+            except asyncio.QueueFull:
+                # A slow client: drop its backlog and have it refetch
+                self.overflows += 1
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    def stats(self) -> Dict:
+        return {"clients": len(self._clients), "sent": self.sent, "overflows": self.overflows}
+
+
+# One bus and one hub per worker process
+bus = SlotEventBus()
+hub = SlotHub()
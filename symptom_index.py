@@ -0,0 +1,176 @@
+"""
+Semantic symptom matching.
+
+A curated symptom vocabulary (the chat keyword table plus paraphrases) is
+embedded once with a sentence-embedding model. The unit-normalised vectors
+are stored as a .npy file and memory-mapped by every worker, so workers
+share the pages instead of each holding a copy. Nearest-neighbour queries
+go through an HNSW index (hnswlib) for large vocabularies, or a single
+BLAS matrix-vector product when the vocabulary is small.
+
+Enable with SYMPTOM_MATCHER=semantic; the keyword matcher stays the default.
+Build the cache ahead of deployment with:
+
+    python symptom_index.py build
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from typing import List, Tuple
+
+from chat import symptom_keywords
+
+# Paraphrases the keyword table misses, per canonical symptom
+SYMPTOM_PARAPHRASES = {
+    "headache": ["my head hurts", "pounding head", "pressure in my head", "throbbing temples"],
+    "stomach pain": ["my tummy hurts", "cramps in my gut", "throwing up", "feel like vomiting", "upset stomach"],
+    "fever": ["high temperature", "burning up", "chills and sweating", "feel feverish"],
+    "cough": ["coughing a lot", "sore throat", "scratchy throat", "coughing up mucus"],
+    "back pain": ["my lower back hurts", "pain in my spine", "stiff back"],
+    "joint pain": ["my knees ache", "swollen joints", "aching elbows", "painful wrists"],
+    "eye pain": ["blurry vision", "my eyes hurt", "can't see clearly", "red sore eyes"],
+    "skin rash": ["red spots on my skin", "itchy bumps", "hives", "skin is peeling"],
+    "dizziness": ["room is spinning", "feel lightheaded", "about to faint", "unsteady on my feet"],
+    "breathing difficulty": ["can't breathe", "short of breath", "out of breath", "wheezing", "chest feels tight"],
+}
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Above this many phrases an HNSW index beats brute force
+HNSW_MIN_VOCABULARY = 5000
+
+_CLAUSE_SPLIT = re.compile(r"[.,;!?]+|\band\b|\bbut\b|\balso\b")
+
+
+def build_vocabulary() -> List[Tuple[str, str]]:
+    """Return (phrase, symptom) pairs from the keyword table and the paraphrases"""
+    vocabulary = []
+    for symptom, keywords in symptom_keywords.items():
+        vocabulary.append((symptom, symptom))
+        vocabulary.extend((keyword, symptom) for keyword in keywords)
+        vocabulary.extend((phrase, symptom) for phrase in SYMPTOM_PARAPHRASES.get(symptom, []))
+    return vocabulary
+
+
+class SymptomIndex:
+    def __init__(self, model_name: str = None, cache_dir: str = None, threshold: float = None):
+        self.model_name = model_name or os.getenv("SYMPTOM_EMBEDDING_MODEL", DEFAULT_MODEL)
+        self.cache_dir = cache_dir or os.getenv("SYMPTOM_INDEX_DIR", os.path.join(".model_cache", "symptoms"))
+        self.threshold = threshold if threshold is not None else float(os.getenv("SYMPTOM_MATCH_THRESHOLD", "0.6"))
+        self.vocabulary = build_vocabulary()
+        self.labels = [symptom for _, symptom in self.vocabulary]
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        self.vectors = None
+        self.hnsw = None
+
+    @property
+    def encoder(self):
+        with self._encoder_lock:
+            if self._encoder is None:
+                from sentence_transformers import SentenceTransformer
+                self._encoder = SentenceTransformer(self.model_name, device="cpu")
+            return self._encoder
+
+    def _embed(self, texts: List[str]):
+        import numpy as np
+        vectors = self.encoder.encode(texts, batch_size=64, normalize_embeddings=True)
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    def _cache_key(self) -> str:
+        digest = hashlib.sha1(json.dumps([self.model_name, self.vocabulary]).encode()).hexdigest()
+        return digest[:16]
+
+    def load(self):
+        """Memory-map the cached vectors, embedding the vocabulary first if needed"""
+        import numpy as np
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        vectors_path = os.path.join(self.cache_dir, f"vectors-{self._cache_key()}.npy")
+        if not os.path.exists(vectors_path):
+            vectors = self._embed([phrase for phrase, _ in self.vocabulary])
+            # Write then rename so concurrent workers never map a partial file
+            tmp_path = f"{vectors_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, vectors)
+            os.replace(tmp_path, vectors_path)
+
+        self.vectors = np.load(vectors_path, mmap_mode="r")
+        if len(self.labels) >= HNSW_MIN_VOCABULARY:
+            self.hnsw = self._load_hnsw(vectors_path)
+        return self
+
+    def _load_hnsw(self, vectors_path: str):
+        try:
+            import hnswlib
+        except ImportError:
+            print("hnswlib not installed, using brute-force symptom search")
+            return None
+
+        dim = self.vectors.shape[1]
+        index = hnswlib.Index(space="ip", dim=dim)
+        index_path = vectors_path.replace(".npy", ".hnsw")
+        if os.path.exists(index_path):
+            index.load_index(index_path, max_elements=len(self.labels))
+        else:
+            index.init_index(max_elements=len(self.labels), ef_construction=200, M=16)
+            index.add_items(self.vectors, list(range(len(self.labels))))
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            index.save_index(tmp_path)
+            os.replace(tmp_path, index_path)
+        index.set_ef(64)
+        return index
+
+    def _neighbors(self, queries, k: int) -> Tuple[List[List[int]], List[List[float]]]:
+        import numpy as np
+
+        if self.hnsw is not None:
+            ids, distances = self.hnsw.knn_query(queries, k=k)
+            # Inner-product space returns 1 - similarity
+            return ids.tolist(), (1.0 - distances).tolist()
+
+        scores = queries @ self.vectors.T
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        return top.tolist(), np.take_along_axis(scores, top, axis=1).tolist()
+
+    def match(self, message: str, k: int = 3) -> List[str]:
+        """Return the symptoms whose vocabulary phrases are close to any clause of the message"""
+        if self.vectors is None:
+            self.load()
+
+        clauses = [c.strip() for c in _CLAUSE_SPLIT.split(message.lower()) if c and c.strip()]
+        if not clauses:
+            return []
+
+        detected = []
+        ids, scores = self._neighbors(self._embed(clauses), k)
+        for row_ids, row_scores in zip(ids, scores):
+            for idx, score in zip(row_ids, row_scores):
+                if score >= self.threshold and self.labels[idx] not in detected:
+                    detected.append(self.labels[idx])
+        return detected
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SymptomIndex:
+    """Return this worker's symptom index, loading it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SymptomIndex().load()
+        return _index
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        print("usage: python symptom_index.py build")
+        sys.exit(2)
+    index = SymptomIndex().load()
+    print(f"Symptom index ready: {len(index.labels)} phrases, dim {index.vectors.shape[1]}, "
+          f"{'hnsw' if index.hnsw is not None else 'brute force'} search, cache {index.cache_dir}")
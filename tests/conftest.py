@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """The application on mock data, with its lifespan (warm-up and drain) running"""
+    from fastapi.testclient import TestClient
+
+    import main
+
+    monkeypatch.setenv("DATABASE_URL", "")
+    monkeypatch.setenv("CHAT_SESSION_DB", str(tmp_path / "sessions.db"))
+    monkeypatch.setenv("BOOKING_OUTBOX_DB", str(tmp_path / "outbox.db"))
+    with TestClient(main.app) as client:
+        yield client
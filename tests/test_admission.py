@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import admission
+from admission import LocalBuckets, RateLimiter, TooManyRequests, parse_limit, retry_after_header
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission, "time", SimpleNamespace(monotonic=clock.monotonic, time=clock.monotonic))
+    return clock
+
+
+def test_parse_limit():
+    assert parse_limit("30/60") == (30, 0.5)
+    assert parse_limit("5") == (5, 5)
+    assert parse_limit("0") is None
+    assert parse_limit("") is None
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    buckets = LocalBuckets()
+    assert [buckets.take("k", 3, 0.5) for _ in range(3)] == [0, 0, 0]
+    # Empty: the next token is due in 1 / rate seconds
+    assert buckets.take("k", 3, 0.5) == pytest.approx(2)
+    clock.now += 1
+    assert buckets.take("k", 3, 0.5) == pytest.approx(1)
+    clock.now += 1
+    assert buckets.take("k", 3, 0.5) == 0
+    # Other keys have their own bucket
+    assert buckets.take("other", 3, 0.5) == 0
+
+
+def test_bucket_never_holds_more_than_the_burst(clock):
+    buckets = LocalBuckets()
+    buckets.take("k", 2, 1)
+    clock.now += 3600
+    assert [buckets.take("k", 2, 1) for _ in range(3)] == [0, 0, pytest.approx(1)]
+
+
+def test_full_table_drops_refilled_buckets(clock):
+    buckets = LocalBuckets(max_keys=2)
+    buckets.take("a", 2, 1)
+    clock.now += 1
+    buckets.take("b", 2, 1)
+    clock.now += 1.5
+    # "a" has refilled and is forgotten; "b" still owes half a token
+    buckets.take("c", 2, 1)
+    assert set(buckets._buckets) == {"b", "c"}
+
+
+def test_limiter_rejects_per_patient_and_per_ip(clock):
+    limiter = RateLimiter()
+    limiter.limits = {"patient": parse_limit("1/10"), "ip": parse_limit("2/10")}
+
+    async def check(tc_number, ip):
+        await limiter.check("/api/chat", tc_number, ip)
+
+    asyncio.run(check("11111111111", "10.0.0.1"))
+    with pytest.raises(TooManyRequests) as rejected:
+        asyncio.run(check("11111111111", "10.0.0.2"))
+    assert rejected.value.reason == "Too many requests for this patient"
+    assert rejected.value.retry_after == pytest.approx(10)
+
+    asyncio.run(check("22222222222", "10.0.0.1"))
+    with pytest.raises(TooManyRequests, match="for this ip"):
+        asyncio.run(check("33333333333", "10.0.0.1"))
+    assert limiter.stats()["rejected"] == {"/api/chat": {"rate_limit_patient": 1, "rate_limit_ip": 1}}
+
+
+def test_limiter_lets_requests_through_when_off_or_when_its_backend_fails(clock):
+    limiter = RateLimiter()
+    limiter.limits = {"patient": None, "ip": parse_limit("1/10")}
+
+    class Broken:
+        is_async = False
+
+        def take(self, key, burst, rate):
+            raise ConnectionError("redis down")
+
+    for _ in range(3):
+        asyncio.run(limiter.check("/api/chat", "11111111111", None))
+    limiter.backend = Broken()
+    for _ in range(3):
+        asyncio.run(limiter.check("/api/chat", "11111111111", "10.0.0.1"))
+    assert limiter.backend_errors == 3
+
+
+def test_retry_after_is_a_whole_number_of_seconds():
+    assert retry_after_header(0.2) == {"Retry-After": "1"}
+    assert retry_after_header(2.5) == {"Retry-After": "3"}
@@ -0,0 +1,19 @@
+import pytest
+
+PATHS = ["/api/appointments", "/api/appointments/patient/12345678901", "/api/appointments/doctor/1"]
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_listings_are_off_without_a_staff_token(client, monkeypatch, path):
+    monkeypatch.delenv("STAFF_TOKEN", raising=False)
+    assert client.get(path).status_code == 404
+
+
+@pytest.mark.parametrize("path", PATHS)
+def test_listings_need_the_staff_token(client, monkeypatch, path):
+    monkeypatch.setenv("STAFF_TOKEN", "secret")
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 403
+    response = client.get(path, headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "next_cursor" in response.json()
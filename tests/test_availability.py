@@ -0,0 +1,113 @@
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from availability import WORK_HOURS, AvailabilityCache, SlotIndex, iter_schedule, utc_now
+
+SLOT = datetime(2027, 3, 1, 10)
+
+
+def event(kind, doctor_id="7", slot="2027-03-01T10:00:00"):
+    return {"type": kind, "doctor_id": doctor_id, "department": "Neurology", "slot": slot, "appointment_id": 1}
+
+
+def test_slot_index_applies_taken_and_released_events():
+    index = SlotIndex()
+    index.apply(event("taken"))
+    assert index.is_taken(7, SLOT)
+    assert not index.is_taken(8, SLOT)
+
+    index.apply(event("released"))
+    assert not index.is_taken("7", SLOT)
+
+
+def test_slot_index_normalizes_event_slots():
+    index = SlotIndex()
+    # Seconds are dropped and offsets converted to UTC, like the booking path
+    index.apply(event("taken", slot="2027-03-01T13:00:30+03:00"))
+    assert index.is_taken("7", SLOT)
+
+
+def test_slot_index_ignores_unknown_events_and_releases():
+    index = SlotIndex()
+    index.apply(event("released"))
+    index.apply({"type": "resync"})
+    assert index.taken_slots("7", SLOT) == []
+
+
+def test_cache_returns_computed_value_until_invalidated():
+    cache = AvailabilityCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [SLOT]
+
+    assert cache.get(7, SLOT, compute) == [SLOT]
+    assert cache.get("7", SLOT, compute) == [SLOT]
+    assert len(calls) == 1
+
+    cache.invalidate(8)
+    cache.get(7, SLOT, compute)
+    assert len(calls) == 1
+
+    cache.invalidate(7)
+    cache.get(7, SLOT, compute)
+    assert len(calls) == 2
+
+
+def test_cache_drops_a_value_invalidated_while_it_was_computed():
+    cache = AvailabilityCache()
+    computing = threading.Event()
+    invalidated = threading.Event()
+
+    def slow_compute():
+        computing.set()
+        invalidated.wait(5)
+        return ["stale"]
+
+    result = []
+    reader = threading.Thread(target=lambda: result.append(cache.get(7, SLOT, slow_compute)))
+    reader.start()
+    computing.wait(5)
+    cache.invalidate(7)
+    invalidated.set()
+    reader.join(5)
+
+    # The caller still gets its answer, but it is not kept for the next one
+    assert result == [["stale"]]
+    assert cache.get(7, SLOT, lambda: ["fresh"]) == ["fresh"]
+
+
+def test_cache_clear_also_drops_values_being_computed():
+    cache = AvailabilityCache()
+
+    def compute():
+        cache.clear()
+        return ["stale"]
+
+    cache.get(7, SLOT, compute)
+    assert cache.get(7, SLOT, lambda: ["fresh"]) == ["fresh"]
+
+
+def test_schedule_follows_clinic_working_hours_in_utc(monkeypatch):
+    monkeypatch.setenv("CLINIC_TIMEZONE", "Europe/Istanbul")  # UTC+3
+    slots = list(iter_schedule(datetime(2027, 3, 1, 7, 30), datetime(2027, 3, 2, 7)))
+    # 11:00-16:00 Istanbul on the first day, then 09:00 the next morning
+    assert slots[0] == datetime(2027, 3, 1, 8)
+    assert slots[-2:] == [datetime(2027, 3, 1, 13), datetime(2027, 3, 2, 6)]
+
+
+def test_search_defaults_to_the_current_utc_time(monkeypatch):
+    monkeypatch.setenv("CLINIC_TIMEZONE", "UTC")
+    doctor = SimpleNamespace(id="7")
+    [(slot, _)] = SlotIndex().next_available([doctor])
+    assert utc_now() <= slot <= utc_now() + timedelta(days=3)
+    assert slot.hour in WORK_HOURS and slot.minute == 0
+
+
+def test_next_available_endpoint_validates_k(client):
+    assert client.get("/api/availability/next", params={"department": "Cardiology", "k": 0}).status_code == 422
+    assert client.get("/api/availability/next", params={"department": "Cardiology", "k": 51}).status_code == 422
+    slots = client.get("/api/availability/next", params={"department": "Cardiology", "k": 3}).json()["slots"]
+    assert len(slots) == 3
@@ -0,0 +1,141 @@
+import pytest
+
+from booking_outbox import BookingOutbox, IdempotencyConflict, SlotTaken
+from database import Database
+
+TC_NUMBER = "12345678901"  # a patient of the mock data
+
+
+def booking(hour=10, tc_number=TC_NUMBER, doctor_id="1"):
+    return {
+        "tc_number": tc_number, "department": "Cardiology", "doctor_id": doctor_id,
+        "doctor_name": "Dr. Emma Wilson", "appointment_date": f"2027-03-01T{hour:02d}:00:00", "symptoms": "",
+    }
+
+
+@pytest.fixture
+def db():
+    database = Database()
+    database.mock_mode = True
+    database.init_mock_data()
+    return database
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch, db):
+    monkeypatch.setenv("BOOKING_MODE", "outbox")
+    monkeypatch.setenv("BOOKING_OUTBOX_DB", str(tmp_path / "outbox.db"))
+    box = BookingOutbox()
+    box.configure(db.create_appointments, transient=(ConnectionError,))
+    yield box
+    box.close()
+
+
+def make_due(box):
+    """Skip the retry backoff"""
+    box._db.execute("UPDATE booking_outbox SET next_attempt_at = 0")
+
+
+def test_flush_confirms_pending_bookings(outbox, db):
+    status, created = outbox.submit("k1", booking())
+    assert created and status["status"] == "pending"
+
+    assert outbox.flush() == 1
+    status = outbox.status("k1", TC_NUMBER)
+    assert status["status"] == "confirmed"
+    assert status["appointment_id"] == db.mock_appointments[-1]["id"]
+
+
+def test_retried_key_returns_the_original_booking(outbox, db):
+    outbox.submit("k1", booking())
+    outbox.flush()
+
+    status, created = outbox.submit("k1", booking())
+    assert not created
+    assert status["status"] == "confirmed"
+    assert len(db.mock_appointments) == 1
+
+
+@pytest.mark.parametrize("other", [
+    booking(tc_number="98765432109"),
+    booking(doctor_id="2"),
+    booking(hour=11),
+])
+def test_key_reused_for_another_booking_conflicts(outbox, other):
+    outbox.submit("k1", booking())
+    with pytest.raises(IdempotencyConflict):
+        outbox.submit("k1", other)
+
+
+def test_status_is_private_to_the_patient(outbox):
+    outbox.submit("k1", booking())
+    assert outbox.status("k1", "98765432109") is None
+    assert outbox.status("unknown", TC_NUMBER) is None
+
+
+def test_pending_booking_holds_its_slot(outbox):
+    outbox.submit("k1", booking())
+    with pytest.raises(SlotTaken):
+        outbox.submit("k2", booking())
+    # Another slot of the same doctor is free
+    outbox.submit("k3", booking(hour=11))
+
+
+def test_slot_taken_callback_refuses_new_bookings_only(outbox):
+    outbox.submit("k1", booking())
+    with pytest.raises(SlotTaken):
+        outbox.submit("k2", booking(hour=11), slot_taken=lambda: True)
+    # A retry of an accepted booking is answered even though its slot now shows as taken
+    status, created = outbox.submit("k1", booking(), slot_taken=lambda: True)
+    assert not created
+
+
+def test_booking_for_a_taken_slot_fails(outbox, db):
+    db.create_appointment({**booking(), "idempotency_key": "direct"})
+    outbox.submit("k1", booking())
+
+    outbox.flush()
+    status = outbox.status("k1")
+    assert status["status"] == "failed"
+    assert status["message"] == "Slot is already taken"
+
+
+def test_unreachable_database_keeps_bookings_pending(outbox):
+    def write(bookings):
+        raise ConnectionError("down")
+
+    outbox.max_attempts = 2
+    outbox._write = write
+    outbox.submit("k1", booking())
+
+    with pytest.raises(ConnectionError):
+        outbox.flush()
+    status = outbox.status("k1")
+    assert status["status"] == "pending" and status["attempts"] == 1
+
+    # Not due again until the backoff has passed
+    assert outbox.flush() == 0
+    make_due(outbox)
+    with pytest.raises(ConnectionError):
+        outbox.flush()
+    assert outbox.status("k1")["status"] == "failed"
+
+
+def test_rejected_booking_does_not_block_its_batch(outbox, db):
+    calls = []
+
+    def write(bookings):
+        calls.append(len(bookings))
+        if any(b["idempotency_key"] == "k3" for b in bookings):
+            raise ValueError("value too long")
+        return db.create_appointments(bookings)
+
+    outbox._write = write
+    for hour in range(8):
+        outbox.submit(f"k{hour}", booking(hour=9 + hour))
+
+    assert outbox.flush() == 8
+    states = {f"k{hour}": outbox.status(f"k{hour}")["status"] for hour in range(8)}
+    assert states.pop("k3") == "failed"
+    assert set(states.values()) == {"confirmed"}
+    assert calls == [8, 4, 2, 2, 1, 1, 4]
@@ -0,0 +1,77 @@
+import pytest
+
+import chat_sessions
+from chat_sessions import ChatSession, SessionStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SessionStore(ttl_seconds=60, max_sessions=3, path=str(tmp_path / "sessions.db"))
+    store.open()
+    yield store
+    store.close()
+
+
+def put(store, tc_number, symptoms=("headache",)):
+    with store._lock:
+        store._put(ChatSession(tc_number, list(symptoms)))
+
+
+def test_messages_are_merged_into_the_session(store):
+    store.analyze("1", "I have a headache")
+    response = store.analyze("1", "and a fever, still the headache")
+    assert response["session"] == {"message_count": 2, "new_symptoms": ["fever"]}
+    assert store.get("1").symptoms == ["headache", "fever"]
+
+
+def test_least_recently_used_session_is_evicted_first(store):
+    for tc_number in "abc":
+        put(store, tc_number)
+    store.get("a")  # now the most recently used
+    put(store, "d")
+
+    assert list(store._sessions) == ["c", "a", "d"]
+    assert store.evictions == 1
+    assert store.bytes == sum(session._size for session in store._sessions.values())
+
+
+def test_memory_cap_evicts_until_it_fits(store):
+    store.max_sessions = 100
+    put(store, "a")
+    store.max_bytes = store.bytes * 2
+    put(store, "b")
+    put(store, "c", symptoms=["headache"] * 3)
+
+    assert list(store._sessions) == ["c"]
+    assert store.evictions == 2
+    assert store.bytes <= store.max_bytes
+
+
+def test_evicted_sessions_come_back_before_and_after_a_flush(store):
+    for tc_number in "abcd":
+        put(store, tc_number)
+    assert "a" not in store._sessions
+
+    # Not written yet: still answered from the unflushed changes
+    assert store.get("a").symptoms == ["headache"]
+    assert store.flush() == 4
+    assert store.get("a").symptoms == ["headache"]
+
+
+def test_expired_sessions_are_dropped(store, monkeypatch):
+    put(store, "a")
+    store.flush()
+    later = chat_sessions.time.time() + 61
+    monkeypatch.setattr(chat_sessions.time, "time", lambda: later)
+
+    assert store.get("a") is None
+    assert "a" not in store._sessions and store.bytes == 0
+    # A new message starts over
+    assert store.analyze("a", "a fever")["session"]["message_count"] == 1
+
+
+def test_reset_forgets_the_session_everywhere(store):
+    put(store, "a")
+    store.flush()
+    store.reset("a")
+    assert store.get("a") is None
@@ -0,0 +1,81 @@
+import json
+
+import anyio
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import main
+from lifecycle import InFlightMiddleware, WorkerState
+
+
+def test_stream_slot_is_released_if_the_body_never_starts():
+    started = []
+
+    async def events():
+        started.append(True)
+        yield "data: {}\n\n"
+
+    async def receive():
+        await anyio.sleep(0.01)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # The client stops reading while the headers are still being sent
+        await anyio.sleep_forever()
+
+    assert main.stream_slots.try_acquire()
+    response = main.SlotStreamingResponse(events(), media_type="text/event-stream")
+    anyio.run(response, {"type": "http"}, receive, send)
+    assert started == []
+    assert main.stream_slots.active == 0
+
+
+def test_stream_endpoint_releases_its_slot_when_the_client_leaves(client):
+    body = json.dumps({"tc_number": "12345678901", "message": "I have a headache"}).encode()
+    messages = iter([{"type": "http.request", "body": body, "more_body": False}])
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/api/chat/stream", "raw_path": b"/api/chat/stream", "root_path": "",
+        "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+
+    async def receive():
+        # Gone as soon as the request is read
+        return next(messages, {"type": "http.disconnect"})
+
+    async def send(message):
+        pass
+
+    client.portal.call(main.app, scope, receive, send)
+    assert main.stream_slots.active == 0
+
+
+def test_in_flight_counts_a_streamed_body_until_it_is_sent():
+    state = WorkerState()
+    seen = []
+    app = FastAPI()
+    app.add_middleware(InFlightMiddleware, state=state, exempt=("/health",))
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            for chunk in ("a", "b"):
+                seen.append(state.in_flight)
+                yield chunk
+        return StreamingResponse(body())
+
+    @app.get("/health")
+    async def health():
+        return {"in_flight": state.in_flight}
+
+    with TestClient(app) as test_client:
+        assert test_client.get("/stream").text == "ab"
+        assert seen == [1, 1]
+        assert state.in_flight == 0
+        assert test_client.get("/health").json() == {"in_flight": 0}
+
+        state.stopping = True
+        assert test_client.get("/stream").status_code == 503
+        assert test_client.get("/health").status_code == 200
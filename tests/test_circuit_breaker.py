@@ -0,0 +1,93 @@
+import threading
+import time
+
+import psycopg2
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+from database import Database, DatabaseUnavailable
+
+
+def failing(breaker, times):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("db", failure_threshold=3, reset_timeout=60)
+    failing(breaker, 2)
+    assert breaker.state == CLOSED
+
+    failing(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    assert breaker.rejected == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("db", failure_threshold=2, reset_timeout=60)
+    failing(breaker, 1)
+    breaker.before_call()
+    breaker.record_success()
+    failing(breaker, 1)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("db", failure_threshold=1, reset_timeout=0.01)
+    failing(breaker, 1)
+    time.sleep(0.02)
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = CircuitBreaker("db", failure_threshold=1, reset_timeout=0.01)
+    failing(breaker, 1)
+    time.sleep(0.02)
+
+    failing(breaker, 1)
+    assert breaker.state == OPEN
+    assert breaker.transitions == {"closed->open": 1, "open->half_open": 1, "half_open->open": 1}
+
+
+class BrokenPool:
+    def __init__(self, error):
+        self.error = error
+
+    def getconn(self):
+        raise self.error
+
+    def putconn(self, conn, close=False):
+        pass
+
+
+@pytest.mark.parametrize("error, message", [
+    (psycopg2.OperationalError("server closed the connection unexpectedly"), "Database connection failed"),
+    (psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout"),
+     "Database query timed out"),
+])
+def test_connection_errors_surface_as_database_unavailable(error, message):
+    db = Database()
+    db.pool = BrokenPool(error)
+    db._slots = threading.BoundedSemaphore(1)
+    db.pool_timeout = 1
+    db.breaker = CircuitBreaker("database", failure_threshold=2, reset_timeout=60)
+
+    for _ in range(2):
+        with pytest.raises(DatabaseUnavailable, match=message):
+            with db.connection():
+                pass
+    assert db.breaker.state == OPEN
+    # Open circuit: fail fast without touching the pool
+    with pytest.raises(DatabaseUnavailable, match="circuit open"):
+        db.create_appointment({"tc_number": "12345678901"})
@@ -0,0 +1,47 @@
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAST_HOOK = "diagnosis_model"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_each_hook_runs_once_per_worker(tmp_path, workers):
+    env = dict(os.environ, DATABASE_URL="", WEB_CONCURRENCY=str(workers), HOST="127.0.0.1",
+               PORT=str(free_port()), DRAIN_DELAY_SECONDS="0", CHAT_SESSION_DB=str(tmp_path / "sessions.db"))
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    lines = []
+    reader = threading.Thread(target=lambda: lines.extend(server.stdout), daemon=True)
+    reader.start()
+    try:
+        deadline = time.monotonic() + 60
+        while sum(f"warm-up '{LAST_HOOK}'" in line for line in list(lines)) < workers:
+            assert time.monotonic() < deadline, "".join(lines)
+            assert server.poll() is None, "".join(lines)
+            time.sleep(0.1)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(30)
+        reader.join(5)
+
+    warmups = Counter(re.findall(r"\[worker (\d+)\] warm-up '(\w+)'", "".join(lines)))
+    assert len({pid for pid, _ in warmups}) == workers
+    assert set(warmups.values()) == {1}, warmups
+    drains = re.findall(r"\[worker (\d+)\] draining \d+ in-flight", "".join(lines))
+    assert len(drains) == len(set(drains)) == workers
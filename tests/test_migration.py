@@ -0,0 +1,68 @@
+import psycopg2
+import pytest
+
+import database
+from circuit_breaker import CLOSED, CircuitBreaker
+from database import Database
+
+
+class FakeConnection:
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.fail_on = fail_on
+        self.committed = self.rolled_back = self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.committed = True
+        else:
+            self.rolled_back = True
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        self.statements.append((" ".join(sql.split()), params))
+        if self.fail_on and self.fail_on in sql:
+            raise psycopg2.extensions.QueryCanceledError("canceling statement due to statement timeout")
+
+    def executemany(self, sql, rows):
+        self.statements.append((" ".join(sql.split()), None))
+
+    def fetchone(self):
+        return (True,)
+
+    def close(self):
+        self.closed = True
+
+
+def migrated(monkeypatch, conn, **kwargs):
+    monkeypatch.setattr(database.psycopg2, "connect", lambda dsn, **options: conn)
+    db = Database()
+    db._database_url = "postgresql://migrate"
+    db.connect_timeout = 5
+    db.migration_timeout_ms = 0
+    db.breaker = CircuitBreaker("database", failure_threshold=1, reset_timeout=60)
+    db.create_tables(**kwargs)
+    return db
+
+
+def test_migration_runs_in_one_transaction_without_statement_timeout(monkeypatch):
+    conn = FakeConnection()
+    migrated(monkeypatch, conn, raise_errors=True)
+    assert conn.statements[0] == ("SET LOCAL statement_timeout = %s", (0,))
+    assert conn.committed and conn.closed
+
+
+def test_failed_migration_rolls_back_and_leaves_the_breaker_closed(monkeypatch):
+    conn = FakeConnection(fail_on="CREATE TABLE IF NOT EXISTS symptom_rollups")
+    with pytest.raises(psycopg2.extensions.QueryCanceledError):
+        migrated(monkeypatch, conn, raise_errors=True)
+    assert conn.rolled_back and not conn.committed and conn.closed
+
+    # A slow migration says nothing about request traffic
+    db = migrated(monkeypatch, FakeConnection(fail_on="CREATE TABLE"))
+    assert db.breaker.state == CLOSED
@@ -0,0 +1,76 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+import main
+from pagination import InvalidCursor, build_page, decode_cursor, encode_cursor
+
+STAFF = {"Authorization": "Bearer secret"}
+
+
+def b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(datetime(2027, 3, 1, 10), 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (datetime(2027, 3, 1, 10), 42)
+    assert decode_cursor(encode_cursor("2027-03-01T10:00:00", "7")) == (datetime(2027, 3, 1, 10), 7)
+
+
+@pytest.mark.parametrize("cursor", [None, ""])
+def test_no_cursor_is_the_first_page(cursor):
+    assert decode_cursor(cursor) is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    b64(b"\xff\xfe"),
+    b64(b"{}"),
+    b64(b"[1]"),
+    b64(b'["2027-03-01T10:00:00", 1, 2]'),
+    b64(b'["yesterday", 1]'),
+    b64(b'["2027-03-01T10:00:00", "one"]'),
+    b64(b'["2027-03-01T10:00:00", null]'),
+])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_build_page_returns_the_cursor_of_the_last_row():
+    rows = [{"id": i, "appointment_date": datetime(2027, 3, 1, 9 + i)} for i in range(3)]
+    assert build_page(rows[:2], 2) == (rows[:2], None)
+    page, cursor = build_page(rows, 2)
+    assert page == rows[:2]
+    assert decode_cursor(cursor) == (datetime(2027, 3, 1, 10), 1)
+
+
+def test_listing_pages_through_every_appointment_once(client, monkeypatch):
+    monkeypatch.setenv("STAFF_TOKEN", "secret")
+    # Two appointments share each slot, so the id breaks the ties
+    appointments = [
+        {"id": i, "tc_number": "12345678901", "doctor_id": str(i % 2), "department": "Cardiology",
+         "appointment_date": f"2027-03-01T{9 + i // 2:02d}:00:00", "status": "scheduled"}
+        for i in range(7)
+    ]
+    monkeypatch.setattr(main.db, "mock_appointments", appointments)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/appointments", params=params, headers=STAFF).json()
+        seen.extend(row["id"] for row in page["appointments"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == list(range(7))
+
+
+def test_listing_rejects_an_invalid_cursor(client, monkeypatch):
+    monkeypatch.setenv("STAFF_TOKEN", "secret")
+    response = client.get("/api/appointments", params={"cursor": "garbage"}, headers=STAFF)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
@@ -0,0 +1,126 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from scheduling import PriorityScheduler, SchedulerFull
+
+
+async def holding_the_only_slot(scheduler, queued):
+    """Start the `queued` coroutines while the one slot is taken, then free it and wait for all of them"""
+    slot = scheduler.slot("high")
+    await slot.__aenter__()
+    tasks = [asyncio.create_task(coro) for coro in queued]
+    await asyncio.sleep(0)
+    await slot.__aexit__(None, None, None)
+    await asyncio.gather(*tasks)
+
+
+def test_freed_slots_follow_the_weights():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=1, weights={"high": 6, "medium": 3, "low": 1}, aging_seconds=60)
+        order = []
+
+        async def job(priority):
+            async with scheduler.slot(priority):
+                order.append(priority)
+
+        await holding_the_only_slot(scheduler, [job(p) for p in ("low", "medium", "high") for _ in range(10)])
+        return order
+
+    order = asyncio.run(scenario())
+    # Every priority gets its share of the first ten grants, high first
+    assert Counter(order[:10]) == {"high": 6, "medium": 3, "low": 1}
+    assert order[0] == "high"
+
+
+def test_aging_promotes_a_starved_low_request():
+    async def scenario(aging_seconds):
+        # Low gets no share at all while medium requests keep arriving
+        scheduler = PriorityScheduler(slots=1, weights={"high": 6, "medium": 3, "low": 0}, aging_seconds=aging_seconds)
+        order = []
+
+        async def job(priority, remaining=0):
+            async with scheduler.slot(priority):
+                order.append(priority)
+                if remaining:
+                    asyncio.create_task(job("medium", remaining - 1))
+                    await asyncio.sleep(0)  # let it queue before this slot is freed
+
+        await holding_the_only_slot(scheduler, [job("low"), job("medium", remaining=10)])
+        while len(order) < 12:
+            await asyncio.sleep(0)
+        return order, scheduler.stats()["priorities"]["low"]["promoted"]
+
+    order, promoted = asyncio.run(scenario(aging_seconds=60))
+    assert order.index("low") == 11 and promoted == 0
+    order, promoted = asyncio.run(scenario(aging_seconds=0))
+    assert order.index("low") == 1 and promoted == 1
+
+
+def test_request_cancelled_while_queued_leaves_the_queue():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=1)
+        order = []
+
+        async def job(name):
+            async with scheduler.slot("medium"):
+                order.append(name)
+
+        slot = scheduler.slot("high")
+        await slot.__aenter__()
+        first, second = asyncio.create_task(job("first")), asyncio.create_task(job("second"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.stats()["priorities"]["medium"]["queued"] == 1
+        await slot.__aexit__(None, None, None)
+        await asyncio.wait_for(second, 5)
+        return order, scheduler.active
+
+    assert asyncio.run(scenario()) == (["second"], 0)
+
+
+def test_slot_granted_to_a_cancelled_request_is_handed_on():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=1)
+        order = []
+
+        async def job(name):
+            async with scheduler.slot("medium"):
+                order.append(name)
+
+        slot = scheduler.slot("high")
+        await slot.__aenter__()
+        first, second = asyncio.create_task(job("first")), asyncio.create_task(job("second"))
+        await asyncio.sleep(0)
+        # The slot goes to `first`, whose client leaves before it gets to run
+        await slot.__aexit__(None, None, None)
+        first.cancel()
+        await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), 5)
+        return order, scheduler.active
+
+    assert asyncio.run(scenario()) == (["second"], 0)
+
+
+def test_full_queue_sheds_new_requests_with_room_kept_for_high():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=1, max_queued=2)
+        slot = scheduler.slot("high")
+        await slot.__aenter__()
+        waiting = [asyncio.create_task(scheduler.run("low", asyncio.sleep, 0)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        with pytest.raises(SchedulerFull):
+            await scheduler.run("medium", asyncio.sleep, 0)
+        # High priority may queue up to twice the limit
+        waiting += [asyncio.create_task(scheduler.run("high", asyncio.sleep, 0)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerFull):
+            await scheduler.run("high", asyncio.sleep, 0)
+
+        await slot.__aexit__(None, None, None)
+        await asyncio.wait_for(asyncio.gather(*waiting), 5)
+        return {p: counts["shed"] for p, counts in scheduler.stats()["priorities"].items()}
+
+    assert asyncio.run(scenario()) == {"high": 1, "medium": 1, "low": 0}
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight, normalize_text
+
+
+def test_identical_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def lookup(value):
+            calls.append(value)
+            await release.wait()
+            return value * 2
+
+        callers = [asyncio.create_task(flight.do("lookup", "k", lookup, 21)) for _ in range(3)]
+        other = asyncio.create_task(flight.do("lookup", "other", lookup, 1))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*callers, other)
+        # Nothing is kept once the call is over
+        await flight.do("lookup", "k", lookup, 21)
+        return results, calls, flight.stats()["lookup"]
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == [42, 42, 42, 2]
+    assert calls == [21, 1, 21]
+    assert stats == {"calls": 5, "executions": 3, "coalesced": 2, "in_flight": 0}
+
+
+def test_every_waiter_gets_the_error_and_the_next_call_runs_again():
+    async def scenario():
+        flight = SingleFlight()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            await asyncio.sleep(0)
+            if len(attempts) == 1:
+                raise ConnectionError("database down")
+            return "ok"
+
+        first = await asyncio.gather(*(flight.do("check", "k", flaky) for _ in range(3)), return_exceptions=True)
+        return first, await flight.do("check", "k", flaky), len(attempts)
+
+    first, retry, attempts = asyncio.run(scenario())
+    assert all(isinstance(error, ConnectionError) for error in first) and len(first) == 3
+    assert retry == "ok" and attempts == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def lookup():
+            await release.wait()
+            return "done"
+
+        leaving = asyncio.create_task(flight.do("lookup", "k", lookup))
+        staying = asyncio.create_task(flight.do("lookup", "k", lookup))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.wait_for(staying, 5), leaving.cancelled()
+
+    assert asyncio.run(scenario()) == ("done", True)
+
+
+def test_cancelled_shared_call_cancels_its_waiters():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def stuck():
+            await asyncio.Event().wait()
+
+        waiter = asyncio.create_task(flight.do("lookup", "k", stuck))
+        await asyncio.sleep(0)
+        next(iter(flight._in_flight.values())).cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(waiter, 5)
+        return flight.stats()["lookup"]["in_flight"]
+
+    assert asyncio.run(scenario()) == 0
+
+
+@pytest.mark.parametrize("text", ["I have a HEADACHE", "  i have   a headache\n"])
+def test_text_keys_ignore_case_and_spacing(text):
+    assert normalize_text(text) == "i have a headache"
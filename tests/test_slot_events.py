@@ -0,0 +1,49 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import slot_events
+from slot_events import SlotEventBus
+
+
+class FakeConnection:
+    """Delivers its own NOTIFYs back, like a direct PostgreSQL session"""
+
+    def __init__(self):
+        self.autocommit = False
+        self.notifies = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        if sql.startswith("SELECT pg_notify"):
+            self.notifies.append(SimpleNamespace(payload=params[1]))
+
+    def poll(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def idle_select(rlist, wlist, xlist, timeout):
+    time.sleep(0.01)
+    return [], [], []
+
+
+def test_listener_resyncs_on_the_first_connect(monkeypatch):
+    monkeypatch.setattr(slot_events.psycopg2, "connect", lambda dsn, **kwargs: FakeConnection())
+    monkeypatch.setattr(slot_events, "select", SimpleNamespace(select=idle_select))
+    resynced = threading.Event()
+    bus = SlotEventBus()
+    bus.subscribe(lambda event: None, resync=resynced.set)
+
+    bus.start_postgres("postgresql://slot-events")
+    try:
+        # The slot index was loaded before LISTEN: changes in between must not be lost
+        assert resynced.wait(5)
+        assert bus.connected and bus.reconnects == 0
+    finally:
+        bus.close()
+        bus._thread.join(5)
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/", "/index.html", "/script.js", "/styles.css", "/logo/femaledoctor.avif"])
+def test_web_client_is_served(client, path):
+    assert client.get(path).status_code == 200
+
+
+@pytest.mark.parametrize("path", [
+    "/chat_sessions.db", "/var/chat_sessions.db", "/var/booking_outbox.db", "/pris.db", "/.env", "/main.py",
+    "/profiles/", "/logo/../main.py",
+])
+def test_data_files_are_not_served(client, path):
+    assert client.get(path).status_code == 404